@@ -1,13 +1,31 @@
-import ska_helpers
+import importlib
 
-__version__ = ska_helpers.get_version(__package__)
+# The public API is imported lazily on first access, so that e.g.
+# "dpa_check --version" does not have to import matplotlib, xija,
+# the engineering archive, kadi and astropy before doing anything.
+_lazy_attrs = {"ACISThermalCheck": "main",
+               "DPABoardTempCheck": "main",
+               "calc_pitch_roll": "utils",
+               "get_acis_limits": "utils",
+               "mylog": "utils",
+               "get_options": "options"}
 
-from acis_thermal_check.main import \
-    ACISThermalCheck, \
-    DPABoardTempCheck
-from acis_thermal_check.utils import \
-    calc_pitch_roll, get_options, \
-    get_acis_limits, mylog
+
+def __getattr__(name):
+    if name == "__version__":
+        import ska_helpers
+        value = ska_helpers.get_version(__package__)
+    elif name in _lazy_attrs:
+        module = importlib.import_module("%s.%s" % (__name__, _lazy_attrs[name]))
+        value = getattr(module, name)
+    else:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_lazy_attrs.keys()) + ["__version__"])
 
 
 def test(*args, **kwargs):
@@ -0,0 +1,212 @@
+"""
+Historical back-validation of thermal models over long date ranges.
+
+The validation made for each load review only covers the few weeks
+before the run. Model calibration work needs the residual statistics
+over much longer periods. ``run_back_validation`` slides the validation
+window across a long date range, runs the validation model for each
+window and collects the residual quantiles of each window into a single
+table, which is written to an HDF5 or Parquet file.
+
+The telemetry, commanded states and ephemeris for the whole date range
+are fetched once, in large contiguous requests, and each window takes
+its piece of them. The telemetry is shared with the workers through a
+memory-mapped ``TelemetryStore``. The windows are run in parallel, and per-window
+plots are only made if requested.
+
+With ``sketches=True``, mergeable sketches of the residuals (see
+``acis_thermal_check.sketches``) are also made. Each window sketches only
+the part of it which does not overlap the window before, and these are
+merged into the sketches of the whole date range.
+
+.. code-block:: python
+
+    from acis_thermal_check.backvalidation import run_back_validation
+    table = run_back_validation(dpa_check, model_spec, "2018:001", "2020:001",
+                                days=21.0, step=7.0, outfile="dpa_2018_2019.h5")
+"""
+import os
+import numpy as np
+from Chandra.Time import DateTime, secs2date
+from acis_thermal_check.main import validation_quantiles
+from acis_thermal_check.telemetry import TelemetryStore
+from acis_thermal_check.state_builder import window_states
+from acis_thermal_check.utils import mylog, parallel_map, shared_inputs
+
+
+def write_table(table, outfile):
+    """
+    Write a table to an HDF5 or Parquet file, depending on the
+    extension of the file name.
+
+    Parameters
+    ----------
+    table : astropy Table
+        The table to write.
+    outfile : string
+        The path to the file. Files ending in ".parquet" are written in
+        Parquet format, all others in HDF5 format.
+    """
+    if outfile.endswith(".parquet"):
+        table.write(outfile, format="parquet", overwrite=True)
+    else:
+        table.write(outfile, format="hdf5", path="back_validation",
+                    serialize_meta=True, overwrite=True)
+
+
+def _run_window(i):
+    """
+    Run the validation for a single window. This is called in the
+    worker processes, and takes its inputs from ``shared_inputs``.
+    """
+    inp = shared_inputs()
+    atc = inp["atc"]
+    tstart, tstop = inp["windows"][i]
+    window_tlm = inp["store"].window(tstart, tstop)
+    states = window_states(inp["states"], window_tlm['date'][0],
+                           window_tlm['date'][-1])
+    validation = atc.calc_validation(window_tlm, inp["model_spec"],
+                                     states=states)
+    model, pred, tlm, good_mask = validation
+    if inp["outdir"] is not None:
+        # The plots are made from the same run of the model
+        outdir = os.path.join(inp["outdir"], secs2date(tstop)[:8].replace(":", ""))
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+        atc.make_validation_plots(window_tlm, inp["model_spec"], outdir, None,
+                                  states=states, validation=validation)
+    sketches = None
+    if inp["sketches"]:
+        # Only the part of the window after the end of the one before,
+        # so that the pieces sketched by the windows do not overlap
+        if i > 0:
+            new = tlm['date'] > inp["windows"][i - 1][1]
+        else:
+            new = np.ones(len(tlm), dtype='bool')
+        sketches = atc.calc_residual_sketches(
+            tlm[new], {k: v[new] for k, v in pred.items()}, good_mask[new])
+    rows = []
+    for msid in pred:
+        diffs = atc.calc_residuals(msid, tlm, pred, good_mask)
+        for band, diff in enumerate(diffs):
+            row = {"tstart": tlm['date'][0], "tstop": tlm['date'][-1],
+                   "msid": msid, "band": band, "n": len(diff)}
+            for quant in validation_quantiles:
+                if len(diff) > 0:
+                    row['quant%02d' % quant] = diff[(len(diff) * quant) // 100]
+                else:
+                    row['quant%02d' % quant] = np.nan
+            rows.append(row)
+    return rows, sketches
+
+
+def run_back_validation(atc, model_spec, start, stop, days=21.0, step=7.0,
+                        outfile=None, make_plots=False, outdir=None,
+                        cadence=328.0, n_jobs=None, sketches=False):
+    """
+    Run the validation of a model for a series of windows across a
+    long date range, and collect the residual quantiles of each.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model to validate.
+    model_spec : string
+        Path to the JSON file containing the model specification.
+    start : float or string
+        The start of the date range.
+    stop : float or string
+        The end of the date range.
+    days : float, optional
+        The length of each validation window in days. Default: 21.0
+    step : float, optional
+        The time between the starts of successive windows in days.
+        Default: 7.0
+    outfile : string, optional
+        If set, the table is written to this file, in Parquet format if
+        the name ends with ".parquet" and in HDF5 format otherwise.
+    make_plots : boolean, optional
+        If True, make the usual validation plots for each window, in a
+        subdirectory of ``outdir`` named for the end of the window.
+        Default: False
+    outdir : string, optional
+        The directory for the per-window plots. Default: "back_validation"
+    cadence : float, optional
+        The time between the telemetry samples in seconds. Cadences
+        longer than 328.0 thin out the 5-minute statistics, which makes
+        the modeling of each window cheaper at the cost of fewer
+        residuals; coarser archive products are never used, see
+        ``ACISThermalCheck.get_telem_values``. Default: 328.0
+    n_jobs : integer, optional
+        The number of worker processes. Default: one per CPU.
+    sketches : boolean, optional
+        If True, also return mergeable sketches of the residuals over
+        the whole date range. Default: False
+
+    Returns
+    -------
+    An astropy Table with one row per window and validated quantity
+    (and histogram band, for the modeled MSID), giving the residual
+    quantiles of that quantity in that window. If ``sketches`` is True,
+    the table and an OrderedDict keyed on the validated quantity of
+    lists of sketches, one per histogram band, as returned by
+    ``ACISThermalCheck.calc_residual_sketches``.
+    """
+    from astropy.table import Table
+    from acis_thermal_check.state_builder import SQLStateBuilder
+
+    tstart = DateTime(start).secs
+    tstop = DateTime(stop).secs
+    windows = []
+    t = tstart
+    while t + days * 86400.0 <= tstop:
+        windows.append((t, t + days * 86400.0))
+        t += step * 86400.0
+    if len(windows) == 0:
+        raise RuntimeError("The date range is shorter than one window!")
+    mylog.info('Running %d validation windows of %g days between %s and %s'
+               % (len(windows), days, secs2date(tstart), secs2date(tstop)))
+
+    # Fetch everything for the whole date range up front
+    tlm = atc.get_telem_values(tstop, days=(tstop - tstart) / 86400.0,
+                               cadence=cadence)
+    if atc.state_builder is None:
+        atc.state_builder = SQLStateBuilder(logger=mylog)
+    states = atc.state_builder.get_validation_states(tlm['date'][0],
+                                                     tlm['date'][-1])
+    atc.preload_ephemeris(tlm['date'][0], tlm['date'][-1])
+    if make_plots:
+        atc.preload_rad_zones(tlm['date'][0], tlm['date'][-1])
+
+    if make_plots and outdir is None:
+        outdir = "back_validation"
+    store = TelemetryStore()
+    store.write(tlm)
+    del tlm
+    shared = dict(atc=atc, model_spec=model_spec, store=store,
+                  states=states, windows=windows,
+                  outdir=outdir if make_plots else None, sketches=sketches)
+    try:
+        results = parallel_map(_run_window, range(len(windows)), n_jobs=n_jobs,
+                               shared=shared)
+    finally:
+        store.close()
+
+    rows = [row for window_rows, _ in results for row in window_rows]
+    names = ["tstart", "tstop", "msid", "band", "n"]
+    names += ['quant%02d' % quant for quant in validation_quantiles]
+    table = Table(rows=rows, names=names)
+    table["datestart"] = secs2date(table["tstart"])
+    table["datestop"] = secs2date(table["tstop"])
+    table.meta["model"] = atc.name
+    table.meta["model_spec"] = os.path.abspath(model_spec)
+    table.meta["days"] = days
+    table.meta["step"] = step
+    table.meta["cadence"] = cadence
+    if outfile is not None:
+        mylog.info('Writing back-validation table to %s' % outfile)
+        write_table(table, outfile)
+    if sketches:
+        from acis_thermal_check.sketches import merge_sketch_sets
+        return table, merge_sketch_sets([s for _, s in results])
+    return table
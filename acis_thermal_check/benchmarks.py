@@ -0,0 +1,274 @@
+"""
+Benchmarks for ``acis_thermal_check``.
+
+These are not part of the regression tests, since their results depend
+on the machine they are run on, but they are used to track the cost of
+the parts of a model run which are not the model itself. They can be
+run from the command line:
+
+.. code-block:: bash
+
+    [~]$ python -m acis_thermal_check.benchmarks --outfile=benchmarks.jsonl
+
+The ``--render`` flag also measures the time taken to render a plot,
+with and without reusing its figure template.
+
+The cost of a prediction with a fixed and with adaptive time steps is
+measured on a real load with ``benchmark_adaptive_step``, which needs
+a model and its command-line options:
+
+.. code-block:: python
+
+    from dpa_check.dpa_check import DPACheck, model_path
+    from acis_thermal_check import get_options
+    from acis_thermal_check.benchmarks import benchmark_adaptive_step
+
+    oflsdir = "/data/acis/LoadReviews/2017/MAR0617/oflsa"
+    args = get_options("dpa", model_path, argv=["--oflsdir=%s" % oflsdir])
+    benchmark_adaptive_step(DPACheck(), args)
+"""
+import subprocess
+import sys
+
+# Modules whose import time is tracked. The first is what a
+# model script needs to parse its command line, the second is
+# what it needs to run a model.
+import_modules = ["acis_thermal_check.options",
+                  "acis_thermal_check.main"]
+
+
+def import_time(module, python=None):
+    """
+    Measure the time taken to import a module in a fresh
+    interpreter using ``python -X importtime``.
+
+    Parameters
+    ----------
+    module : string
+        The name of the module to import, e.g. "acis_thermal_check".
+    python : string, optional
+        The Python executable to use. Default: the current one.
+
+    Returns
+    -------
+    A 2-tuple of the total import time of the module in seconds, and
+    a dictionary mapping the name of every module imported directly
+    by it to its cumulative import time in seconds.
+    """
+    if python is None:
+        python = sys.executable
+    proc = subprocess.run([python, "-X", "importtime", "-c",
+                           "import %s" % module],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, check=True)
+    entries = []
+    for line in proc.stderr.splitlines():
+        # Lines look like:
+        # import time:     self [us] | cumulative | imported package
+        # where the package name is indented by its depth in the
+        # import tree, and children are listed before their parents
+        if not line.startswith("import time:"):
+            continue
+        words = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(words[1])
+        except ValueError:
+            # The header line
+            continue
+        name = words[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), cumulative * 1.0e-6))
+    # The module itself is the last top-level entry, and everything
+    # it imported comes immediately before it at a greater depth
+    total = 0.0
+    times = {}
+    if not entries or entries[-1][1] != module:
+        # The module was already imported during interpreter startup
+        return total, times
+    total = entries[-1][2]
+    for depth, name, t in reversed(entries[:-1]):
+        if depth == 0:
+            break
+        if depth == 1:
+            times[name] = t
+    return total, times
+
+
+def benchmark_imports(modules=None, heavy=10):
+    """
+    Measure the import times of a list of modules, and report
+    the most expensive modules imported by each.
+
+    Parameters
+    ----------
+    modules : list of strings, optional
+        The modules to measure. Default: ``import_modules``
+    heavy : integer, optional
+        The number of the most expensive imports to report for
+        each module. Default: 10
+
+    Returns
+    -------
+    A dictionary mapping module name to total import time in seconds.
+    """
+    if modules is None:
+        modules = import_modules
+    results = {}
+    for module in modules:
+        total, times = import_time(module)
+        results[module] = total
+        print("%-40s %8.3f s" % (module, total))
+        top = sorted(((t, m) for m, t in times.items()), reverse=True)
+        for t, m in top[:heavy]:
+            print("    %-36s %8.3f s" % (m, t))
+    return results
+
+
+def benchmark_rendering(n_renders=20, n_samples=20000):
+    """
+    Measure the time taken to render and save the temperature plot
+    of a prediction, building the figure from scratch for every plot
+    and reusing its figure template.
+
+    Parameters
+    ----------
+    n_renders : integer, optional
+        The number of plots to render in each case. Default: 20
+    n_samples : integer, optional
+        The number of samples of the plotted series. Default: 20000
+
+    Returns
+    -------
+    A dictionary mapping "scratch" and "template" to the mean time
+    taken by a plot in seconds.
+    """
+    import io
+    import time
+    import numpy as np
+    from acis_thermal_check.utils import plot_two, clear_figure_templates
+    rng = np.random.RandomState(0)
+    times = 6.0e8 + 328.0 * np.arange(n_samples)
+    results = {}
+    for case in ("scratch", "template"):
+        clear_figure_templates()
+        elapsed = 0.0
+        for i in range(n_renders):
+            if case == "scratch":
+                clear_figure_templates()
+            temps = 20.0 + np.cumsum(rng.normal(size=n_samples)) * 0.1
+            pitch = 90.0 + 50.0 * np.sin(times / 1.0e5 + i)
+            t0 = time.time()
+            plot = plot_two(fig_id=1, x=times, y=temps, x2=times, y2=pitch,
+                            title="1DPAMZT", xlabel='Date',
+                            ylabel='Temperature (C)', ylabel2='Pitch (deg)',
+                            ylim2=(40, 180), load_start=times[n_samples // 2])
+            plot['ax'].axhline(temps.max(), linestyle='-', color='gold',
+                               linewidth=2.0)
+            plot['fig'].savefig(io.BytesIO(), format="png")
+            elapsed += time.time() - t0
+        results[case] = elapsed / n_renders
+        print("%-40s %8.3f s" % ("render (%s)" % case, results[case]))
+    clear_figure_templates()
+    return results
+
+
+def benchmark_adaptive_step(atc, args, coarse_dt=1312.0, n_runs=3):
+    """
+    Measure the time taken by the prediction model of a load, run with
+    the fixed time step of the model and with adaptive time steps, and
+    how far apart their temperatures are.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model to run.
+    args : ArgumentParser arguments
+        The command-line options of the model, which must specify a
+        backstop file.
+    coarse_dt : float, optional
+        The coarse time step of the adaptive prediction in seconds.
+        Default: 1312.0
+    n_runs : integer, optional
+        The number of times each prediction is run. Default: 3
+
+    Returns
+    -------
+    A dictionary mapping "fixed" and "adaptive" to the mean time taken
+    by a prediction in seconds, "speedup" to the ratio of the two, and
+    "max_diff" to the largest difference between the temperatures of
+    the two predictions in degC.
+    """
+    import time
+    import numpy as np
+    from acis_thermal_check.scenarios import get_baseline
+    baseline = get_baseline(atc, args)
+    state0 = baseline["state0"]
+    # The ephemeris is fetched once, outside of the timings
+    atc.preload_ephemeris(state0['tstart'], baseline["tstop"])
+    results = {}
+    models = {}
+    for case, dt in (("fixed", None), ("adaptive", coarse_dt)):
+        t0 = time.time()
+        for i in range(n_runs):
+            models[case] = atc.calc_model(args.model_spec, baseline["states"],
+                                          state0['tstart'], baseline["tstop"],
+                                          state0=state0, coarse_dt=dt)
+        results[case] = (time.time() - t0) / n_runs
+        print("%-40s %8.3f s" % ("prediction (%s)" % case, results[case]))
+    results["speedup"] = results["fixed"] / results["adaptive"]
+    fixed, adaptive = models["fixed"], models["adaptive"]
+    temps = np.interp(fixed.times, adaptive.times,
+                      adaptive.comp[atc.msid].mvals)
+    results["max_diff"] = float(np.abs(temps - fixed.comp[atc.msid].mvals).max())
+    print("%-40s %8.2f" % ("speedup", results["speedup"]))
+    print("%-40s %8.3f C" % ("largest difference", results["max_diff"]))
+    return results
+
+
+def record_results(name, results, outfile):
+    """
+    Append a set of benchmark results to a file of JSON lines, so
+    that they can be tracked over time.
+
+    Parameters
+    ----------
+    name : string
+        The name of the benchmark, e.g. "imports".
+    results : dict
+        The results of the benchmark.
+    outfile : string
+        The path to the file to append to.
+    """
+    import json
+    import platform
+    import time
+    import acis_thermal_check
+    record = {"benchmark": name,
+              "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "host": platform.node(),
+              "version": acis_thermal_check.__version__,
+              "results": results}
+    with open(outfile, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def main():
+    from argparse import ArgumentParser
+    parser = ArgumentParser()
+    parser.add_argument("--outfile", help="Append the results to this file "
+                                          "of JSON lines. Default: None")
+    parser.add_argument("--render", action="store_true",
+                        help="Also measure the time taken to render a plot. "
+                             "Default: False")
+    args = parser.parse_args()
+    results = benchmark_imports()
+    if args.outfile is not None:
+        record_results("imports", results, args.outfile)
+    if args.render:
+        results = benchmark_rendering()
+        if args.outfile is not None:
+            record_results("rendering", results, args.outfile)
+
+
+if __name__ == '__main__':
+    main()
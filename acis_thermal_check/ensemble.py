@@ -0,0 +1,300 @@
+"""
+Monte Carlo ensemble predictions for ACIS thermal models.
+
+A nominal prediction is a single trajectory started from one initial
+temperature. For loads which come close to a planning limit it is more
+useful to know how likely the limit is to be crossed, given the
+uncertainty in the initial temperature, the model parameters and the
+attitude. The ensemble runs many members of the prediction, each with
+perturbed inputs, and summarizes them as percentile bands and limit
+crossing probabilities.
+
+Members which only differ in their initial temperature and model
+parameters share a single xija model, which is built once per worker
+and then re-run with new initial conditions and parameter values.
+Perturbing the pitch and roll changes the inputs of the model, so in
+that case each member needs its own model, although the ephemeris and
+the nominal pitch and roll are still computed only once. Members are
+divided among a pool of worker processes.
+"""
+import numpy as np
+from Chandra.Time import DateTime
+from acis_thermal_check.utils import mylog, parallel_map, shared_inputs, \
+    calc_pitch_roll
+
+# The percentiles of the ensemble which are stored and reported
+percentiles = (5, 16, 50, 84, 95)
+
+
+class EnsemblePrediction(object):
+    """
+    The results of an ensemble of model predictions.
+
+    Parameters
+    ----------
+    times : NumPy array
+        Times in seconds from the beginning of the mission.
+    temps : NumPy array
+        The modeled temperatures of each member, with shape
+        (n_members, n_times).
+    T_inits : NumPy array
+        The initial temperature of each member.
+    options : dict
+        The options used to perturb the members.
+    """
+    def __init__(self, times, temps, T_inits, options):
+        self.times = times
+        self.temps = temps
+        self.T_inits = T_inits
+        self.options = options
+        self.n_members = temps.shape[0]
+        self.percentiles = dict(zip(percentiles,
+                                    np.percentile(temps, percentiles, axis=0)))
+
+    def exceedance_probability(self, limit, lim_type="max", tstart=None,
+                               tstop=None):
+        """
+        The fraction of members which reach a limit at any time
+        within a time range.
+
+        Parameters
+        ----------
+        limit : float
+            The temperature limit.
+        lim_type : string, optional
+            "max" for an upper limit, "min" for a lower limit.
+            Default: "max"
+        tstart : float, optional
+            The start of the time range. Default: the start of the
+            prediction.
+        tstop : float, optional
+            The end of the time range. Default: the end of the
+            prediction.
+        """
+        ok = np.ones(self.times.size, dtype=bool)
+        if tstart is not None:
+            ok &= self.times >= tstart
+        if tstop is not None:
+            ok &= self.times <= tstop
+        if not ok.any():
+            return 0.0
+        temps = self.temps[:, ok]
+        if lim_type == "min":
+            bad = (temps <= limit).any(axis=1)
+        else:
+            bad = (temps >= limit).any(axis=1)
+        return bad.mean()
+
+    def write(self, outfile, msid):
+        """
+        Write the percentiles of the ensemble to a file.
+
+        Parameters
+        ----------
+        outfile : string
+            The path to the file to write.
+        msid : string
+            The MSID which was modeled, used in the column names.
+        """
+        from astropy.table import Table
+        from Chandra.Time import secs2date
+        cols = [self.times, secs2date(self.times)]
+        names = ['time', 'date']
+        for q in percentiles:
+            cols.append(self.percentiles[q])
+            names.append('%s_p%02d' % (msid, q))
+        table = Table(cols, names=names, copy=False)
+        table['time'].format = '%.2f'
+        for name in names[2:]:
+            table[name].format = '%.2f'
+        table.write(outfile, format='ascii', delimiter='\t', overwrite=True)
+
+
+def _state_offsets(states, times, sigma, rng):
+    # One random offset per commanded state, so that each dwell
+    # is off by a constant amount, mapped onto the model times
+    offsets = rng.normal(0.0, sigma, len(states))
+    idxs = np.searchsorted(states['tstart'], times, side='right') - 1
+    return offsets[np.clip(idxs, 0, len(states) - 1)]
+
+
+def _run_members(members):
+    """
+    Run a chunk of ensemble members. This is called in the worker
+    processes, and takes everything except the member perturbations
+    from ``shared_inputs``.
+    """
+    inp = shared_inputs()
+    atc = inp["atc"]
+    msid = atc.msid
+    temps = []
+    model = None
+    for member in members:
+        if model is None or member["pitch"] is not None or \
+                member["roll"] is not None:
+            pitch = inp["pitch"]
+            roll = inp["roll"]
+            if member["pitch"] is not None:
+                pitch = pitch + member["pitch"]
+            if member["roll"] is not None:
+                roll = roll + member["roll"]
+            model = atc.setup_model(inp["model_spec"], inp["states"],
+                                    inp["tstart"], inp["tstop"],
+                                    state0=inp["state0"], ephem=inp["ephem"],
+                                    pitch=pitch, roll=roll, dt=inp["dt"])
+            model.make()
+            # The nodes which start from the initial temperature, i.e.
+            # the modeled node and the pseudo-nodes of the model
+            init_nodes = [model.comp[name] for name in [msid] + list(atc.init_nodes)
+                          if name in model.comp]
+            base_pars = {par.full_name: par.val for par in model.pars}
+        for comp in init_nodes:
+            comp.mvals[0] = member["T_init"]
+        for par in model.pars:
+            par.val = base_pars[par.full_name] + member["pars"].get(par.full_name, 0.0)
+        model.calc()
+        temps.append(model.comp[msid].mvals.copy())
+    return temps
+
+
+def run_ensemble(atc, model_spec, states, state0, tstop, n_members=100,
+                 T_sigma=1.0, pitch_sigma=0.0, roll_sigma=0.0,
+                 par_sigmas=None, n_jobs=None, seed=None, dt=None):
+    """
+    Run a Monte Carlo ensemble of model predictions.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model to run.
+    model_spec : string
+        Path to the JSON file containing the model specification.
+    states : NumPy record array
+        Commanded states
+    state0 : dict
+        The initial state, including the nominal initial temperature.
+    tstop : float
+        The end time of the model run.
+    n_members : integer, optional
+        The number of members of the ensemble. Default: 100
+    T_sigma : float, optional
+        The standard deviation of the initial temperature in degC.
+        Default: 1.0
+    pitch_sigma : float, optional
+        The standard deviation of the pitch of each commanded state in
+        degrees. Default: 0.0
+    roll_sigma : float, optional
+        The standard deviation of the off-nominal roll of each commanded
+        state in degrees. Default: 0.0
+    par_sigmas : dict, optional
+        A dictionary mapping the full names of xija model parameters,
+        e.g. "solarheat__1dpamzt__P_60", to the standard deviation of
+        that parameter. Default: None
+    n_jobs : integer, optional
+        The number of worker processes. Default: one per CPU.
+    seed : integer, optional
+        The seed for the random number generator, for reproducible
+        ensembles. Default: None
+    dt : float, optional
+        The time step of the members in seconds, which should be that
+        of the nominal prediction. Default: the time step of the model
+        specification.
+
+    Returns
+    -------
+    An EnsemblePrediction instance.
+    """
+    if par_sigmas is None:
+        par_sigmas = {}
+    options = dict(n_members=n_members, T_sigma=T_sigma,
+                   pitch_sigma=pitch_sigma, roll_sigma=roll_sigma,
+                   par_sigmas=par_sigmas, seed=seed)
+    mylog.info('Running a %d member ensemble of the %s thermal model'
+               % (n_members, atc.name.upper()))
+    tstart = state0['tstart']
+
+    # Get the model times, the ephemeris and the nominal pitch and
+    # roll once, since all of the members share them
+    times = atc._new_model(model_spec, tstart, tstop, dt=dt).times
+    ephem = atc.get_ephemeris(tstart, tstop, times)
+    pitch, roll = calc_pitch_roll(times, ephem, states)
+
+    # Draw all of the perturbations up front, so the ensemble does not
+    # depend on how the members are divided among the workers
+    rng = np.random.RandomState(seed)
+    T_inits = state0[atc.msid] + rng.normal(0.0, T_sigma, n_members)
+    members = []
+    for i in range(n_members):
+        member = {"T_init": T_inits[i],
+                  "pars": {name: rng.normal(0.0, sigma)
+                           for name, sigma in par_sigmas.items()},
+                  "pitch": None, "roll": None}
+        if pitch_sigma > 0.0:
+            member["pitch"] = _state_offsets(states, times, pitch_sigma, rng)
+        if roll_sigma > 0.0:
+            member["roll"] = _state_offsets(states, times, roll_sigma, rng)
+        members.append(member)
+
+    import multiprocessing
+    if not n_jobs:
+        n_jobs = multiprocessing.cpu_count()
+    n_jobs = max(min(n_jobs, n_members), 1)
+    chunks = [members[i::n_jobs] for i in range(n_jobs)]
+    # Everything but the perturbations is shared by all of the members
+    shared = dict(atc=atc, model_spec=model_spec, states=states,
+                  state0=state0, tstart=tstart, tstop=tstop,
+                  ephem=ephem, pitch=pitch, roll=roll, dt=dt)
+    results = parallel_map(_run_members, chunks, n_jobs=n_jobs, shared=shared)
+
+    # Put the members back in their original order
+    temps = np.empty((n_members, times.size))
+    for i, chunk_temps in enumerate(results):
+        temps[i::n_jobs] = np.array(chunk_temps)
+
+    return EnsemblePrediction(times, temps, T_inits, options)
+
+
+def ensemble_viols(ensemble, viols, limits, load_start):
+    """
+    Compute the probability of each of the violations found in the
+    nominal prediction, and of any violation during the load.
+
+    Parameters
+    ----------
+    ensemble : EnsemblePrediction instance
+        The ensemble of predictions.
+    viols : dict
+        The violations found in the nominal prediction, keyed on "hi"
+        and "lo".
+    limits : dict
+        The planning limits, keyed on "hi" and "lo".
+    load_start : float
+        The start time of the load in seconds from the beginning of
+        the mission.
+
+    Returns
+    -------
+    A dictionary keyed on "hi" and "lo" giving the probability of any
+    violation during the load and a list of the nominal violations
+    with the probability of each.
+    """
+    out = {}
+    for key, lim_type in (("hi", "max"), ("lo", "min")):
+        if key not in viols:
+            continue
+        prob = ensemble.exceedance_probability(limits[key], lim_type=lim_type,
+                                               tstart=load_start)
+        items = []
+        for viol in viols[key]:
+            p = ensemble.exceedance_probability(limits[key], lim_type=lim_type,
+                                                tstart=DateTime(viol['datestart']).secs,
+                                                tstop=DateTime(viol['datestop']).secs)
+            items.append({'datestart': viol['datestart'],
+                          'datestop': viol['datestop'],
+                          'prob': p})
+            mylog.info('Ensemble probability of %s violation from %s to %s is %.2f'
+                       % (key, viol['datestart'], viol['datestop'], p))
+        out[key] = {'prob': prob, 'viols': items}
+        mylog.info('Ensemble probability of any %s violation during the load is %.2f'
+                   % (key, prob))
+    return out
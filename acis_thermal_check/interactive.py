@@ -0,0 +1,242 @@
+"""
+An interactive report backend, which renders the plots in the browser.
+
+Instead of PNG images made with matplotlib, each plot of the report is
+written as a small JavaScript file which holds the plotted series as
+base64-encoded binary arrays, along with the limit lines, the load
+start and the radiation zones. The report page draws them on HTML
+canvases with ``atc_report.js``, and they can be zoomed with the mouse
+to any time range covered by the data, without running the model
+again. The data files are loaded with ``<script>`` tags rather than
+fetched, so that the report also works when opened from disk.
+
+Times are stored as single-precision offsets in seconds from the start
+of each plot, which is exact to well under a second over the spans of
+the plots, and values are stored in single precision.
+"""
+import base64
+import json
+import os
+import shutil
+import numpy as np
+from acis_thermal_check.utils import mylog, TASK_DATA
+
+# HTML colors for the matplotlib colors used in the plots
+_colors = {"C0": "#1f77b4", "C1": "#ff7f0e", "C2": "#2ca02c",
+           "C3": "#d62728", "C4": "#9467bd", "C5": "#8c564b",
+           "C6": "#e377c2", "C7": "#7f7f7f", "C8": "#bcbd22",
+           "C9": "#17becf", "c": "#00bfbf", "y": "#bfbf00"}
+
+# The files of the report which come with the package
+report_template = "interactive_template.html"
+report_script = "atc_report.js"
+
+
+def _template_path(filename):
+    return os.path.join(TASK_DATA, 'acis_thermal_check', 'templates', filename)
+
+
+def _color(color):
+    return _colors.get(color, color)
+
+
+def _limits(lim):
+    return None if lim is None else [float(v) for v in lim]
+
+
+def _encode(values):
+    # Pack an array as little-endian single-precision floats
+    values = np.ascontiguousarray(values, dtype='<f4')
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+class InteractivePlot(object):
+    """
+    A plot of one or more series against time (or, for histograms,
+    against a linear x-axis), drawn in the browser.
+
+    Parameters
+    ----------
+    name : string
+        The name of the plot, from which its data file is named.
+    title : string, optional
+        The title of the plot.
+    xlabel : string, optional
+        The label of the x-axis. Default: "Date"
+    ylabel : string, optional
+        The label of the left y-axis.
+    ylabel2 : string, optional
+        The label of the right y-axis, if any series are plotted on it.
+    ylim : 2-tuple, optional
+        The limits of the left y-axis. Default is to fit the data.
+    ylim2 : 2-tuple, optional
+        The limits of the right y-axis. Default is to fit the data.
+    xlim : 2-tuple, optional
+        The initial limits of the x-axis, in seconds from the beginning
+        of the mission for time axes. Default is to show all of the data.
+    ylog : boolean, optional
+        If True, the left y-axis has a logarithmic scale. Default: False
+    xtype : string, optional
+        "time" for an x-axis of times in seconds from the beginning of
+        the mission, "linear" otherwise. Default: "time"
+    group : string, optional
+        Plots of the same group are zoomed together. Default: None
+    """
+    def __init__(self, name, title="", xlabel="Date", ylabel="", ylabel2="",
+                 ylim=None, ylim2=None, xlim=None, ylog=False, xtype="time",
+                 group=None):
+        self.name = name
+        self.title = title
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.ylabel2 = ylabel2
+        self.ylim = ylim
+        self.ylim2 = ylim2
+        self.xlim = xlim
+        self.ylog = ylog
+        self.xtype = xtype
+        self.group = group
+        self.series = []
+        self.hlines = []
+        self.vlines = []
+        self.spans = []
+
+    def add_series(self, x, y, label="", color="blue", width=2, dash=None,
+                   axis=0, kind="line", y2=None, alpha=1.0):
+        """
+        Add a series to the plot.
+
+        Parameters
+        ----------
+        x : NumPy array
+            The times (or x values) of the series.
+        y : NumPy array
+            The values of the series.
+        label : string, optional
+            The label of the series in the legend.
+        color : string, optional
+            The color of the series. Default: "blue"
+        width : float, optional
+            The width of the line in pixels. Default: 2
+        dash : list of floats, optional
+            The dash pattern of the line. Default: solid
+        axis : integer, optional
+            0 for the left y-axis and 1 for the right. Default: 0
+        kind : string, optional
+            "line", "points", "steps" or "band". Default: "line"
+        y2 : NumPy array, optional
+            The upper values of a band.
+        alpha : float, optional
+            The opacity of the series. Default: 1.0
+        """
+        self.series.append(dict(x=np.asarray(x, dtype=np.float64),
+                                y=np.asarray(y), y2=y2, label=label,
+                                color=_color(color), width=width, dash=dash,
+                                axis=axis, kind=kind, alpha=alpha))
+
+    def add_hline(self, y, color, width=2, dash=None, axis=0):
+        """
+        Add a horizontal line, e.g. a limit, to the plot.
+        """
+        self.hlines.append(dict(y=float(y), color=_color(color), width=width,
+                                dash=dash, axis=axis))
+
+    def add_vline(self, x, color, width=2, dash=None):
+        """
+        Add a vertical line, e.g. the start of the load, to the plot.
+        """
+        self.vlines.append(dict(x=float(x), color=_color(color), width=width,
+                                dash=dash))
+
+    def add_span(self, x0, x1, color, alpha=0.3):
+        """
+        Shade a range of the x-axis, e.g. a radiation zone.
+        """
+        self.spans.append(dict(x0=float(x0), x1=float(x1),
+                               color=_color(color), alpha=alpha))
+
+    def to_spec(self):
+        """
+        The description of the plot which is given to the browser,
+        with the series encoded as base64 strings.
+        """
+        if self.series:
+            x0 = min(s["x"][0] for s in self.series if len(s["x"]) > 0)
+        else:
+            x0 = 0.0
+        spec = dict(title=self.title, xlabel=self.xlabel, ylabel=self.ylabel,
+                    ylabel2=self.ylabel2, ylim=_limits(self.ylim),
+                    ylim2=_limits(self.ylim2),
+                    ylog=self.ylog, xtype=self.xtype, group=self.group,
+                    x0=float(x0), x0_unix=None, xlim=None)
+        if self.xtype == "time":
+            from Chandra.Time import DateTime
+            spec["x0_unix"] = float(DateTime(x0).unix)
+        if self.xlim is not None:
+            spec["xlim"] = [float(self.xlim[0] - x0), float(self.xlim[1] - x0)]
+        spec["series"] = []
+        for s in self.series:
+            ser = {k: v for k, v in s.items() if k not in ("x", "y", "y2")}
+            ser["x"] = _encode(s["x"] - x0)
+            ser["y"] = _encode(s["y"])
+            if s["y2"] is not None:
+                ser["y2"] = _encode(s["y2"])
+            spec["series"].append(ser)
+        spec["hlines"] = self.hlines
+        spec["vlines"] = [dict(v, x=v["x"] - x0) for v in self.vlines]
+        spec["spans"] = [dict(v, x0=v["x0"] - x0, x1=v["x1"] - x0)
+                         for v in self.spans]
+        return spec
+
+    def write(self, outdir):
+        """
+        Write the data file of the plot.
+
+        Parameters
+        ----------
+        outdir : string
+            The output directory.
+
+        Returns
+        -------
+        The name of the data file.
+        """
+        filename = "%s.js" % self.name
+        outfile = os.path.join(outdir, filename)
+        mylog.info('Writing plot data file %s' % outfile)
+        with open(outfile, "w") as f:
+            # The plot is drawn on the canvas named after its data file
+            f.write("ATC.addPlot(%s, %s);\n" % (json.dumps(filename),
+                                               json.dumps(self.to_spec())))
+        return filename
+
+
+def report_files():
+    """
+    The paths to the files of the package which the interactive
+    report is made from.
+    """
+    return [_template_path(report_template), _template_path(report_script)]
+
+
+def write_interactive_report(outdir, context):
+    """
+    Write the interactive report, index.html, and copy the script
+    which draws its plots to the output directory.
+
+    Parameters
+    ----------
+    outdir : string
+        The output directory.
+    context : dict
+        The items to write to the report, the same as those of the
+        reST report.
+    """
+    import jinja2
+    shutil.copy2(_template_path(report_script), outdir)
+    with open(_template_path(report_template)) as f:
+        template = jinja2.Template(f.read())
+    outfile = os.path.join(outdir, 'index.html')
+    mylog.info('Writing report file %s' % outfile)
+    with open(outfile, "w") as f:
+        f.write(template.render(**context))
@@ -1,38 +1,290 @@
-# Matplotlib setup
-# Use Agg backend for command-line (non-interactive) operation
-import matplotlib
-matplotlib.use('Agg')
-
 import os
 from pprint import pformat
 from collections import OrderedDict, defaultdict
 import re
 import time
 import pickle
+import threading
 import numpy as np
-import Ska.DBI
 import Ska.Numpy
-from Chandra.Time import DateTime, date2secs, secs2date
-import matplotlib.pyplot as plt
-from Ska.Matplotlib import cxctime2plotdate, \
-    pointpair, plot_cxctime
-import Ska.engarchive.fetch_sci as fetch
+from Chandra.Time import DateTime
 import shutil
-import acis_thermal_check
-from astropy.io import ascii
-version = acis_thermal_check.__version__
 from acis_thermal_check.utils import \
     config_logging, TASK_DATA, plot_two, \
     mylog, plot_one, get_acis_limits, \
     make_state_builder, calc_pitch_roll, \
-    thermal_blue, thermal_red
-from kadi import events
-from astropy.table import Table
+    thermal_blue, thermal_red, get_pyplot, \
+    decimate_indices, plot_buckets, get_figure_template, \
+    parse_intervals, interval_mask, get_cache_dir, atomic_write, \
+    calc_band_bitmask
+from acis_thermal_check.timeconv import to_secs, to_date, conversion_stats
+
+# The plotting, archive, database and table libraries are
+# imported where they are first used, so that importing this
+# module (e.g. to run "--version") stays cheap.
 
 op_map = {"greater": ">",
           "greater_equal": ">=",
           "less": "<",
-          "less_equal": "<="}
+          "less_equal": "<=",
+          "equal": "==",
+          "not_equal": "!="}
+
+# The colors of the residual histograms of each limit band, as
+# (matplotlib color, name used in the report)
+hist_band_colors = [(thermal_blue, "blue"), (thermal_red, "red"),
+                    ("C2", "green"), ("C4", "purple"), ("C1", "orange"),
+                    ("C5", "brown"), ("C6", "pink"), ("C9", "cyan")]
+
+# Radiation zones are cached on disk in chunks of this many seconds.
+# Only chunks which ended more than rad_zone_latency seconds ago are
+# cached, since the events database may still update recent zones.
+rad_zone_chunk = 30 * 86400.0
+rad_zone_latency = 3 * 86400.0
+
+# The MSIDs of the orbit and solar ephemeris
+ephem_msids = ['orbitephem0_{}'.format(axis) for axis in "xyz"]
+ephem_msids += ['solarephem0_{}'.format(axis) for axis in "xyz"]
+
+# The archive products which telemetry can be fetched from, as
+# (stat, sample interval in seconds), from the finest to the coarsest
+archive_stats = [(None, 0.0), ('5min', 328.0), ('daily', 86400.0)]
+
+# The coarsest archive product the telemetry which models are validated
+# against, or started from, is fetched from. Daily statistics average
+# away the excursions the validation is meant to catch.
+coarsest_stat = '5min'
+
+# The time at the end of fetched telemetry which keeps the resolution
+# of the archive product even when a longer cadence is asked for, since
+# the initial state of a prediction is taken from it (see get_states)
+initial_state_window = 12 * 3600.0
+
+# Quantiles of the validation residuals which are reported
+validation_quantiles = (1, 5, 16, 50, 84, 95, 99)
+
+# Process-wide caches. For a single command-line run these are
+# filled once and never hit, but a long-running process (see
+# acis_thermal_check.server) reuses them between model runs.
+_model_spec_cache = {}
+_template_cache = {}
+_fetch_cache = OrderedDict()
+# The most memory the cached archive fetches may take, in bytes.
+# Fetches which are larger than this are not cached at all.
+_fetch_cache_bytes = 256 * 2**20
+# Fetches which end less than fetch_latency seconds ago (or in the
+# future, e.g. the predictive ephemeris) may still gain late data in
+# the archive, so they are only reused for _fetch_cache_ttl seconds
+fetch_latency = 3 * 86400.0
+_fetch_cache_ttl = 600.0
+# Archive fetches may be made from the prefetch threads (see
+# ACISThermalCheck.prefetch_inputs). The lock guards the cache and
+# the fetches in flight, which are keyed as the cache is, so that a
+# request which another thread is already fetching waits for it.
+_fetch_lock = threading.Lock()
+_fetch_inflight = {}
+# The engineering archive keeps module-level state and reads its HDF5
+# files through PyTables, neither of which is thread-safe, so only one
+# thread reads the archive at a time. The prefetch threads still
+# overlap the archive reads with the kadi and commanded states queries.
+_archive_lock = threading.Lock()
+
+
+def _file_key(filename):
+    st = os.stat(filename)
+    return os.path.abspath(filename), st.st_mtime, st.st_size
+
+
+def load_model_spec(model_spec):
+    """
+    Read a JSON model specification file, returning a cached
+    copy if the file has not changed since it was last read.
+
+    Parameters
+    ----------
+    model_spec : string
+        Path to the JSON file containing the model specification.
+    """
+    import copy
+    import json
+    key = _file_key(model_spec)
+    if key not in _model_spec_cache:
+        with open(model_spec, "r") as f:
+            _model_spec_cache[key] = json.load(f)
+    # xija gets its own copy, so the cached specification
+    # cannot be modified by a model run
+    return copy.deepcopy(_model_spec_cache[key])
+
+
+def fetch_msidset(msids, start, stop, stat=None):
+    """
+    Fetch a set of MSIDs from the engineering archive, keeping
+    the most recent requests in memory so that identical requests
+    made later in the same process do not go back to the archive.
+    Requests which end within ``fetch_latency`` of the present are
+    only kept for a few minutes, since late data may still arrive.
+
+    Parameters
+    ----------
+    msids : list of strings
+        The MSIDs to fetch.
+    start : float or string
+        The start time of the request.
+    stop : float or string
+        The stop time of the request.
+    stat : string, optional
+        The archive statistic to fetch, e.g. "5min". Default: None,
+        meaning full-resolution data.
+    """
+    import copy
+    from concurrent.futures import Future
+    key = (tuple(msids), start, stop, stat)
+    msidset = None
+    future = None
+    now = time.time()
+    with _fetch_lock:
+        entry = _fetch_cache.get(key, None)
+        if entry is not None and entry[2] is not None and entry[2] < now:
+            del _fetch_cache[key]
+            entry = None
+        if entry is not None:
+            _fetch_cache.move_to_end(key)
+            msidset = entry[0]
+        elif key in _fetch_inflight:
+            future = _fetch_inflight[key]
+        else:
+            # This thread makes the fetch
+            _fetch_inflight[key] = Future()
+    if msidset is None and future is None:
+        import Ska.engarchive.fetch_sci as fetch
+        try:
+            with _archive_lock:
+                msidset = fetch.MSIDset(msids, start, stop, stat=stat)
+        except BaseException as err:
+            with _fetch_lock:
+                future = _fetch_inflight.pop(key)
+            future.set_exception(err)
+            raise
+        nbytes = sum(x.times.nbytes + x.vals.nbytes for x in msidset.values())
+        if to_secs(stop) < DateTime().secs - fetch_latency:
+            expires = None
+        else:
+            expires = time.time() + _fetch_cache_ttl
+        with _fetch_lock:
+            if nbytes <= _fetch_cache_bytes:
+                _fetch_cache[key] = (msidset, nbytes, expires)
+                while sum(e[1] for e in _fetch_cache.values()) > _fetch_cache_bytes:
+                    _fetch_cache.popitem(last=False)
+            future = _fetch_inflight.pop(key)
+        future.set_result(msidset)
+    elif msidset is None:
+        msidset = future.result()
+    # Callers may modify the MSIDset in place (e.g. by interpolating),
+    # so they get a copy and the cached version stays pristine
+    return copy.deepcopy(msidset)
+
+
+def select_stat(cadence, coarsest=coarsest_stat):
+    """
+    Pick the cheapest archive product which still resolves a given
+    cadence, i.e. the coarsest one whose samples are no further apart
+    than the cadence, but no coarser than ``coarsest``.
+
+    Parameters
+    ----------
+    cadence : float
+        The time between the telemetry samples needed, in seconds.
+    coarsest : string, optional
+        The coarsest archive statistic which may be picked.
+        Default: "5min"
+
+    Returns
+    -------
+    The archive statistic to fetch, e.g. "5min", or None for
+    full-resolution data.
+    """
+    stat = None
+    for name, interval in archive_stats:
+        if interval <= cadence:
+            stat = name
+        if name == coarsest:
+            break
+    return stat
+
+
+def get_rad_zones(start, stop):
+    """
+    Get the radiation zones which intersect a time range from the kadi
+    events database. The zones are cached on disk in fixed chunks of
+    time (see ``get_cache_dir``), so that the database is only queried
+    for chunks which have not been seen before or are too recent to be
+    final.
+
+    Parameters
+    ----------
+    start : float
+        The start time in seconds from the beginning of the mission.
+    stop : float
+        The stop time in seconds from the beginning of the mission.
+
+    Returns
+    -------
+    A NumPy record array with the start and stop of each zone in
+    seconds ("tstart", "tstop") and in matplotlib plot dates
+    ("plotstart", "plotstop"), sorted by time.
+    """
+    from kadi import events
+    from Ska.Matplotlib import cxctime2plotdate
+    cache_dir = get_cache_dir("rad_zones")
+    final = DateTime().secs - rad_zone_latency
+    intervals = []
+    for k in range(int(start // rad_zone_chunk), int(stop // rad_zone_chunk) + 1):
+        chunk_start = k * rad_zone_chunk
+        chunk_stop = chunk_start + rad_zone_chunk
+        cache_file = os.path.join(cache_dir, "%d.npy" % k)
+        if os.path.exists(cache_file):
+            zones = np.load(cache_file)
+        else:
+            rzs = events.rad_zones.filter(chunk_start, chunk_stop)
+            zones = np.array([(rz.tstart, rz.tstop) for rz in rzs],
+                             dtype=np.float64).reshape(-1, 2)
+            if chunk_stop < final:
+                atomic_write(cache_file, lambda f: np.save(f, zones))
+        intervals.extend(zones.tolist())
+    # Zones which span two chunks are found in both, and are merged here
+    starts, stops = parse_intervals(intervals, cache=False)
+    ok = (stops >= start) & (starts <= stop)
+    out = np.zeros(ok.sum(), dtype=[('tstart', 'f8'), ('tstop', 'f8'),
+                                    ('plotstart', 'f8'), ('plotstop', 'f8')])
+    out['tstart'] = starts[ok]
+    out['tstop'] = stops[ok]
+    if len(out) > 0:
+        out['plotstart'] = cxctime2plotdate(out['tstart'])
+        out['plotstop'] = cxctime2plotdate(out['tstop'])
+    return out.view(np.recarray)
+
+
+def plot_rad_zones(ax, rzs):
+    """
+    Draw the starts and stops of radiation zones on a plot as dashed
+    vertical lines, all in a single collection.
+
+    Parameters
+    ----------
+    ax : matplotlib Axes
+        The axes to draw on.
+    rzs : NumPy record array
+        The radiation zones, as returned by ``get_rad_zones``.
+    """
+    if len(rzs) == 0:
+        return
+    ptimes = np.concatenate([rzs['plotstart'], rzs['plotstop']])
+    # The lines span the whole height of the axes, and should
+    # not change its limits
+    ylim = ax.get_ylim()
+    ax.vlines(ptimes, 0, 1, transform=ax.get_xaxis_transform(),
+              linestyles='--', colors='C2', linewidth=2, zorder=-10)
+    ax.set_ylim(*ylim)
 
 
 class ACISThermalCheck(object):
@@ -89,6 +341,11 @@ class ACISThermalCheck(object):
         "less_equal" Defaults to "greater_equal" for all values 
         in *hist_limit*.
     """
+    # The nodes of the model, other than the modeled MSID, which start
+    # from the initial temperature of a prediction, e.g. the "dpa0"
+    # pseudo-node. The ensemble predictions perturb them together.
+    init_nodes = []
+
     def __init__(self, msid, name, validation_limits, hist_limit,
                  other_telem=None, other_map=None,
                  flag_cold_viols=False, hist_ops=None):
@@ -111,6 +368,23 @@ class ACISThermalCheck(object):
         # Initially, the state_builder is set to None, as it will get
         # set up later
         self.state_builder = None
+        # No ensemble of predictions unless one is requested
+        self.predict_ensemble = None
+        # Ephemeris and radiation zones fetched in advance, see
+        # preload_ephemeris, preload_rad_zones and prefetch_inputs
+        self._ephem_msidset = None
+        self._ephem_span = None
+        self._rad_zones = None
+        self._rad_zones_span = None
+        self._prefetch = {}
+        # The manifest of the outputs of the current run, see run
+        self.manifest = None
+        # The prediction and validation models of the last run, and
+        # how to remake those whose stage was skipped, see _run_stage
+        self._models = {}
+        self._remake_models = {}
+        # The time taken by each step of the last run
+        self.timings = {}
         self.flag_cold_viols = flag_cold_viols
         if hist_ops is None:
             hist_ops = ["greater_equal"]*len(hist_limit)
@@ -132,12 +406,53 @@ class ACISThermalCheck(object):
             in this dictionary. SHOULD ONLY BE USED FOR TESTING.
             This is deliberately hidden from command-line operation
             to avoid it being used accidentally.
+
+        Returns
+        -------
+        A ``RunResult`` with the predicted temperatures, the violations,
+        the validation quantiles, the time taken by each step and the
+        files written by the run.
         """
+        try:
+            return self._run(args, override_limits=override_limits)
+        finally:
+            # A run which failed may not have picked up all of its
+            # background fetches, which must not be picked up by the
+            # next run of a long-running process
+            for future in self._prefetch.values():
+                future.cancel()
+            self._prefetch.clear()
+
+    def _run(self, args, override_limits=None):
+        # The model run itself, see run
         # First, record the selected state builder in the class attributes
         self.state_builder = make_state_builder(args.state_builder, args)
 
+        t_run = time.time()
+        self.timings = {}
+        conv_start = conversion_stats()
+
         proc = self._setup_proc_and_logger(args)
 
+        if args.report_backend == "interactive" and \
+                self._overrides("make_prediction_plots") and \
+                not self._overrides("make_interactive_prediction_plots"):
+            mylog.warning("The %s model makes its own prediction plots, which "
+                          "it has no interactive version of, so the static "
+                          "report is made instead" % self.name.upper())
+            args.report_backend = "static"
+
+        # Outputs which are unchanged since the last run into the same
+        # directory are reused, unless --force-outputs is set
+        from acis_thermal_check.manifest import RunManifest, file_hash
+        try:
+            self.manifest = RunManifest(args.outdir, force=args.force_outputs,
+                                        salt=self._code_inputs())
+        except OSError as err:
+            mylog.warning("Cannot keep a run manifest, so every stage is "
+                          "run: %s" % err)
+            self.manifest = None
+
         # This allows one to override the planning and yellow limits
         # for a particular model run. THIS SHOULD ONLY BE USED FOR
         # TESTING PURPOSES.
@@ -160,30 +475,118 @@ class ACISThermalCheck(object):
 
         # Store off the start date, and, if you have it, the
         # stop date in proc
-        proc["datestart"] = DateTime(tstart).date
+        proc["datestart"] = to_date(tstart)
         if tstop is not None:
-            proc["datestop"] = DateTime(tstop).date
+            proc["datestop"] = to_date(tstop)
+
+        # A rolling validation only needs the inputs of the time since
+        # the last run, see acis_thermal_check.rolling
+        rolling = None
+        valid_start = None
+        if args.rolling_validation and not args.pred_only:
+            from acis_thermal_check.rolling import RollingValidation
+            rolling = RollingValidation(self, args.model_spec, days=args.days)
+            valid_start = rolling.fetch_start(min(tstart, tnow))
+
+        # Start fetching the telemetry, ephemeris and radiation zones
+        # from the archives in the background
+        self.prefetch_inputs(tstart, tstop, tnow, args, valid_start=valid_start)
+
+        # Meanwhile, get the commanded states for validation. The
+        # database connection belongs to this thread, so this is
+        # done here rather than in the background.
+        if not args.pred_only and rolling is None:
+            tlm_stop = min(tstart, tnow)
+            valid_states = self.state_builder.get_validation_states(
+                tlm_stop - args.days * 86400.0, tlm_stop)
 
         # Get the telemetry values which will be used
         # for prediction and validation. Args default value is 21 days.
-        tlm = self.get_telem_values(min(tstart, tnow), days=args.days)
+        t0 = time.time()
+        if "tlm" in self._prefetch:
+            tlm = self._prefetch.pop("tlm").result()
+        else:
+            tlm = None
+        self.timings["telemetry"] = time.time() - t0
 
         # make predictions on a backstop file if defined
         if args.backstop_file is not None:
             pred = self.make_week_predict(tstart, tstop, tlm, args.T_init,
-                                          args.model_spec, args.outdir)
+                                          args.model_spec, args.outdir,
+                                          ensemble=self._ensemble_options(args),
+                                          profile=args.output_profile,
+                                          backend=args.report_backend,
+                                          dt=args.model_dt,
+                                          coarse_dt=args.coarse_dt)
         else:
             pred = defaultdict(lambda: None)
 
         # Validation
 
-        if not args.pred_only:
+        if rolling is not None:
+
+            # Only the quantiles, of the validation period brought up
+            # to date from the last run
+            tlm_stop = min(tstart, tnow)
+            inputs = [rolling.key, tlm_stop, args.days, self._limits_inputs(),
+                      args.run_start]
+
+            def remake():
+                tlm = self.get_telem_values(tlm_stop, days=args.days)
+                return self.calc_validation(tlm, args.model_spec)[0]
+
+            plots_validation = self._run_stage("validation", inputs,
+                                               rolling.run, tlm_stop,
+                                               args.outdir, args.run_start,
+                                               remake=("validate", remake))
+            proc["op"] = [op_map.get(op, op) for op in self.hist_ops]
+            proc["hist_bands"] = self.describe_histogram_bands()
+
+            valid_viols = self.make_validation_viols(plots_validation)
+            if len(valid_viols) > 0:
+                mylog.info('validation warning(s) in output at %s' % args.outdir)
+
+        elif not args.pred_only:
 
             # Make the validation plots
-            plots_validation = self.make_validation_plots(tlm, args.model_spec,
-                                                          args.outdir,
-                                                          args.run_start)
-            proc["op"] = [op_map[op] for op in self.hist_ops]
+            from acis_thermal_check.state_builder import window_states
+            valid_states = window_states(valid_states, tlm['date'][0],
+                                         tlm['date'][-1])
+            inputs = [load_model_spec(args.model_spec), tlm, valid_states,
+                      self._ephem_inputs(tlm['date'][0], tlm['date'][-1]),
+                      self._backstop_inputs(), self._limits_inputs(),
+                      args.run_start, is_weekly_load, args.output_profile,
+                      args.report_backend]
+            # If the stage is skipped, the model is only run again if
+            # a caller asks for it
+            remake = ("validate",
+                      lambda: self.calc_validation(tlm, args.model_spec,
+                                                   states=valid_states)[0])
+            if args.output_profile == "full" and \
+                    args.report_backend == "interactive":
+                plots_validation = self._run_stage("validation", inputs,
+                                                   self.make_interactive_validation_plots,
+                                                   tlm, args.model_spec,
+                                                   args.outdir, args.run_start,
+                                                   states=valid_states,
+                                                   remake=remake)
+            elif args.output_profile == "full":
+                plots_validation = self._run_stage("validation", inputs,
+                                                   self._validate, is_weekly_load,
+                                                   tlm, args.model_spec,
+                                                   args.outdir, args.run_start,
+                                                   states=valid_states,
+                                                   remake=remake)
+            else:
+                # Only the quantiles, without the plots
+                plots_validation = self._run_stage("validation", inputs,
+                                                   self.make_validation_stats,
+                                                   tlm, args.model_spec,
+                                                   args.outdir, args.run_start,
+                                                   states=valid_states,
+                                                   remake=remake)
+            proc["op"] = [op_map.get(op, op) for op in self.hist_ops]
+            proc["hist_bands"] = self.describe_histogram_bands()
 
             # Determine violations of temperature validation
             valid_viols = self.make_validation_viols(plots_validation)
@@ -195,30 +598,326 @@ class ACISThermalCheck(object):
             valid_viols = defaultdict(lambda: None)
             plots_validation = defaultdict(lambda: None)
 
-        # Write everything to the web page.
-        # First, write the reStructuredText file.
+        # Write everything to the web page, which is only made with
+        # the full set of plots.
+        if args.output_profile == "full":
+
+            # Set up the context for the reST file
+            context = {'bsdir': self.bsdir,
+                       'viols': pred["viols"],
+                       'plots': pred["plots"],
+                       'ensemble': pred["ensemble"],
+                       'valid_viols': valid_viols,
+                       'proc': proc,
+                       'pred_only': args.pred_only,
+                       'plots_validation': plots_validation,
+                       'flag_cold': self.flag_cold_viols}
+
+            # The time of the run is left out of the inputs of the
+            # report, so that it is only rewritten if something else changed
+            inputs = [{k: v for k, v in context.items() if k != 'proc'},
+                      {k: v for k, v in proc.items() if k != 'run_time'},
+                      args.report_backend]
+            if args.report_backend == "interactive":
+                from acis_thermal_check.interactive import \
+                    write_interactive_report, report_files
+                inputs += [file_hash(fn) for fn in report_files()]
+                self._run_stage("report", inputs, write_interactive_report,
+                                args.outdir, context)
+            else:
+                inputs.append(file_hash(self._template_file()))
+                # First write the reStructuredText file, then convert it to HTML
+                self._run_stage("report", inputs, self._write_report,
+                                args.outdir, context, proc)
+
+        # Keep the violations around for callers which run
+        # models in-process, e.g. the service mode
+        self.viols = pred["viols"]
+        self.valid_viols = valid_viols
+
+        self.timings["total"] = time.time() - t_run
+        conv_stop = conversion_stats()
+        counters = {"time_conversions_%s" % k: conv_stop[k] - conv_start[k]
+                    for k in ("values", "converted", "saved")}
+        mylog.info("Time conversions: %d asked for, %d made, %d saved by caching"
+                   % (counters["time_conversions_values"],
+                      counters["time_conversions_converted"],
+                      counters["time_conversions_saved"]))
+
+        from acis_thermal_check.results import RunResult
+        artifacts = set(["run.dat"])
+        if self.manifest is not None:
+            for outputs in self.manifest.outputs.values():
+                artifacts.update(outputs)
+        return RunResult(self.name, self.msid, args.outdir,
+                         pred=None if args.backstop_file is None else pred,
+                         valid_viols=None if args.pred_only else valid_viols,
+                         plots_validation=None if args.pred_only else plots_validation,
+                         timings=self.timings, counters=counters,
+                         artifacts=artifacts)
+
+    def _overrides(self, name):
+        # Whether the subclass has its own version of a method
+        return getattr(type(self), name) is not getattr(ACISThermalCheck, name)
+
+    def _run_stage(self, name, inputs, func, *args, remake=None, **kwargs):
+        # Run a stage of the model run through the manifest, if there
+        # is one, so that it is skipped if its inputs are unchanged.
+        # remake is the name of the model which the stage runs, and a
+        # function which runs it again, for when the stage is skipped.
+        t0 = time.time()
+        if self.manifest is None:
+            result = func(*args, **kwargs)
+        else:
+            result = self.manifest.run_stage(name, inputs, func, *args, **kwargs)
+            if remake is not None and name in self.manifest.skipped:
+                self._models.pop(remake[0], None)
+                self._remake_models[remake[0]] = remake[1]
+        self.timings[name] = time.time() - t0
+        return result
+
+    def _get_model(self, name):
+        # Get a model of the last run, running it again first if its
+        # stage was skipped
+        if name in self._remake_models:
+            mylog.info('Running the %s model again, since its stage was '
+                       'skipped' % name)
+            self._models[name] = self._remake_models.pop(name)()
+        return self._models.get(name, None)
+
+    def _set_model(self, name, model):
+        self._remake_models.pop(name, None)
+        self._models[name] = model
+
+    @property
+    def predict_model(self):
+        """
+        The xija model of the last prediction, or None if none was made.
+        """
+        return self._get_model("predict")
+
+    @predict_model.setter
+    def predict_model(self, model):
+        self._set_model("predict", model)
 
-        # Set up the context for the reST file
-        context = {'bsdir': self.bsdir,
-                   'viols': pred["viols"],
-                   'plots': pred["plots"],
-                   'valid_viols': valid_viols,
-                   'proc': proc,
-                   'pred_only': args.pred_only,
-                   'plots_validation': plots_validation,
-                   'flag_cold': self.flag_cold_viols}
+    @property
+    def validate_model(self):
+        """
+        The xija model of the last validation, or None if none was made.
+        """
+        return self._get_model("validate")
 
-        self.write_index_rst(args.outdir, context)
+    @validate_model.setter
+    def validate_model(self, model):
+        self._set_model("validate", model)
 
-        # Second, convert reST to HTML
-        self.rst_to_html(args.outdir, proc)
+    def _code_inputs(self):
+        # The versions of the code which the outputs depend on, and
+        # the static inputs of the model
+        import xija
+        import acis_thermal_check
+        from acis_thermal_check.model_inputs import static_input_stamps
+        cls = type(self)
+        package = cls.__module__.split(".")[0]
+        try:
+            import ska_helpers
+            package_version = ska_helpers.get_version(package)
+        except Exception:
+            package_version = None
+        return [acis_thermal_check.__version__, xija.__version__,
+                cls.__module__, cls.__name__, package_version,
+                static_input_stamps(self.name)]
+
+    def _ephem_inputs(self, start, stop):
+        # The ephemeris which models between start and stop are run
+        # with, as get_ephemeris gets it
+        self._wait_prefetch("ephem")
+        span = self._ephem_span
+        if span is not None and span[0] <= start and stop <= span[1]:
+            e = self._ephem_msidset
+        else:
+            e = fetch_msidset(ephem_msids, start - 2000.0, stop + 2000.0)
+        out = []
+        for msid in ephem_msids:
+            ok = (e[msid].times >= start - 2000.0) & \
+                (e[msid].times <= stop + 2000.0)
+            out.append(e[msid].vals[ok])
+        return out
 
-        return
+    def _backstop_inputs(self):
+        # The contents of the backstop and NLET files which the
+        # commanded states are made from
+        import glob
+        from acis_thermal_check.manifest import file_hash
+        out = []
+        for attr in ("backstop_file", "nlet_file"):
+            filename = getattr(self.state_builder, attr, None)
+            if filename is None:
+                continue
+            if os.path.isdir(filename):
+                files = sorted(glob.glob(os.path.join(filename, "CR*.backstop")))
+            else:
+                files = [filename]
+            out += [(os.path.basename(fn), file_hash(fn)) for fn in files
+                    if os.path.isfile(fn)]
+        return out
+
+    def _limits_inputs(self):
+        # The limits and settings which the outputs depend on
+        return [self.name, self.msid, self.validation_limits, self.hist_limit,
+                self.hist_ops, self.flag_cold_viols, self.yellow_hi,
+                self.yellow_lo, self.plan_limit_hi, self.plan_limit_lo]
+
+    def _validate(self, is_weekly_load, *args, **kwargs):
+        # The validation plots of a run with a prediction use its plot
+        # style, which has not been set if the prediction was skipped
+        if is_weekly_load:
+            self._set_plot_style()
+        return self.make_validation_plots(*args, **kwargs)
+
+    def _write_report(self, outdir, context, proc):
+        # Write the reST file, and then convert it to HTML
+        self.write_index_rst(outdir, context)
+        self.rst_to_html(outdir, proc)
+
+    def prefetch_inputs(self, tstart, tstop, tnow, args, valid_start=None):
+        """
+        Start fetching the telemetry, ephemeris and radiation zones
+        needed by a model run in background threads, so that the
+        requests to the different archives overlap with each other and
+        with the work done in the meantime (e.g. reading the commanded
+        states). The reads of the engineering archive itself are made
+        one at a time (see ``fetch_msidset``). The results are picked
+        up with ``_wait_prefetch``, and
+        ``get_ephemeris`` and ``get_rad_zones`` wait for theirs.
+
+        Parameters
+        ----------
+        tstart : float
+            The start time of the load in seconds from the beginning
+            of the mission.
+        tstop : float
+            The stop time of the load, or None if there is no load.
+        tnow : float
+            The time of the run.
+        args : ArgumentParser arguments
+            The command-line options object.
+        valid_start : float, optional
+            The start of the inputs needed for a rolling validation, which
+            fetches its own telemetry. Default: None, for a validation
+            of the full ``args.days`` days of telemetry.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        is_weekly_load = args.backstop_file is not None
+        rolling = valid_start is not None
+        tlm_stop = min(tstart, tnow)
+        tlm_start = tlm_stop - args.days * 86400.0
+        if rolling:
+            tlm_start = valid_start
+        executor = ThreadPoolExecutor(max_workers=3)
+        # A prediction alone only needs the most recent few hours of
+        # the modeled MSID to find its starting point
+        if (args.pred_only or rolling) and is_weekly_load:
+            self._prefetch["tlm"] = executor.submit(self.get_initial_telem,
+                                                    tlm_stop, days=args.days)
+        elif not rolling:
+            self._prefetch["tlm"] = executor.submit(self.get_telem_values,
+                                                    tlm_stop, days=args.days)
+        # One span of ephemeris covers both the validation and the
+        # prediction models
+        if is_weekly_load or not args.pred_only:
+            stop = tlm_stop if tstop is None else max(tlm_stop, tstop)
+            self._prefetch["ephem"] = executor.submit(self.preload_ephemeris,
+                                                      tlm_start, stop)
+        if not args.pred_only and not rolling:
+            if args.output_profile == "full":
+                self._prefetch["rad_zones"] = executor.submit(self.preload_rad_zones,
+                                                              tlm_start, tlm_stop)
+        # The threads finish their work and then exit
+        executor.shutdown(wait=False)
+
+    def _wait_prefetch(self, name):
+        # Wait for a background fetch started by prefetch_inputs, if
+        # there is one, and raise any error it ran into
+        future = self._prefetch.pop(name, None)
+        if future is not None:
+            return future.result()
+
+    def preload_rad_zones(self, start, stop):
+        """
+        Get the radiation zones for a long span of time in one
+        request, so that later calls to ``get_rad_zones`` for times
+        within that span do not go back to the events database.
+
+        Parameters
+        ----------
+        start : float
+            The start time of the span in seconds from the beginning
+            of the mission.
+        stop : float
+            The stop time of the span in seconds from the beginning
+            of the mission.
+        """
+        self._rad_zones = get_rad_zones(start, stop)
+        self._rad_zones_span = (start, stop)
+
+    def get_rad_zones(self, start, stop):
+        """
+        Get the radiation zones which intersect a time range, from
+        those preloaded if they cover it.
+
+        Parameters
+        ----------
+        start : float
+            The start time in seconds from the beginning of the mission.
+        stop : float
+            The stop time in seconds from the beginning of the mission.
+
+        Returns
+        -------
+        A NumPy record array of the radiation zones, see the
+        module-level ``get_rad_zones``.
+        """
+        self._wait_prefetch("rad_zones")
+        span = self._rad_zones_span
+        if span is not None and span[0] <= start and stop <= span[1]:
+            rzs = self._rad_zones
+            # The zones are sorted and do not overlap, so the ones
+            # which intersect the range are contiguous
+            i0 = np.searchsorted(rzs['tstop'], start, side='left')
+            i1 = np.searchsorted(rzs['tstart'], stop, side='right')
+            return rzs[i0:i1]
+        return get_rad_zones(start, stop)
+
+    def preload_ephemeris(self, start, stop):
+        """
+        Fetch the orbit and solar ephemeris for a long span of time
+        in one request, so that later calls to ``get_ephemeris`` for
+        times within that span do not go back to the archive.
+
+        Parameters
+        ----------
+        start : float
+            The start time of the span in seconds from the beginning
+            of the mission.
+        stop : float
+            The stop time of the span in seconds from the beginning
+            of the mission.
+        """
+        mylog.info('Fetching ephemeris between %s and %s' %
+                   (to_date(start), to_date(stop)))
+        self._ephem_msidset = fetch_msidset(ephem_msids, start - 2000.0,
+                                            stop + 2000.0)
+        self._ephem_span = (start, stop)
 
     def get_ephemeris(self, start, stop, times):
-        msids = ['orbitephem0_{}'.format(axis) for axis in "xyz"]
-        msids += ['solarephem0_{}'.format(axis) for axis in "xyz"]
-        e = fetch.MSIDset(msids, start - 2000.0, stop + 2000.0)
+        msids = ephem_msids
+        self._wait_prefetch("ephem")
+        span = self._ephem_span
+        if span is not None and span[0] <= start and stop <= span[1]:
+            e = self._ephem_msidset
+        else:
+            e = fetch_msidset(msids, start - 2000.0, stop + 2000.0)
         ephem = {}
         for msid in msids:
             ephem[msid] = Ska.Numpy.interpolate(e[msid].vals, e[msid].times,
@@ -240,7 +939,7 @@ class ACISThermalCheck(object):
         """
         # The -5 here has us back off from the last telemetry
         # reading just a bit
-        tbegin = DateTime(tlm['date'][-5]).date
+        tbegin = to_date(tlm['date'][-5])
         # Call the overloaded state_builder method to assemble states
         # and define a state0
         states, state0 = self.state_builder.get_prediction_states(tbegin)
@@ -253,6 +952,14 @@ class ACISThermalCheck(object):
         if T_init is None:
             ok = ((tlm['date'] >= state0['tstart'] - 700) &
                   (tlm['date'] <= state0['tstart'] + 700))
+            if not ok.any():
+                # state0 started before the telemetry we have, so
+                # fetch the modeled MSID for an hour either side of it
+                tlm = self.get_telem_values(state0['tstart'] + 3600.0,
+                                            days=2.0/24.0,
+                                            msids=[self._telem_msid()])
+                ok = ((tlm['date'] >= state0['tstart'] - 700) &
+                      (tlm['date'] <= state0['tstart'] + 700))
             T_init = np.mean(tlm[self.msid][ok])
 
         state0.update({self.msid: T_init})
@@ -260,7 +967,8 @@ class ACISThermalCheck(object):
         return states, state0
 
     def make_week_predict(self, tstart, tstop, tlm, T_init, model_spec,
-                          outdir):
+                          outdir, ensemble=None, profile="full",
+                          backend="static", dt=None, coarse_dt=None):
         """
         Parameters
         ----------
@@ -279,31 +987,91 @@ class ACISThermalCheck(object):
             The path to the thermal model specification.
         outdir : string
             The directory to write outputs to.
+        ensemble : dict, optional
+            If set, also run a Monte Carlo ensemble of predictions, using
+            these keyword arguments to ``run_ensemble``. Default: None
+        profile : string, optional
+            Which plots to make: "full" for all of them, "summary" for
+            only the temperature plot (see
+            ``make_summary_prediction_plots``), and "data-only" for none.
+            Default: "full"
+        backend : string, optional
+            How the full set of plots is made: "static" for PNG images
+            and "interactive" for the data files of the interactive
+            report. Default: "static"
+        dt : float, optional
+            The time step of the model in seconds. Default: the time
+            step of the model specification.
+        coarse_dt : float, optional
+            If set, the coarse time step of a prediction run with
+            adaptive time steps, see ``calc_model``. Default: None
         """
         mylog.info('Calculating %s thermal model' % self.name.upper())
 
         # Get commanded states and set initial temperature
         states, state0 = self.get_states(tlm, T_init)
 
+        self.predict_model = None
+        self.predict_ensemble = None
+        inputs = [load_model_spec(model_spec), states, state0, tstart, tstop,
+                  self._ephem_inputs(state0['tstart'], tstop),
+                  self._backstop_inputs(), self._limits_inputs(), ensemble,
+                  profile, backend, dt, coarse_dt]
+        # If the stage is skipped, the model is only run again if a
+        # caller asks for it
+        remake = ("predict",
+                  lambda: self.calc_model(model_spec, states, state0['tstart'],
+                                          tstop, state0=state0, dt=dt,
+                                          coarse_dt=coarse_dt))
+        pred = self._run_stage("prediction", inputs, self._predict_from_states,
+                               tstart, tstop, states, state0, model_spec,
+                               outdir, ensemble=ensemble, profile=profile,
+                               backend=backend, dt=dt, coarse_dt=coarse_dt,
+                               remake=remake)
+        # The ensemble is kept with the outputs of the stage
+        pred = dict(pred)
+        self.predict_ensemble = pred.pop("ensemble_prediction", None)
+        return pred
+
+    def _predict_from_states(self, tstart, tstop, states, state0, model_spec,
+                             outdir, ensemble=None, profile="full",
+                             backend="static", dt=None, coarse_dt=None):
+        # Run the prediction from the commanded states and initial
+        # state, and make its plots and data files. See make_week_predict.
+
         # calc_model actually does the model calculation by running
         # model-specific code.
         model = self.calc_model(model_spec, states, state0['tstart'],
-                                tstop, state0=state0)
+                                tstop, state0=state0, dt=dt,
+                                coarse_dt=coarse_dt)
 
         self.predict_model = model
 
-        # Make the limit check plots and data files
-        plt.rc("axes", labelsize=14, titlesize=16, linewidth=1.5)
-        plt.rc("xtick", labelsize=14)
-        plt.rc("xtick.major", width=1.5, size=4)
-        plt.rc("xtick.minor", width=1.5, size=2)
-        plt.rc("ytick", labelsize=14)
-        plt.rc("ytick.major", width=1.5, size=4)
-        plt.rc("grid", linewidth=1.5)
+        if ensemble is not None:
+            from acis_thermal_check.ensemble import run_ensemble
+            # Don't fork the ensemble workers while a prefetch
+            # thread may still be running
+            self._wait_prefetch("rad_zones")
+            # The members are run on the same times as the prediction
+            self.predict_ensemble = run_ensemble(self, model_spec, states,
+                                                 state0, tstop, dt=dt,
+                                                 **ensemble)
 
         temps = {self.name: model.comp[self.msid].mvals}
-        # make_prediction_plots runs the validation of the model against previous telemetry
-        plots = self.make_prediction_plots(outdir, states, temps, tstart)
+
+        # Make the limit check plots and data files
+        if profile == "full" and backend == "interactive":
+            plots = self.make_interactive_prediction_plots(outdir, states,
+                                                           temps, tstart)
+        elif profile == "full":
+            self._set_plot_style()
+            plots = self.make_prediction_plots(outdir, states, temps, tstart)
+        elif profile == "summary":
+            self._set_plot_style()
+            plots = self.make_summary_prediction_plots(outdir, states, temps,
+                                                       tstart)
+        else:
+            plots = {}
         # make_prediction_viols determines the violations and prints them out
         viols = self.make_prediction_viols(temps, tstart)
         # write_states writes the commanded states to states.dat
@@ -311,13 +1079,62 @@ class ACISThermalCheck(object):
         # write_temps writes the temperatures to temperatures.dat
         self.write_temps(outdir, model.times, temps)
 
+        e_viols = None
+        if self.predict_ensemble is not None:
+            from acis_thermal_check.ensemble import ensemble_viols
+            e_viols = ensemble_viols(self.predict_ensemble, viols,
+                                     {"hi": self.plan_limit_hi,
+                                      "lo": self.plan_limit_lo},
+                                     tstart)
+            outfile = os.path.join(outdir, 'ensemble.dat')
+            mylog.info('Writing ensemble percentiles to %s' % outfile)
+            self.predict_ensemble.write(outfile, self.msid)
+
+        # Only the names of the plot files are needed from here on,
+        # not the figures themselves
+        plots = {name: {k: v for k, v in plot.items() if k not in ('fig', 'ax')}
+                 for name, plot in plots.items()}
+
         return dict(states=states, times=model.times, temps=temps,
-                    plots=plots, viols=viols)
+                    plots=plots, viols=viols, ensemble=e_viols,
+                    ensemble_prediction=self.predict_ensemble)
+
+    def _set_plot_style(self):
+        # The plot style of a run with a prediction, which is kept
+        # for the validation plots which follow
+        plt = get_pyplot()
+        plt.rc("axes", labelsize=14, titlesize=16, linewidth=1.5)
+        plt.rc("xtick", labelsize=14)
+        plt.rc("xtick.major", width=1.5, size=4)
+        plt.rc("xtick.minor", width=1.5, size=2)
+        plt.rc("ytick", labelsize=14)
+        plt.rc("ytick.major", width=1.5, size=4)
+        plt.rc("grid", linewidth=1.5)
+
+    def _ensemble_options(self, args):
+        """
+        Construct the keyword arguments for ``run_ensemble`` from the
+        command-line options, or return None if no ensemble is to be run.
+        """
+        if not args.ensemble:
+            return None
+        par_sigmas = {}
+        for item in args.ensemble_par or []:
+            name, sigma = item.split("=")
+            par_sigmas[name.strip()] = float(sigma)
+        return dict(n_members=args.ensemble,
+                    T_sigma=args.ensemble_T_sigma,
+                    pitch_sigma=args.ensemble_pitch_sigma,
+                    roll_sigma=args.ensemble_roll_sigma,
+                    par_sigmas=par_sigmas,
+                    n_jobs=args.ensemble_jobs,
+                    seed=args.ensemble_seed)
 
     def _calc_model_supp(self, model, state_times, states, ephem, state0):
         pass
 
-    def calc_model(self, model_spec, states, tstart, tstop, state0=None):
+    def calc_model(self, model_spec, states, tstart, tstop, state0=None,
+                   dt=None, coarse_dt=None):
         """
         This method sets up the model and runs it. "make_model" is
         provided by the specific model instances.
@@ -336,38 +1153,139 @@ class ACISThermalCheck(object):
             This is used to set the initial temperature. It's a dictionary
             indexed by MSID name so that more than one can be input if 
             necessary. 
+        dt : float, optional
+            The time step of the model in seconds. Default: the time
+            step of the model specification.
+        coarse_dt : float, optional
+            If set, run the model with adaptive time steps: this coarse
+            time step inside long commanded states, and ``dt`` around
+            the transitions between states (see
+            ``acis_thermal_check.stepping``). Default: None
         """
+        if coarse_dt is not None:
+            return self._calc_model_stepped(model_spec, states, tstart, tstop,
+                                            state0, dt, coarse_dt)
+
+        model = self.setup_model(model_spec, states, tstart, tstop,
+                                 state0=state0, dt=dt)
+
+        model.make()
+        model.calc()
+
+        return model
+
+    def _calc_model_stepped(self, model_spec, states, tstart, tstop, state0,
+                            dt, coarse_dt):
+        # Run the model in segments with fine or coarse time steps,
+        # each starting from the node temperatures at the end of the
+        # one before. See calc_model.
+        from acis_thermal_check.stepping import plan_steps, node_temps, \
+            segment_span, check_time_steps, SteppedModel
+        fit_dt = load_model_spec(model_spec).get("dt", 328.0)
+        if dt is None:
+            dt = fit_dt
+        check_time_steps(coarse_dt, fine_dt=dt, fit_dt=fit_dt)
+        steps = plan_steps(states, tstart, tstop, dt, coarse_dt)
+        mylog.info('Running the %s model in %d segments with time steps '
+                   'of %g s and %g s' % (self.name.upper(), len(steps), dt,
+                                          coarse_dt))
+        models = []
+        for i, (seg_start, seg_stop, seg_dt) in enumerate(steps):
+            start, stop = segment_span(seg_start, seg_stop, seg_dt,
+                                       last=i == len(steps) - 1)
+            models.append(self._new_model(model_spec, start, stop, dt=seg_dt))
+        # The ephemeris, pitch and roll are computed once for the times
+        # of every segment
+        times = np.unique(np.concatenate([model.times for model in models]))
+        ephem = self.get_ephemeris(tstart, tstop, times)
+        pitch, roll = calc_pitch_roll(times, ephem, states)
+        for i, model in enumerate(models):
+            idxs = np.searchsorted(times, model.times)
+            self._set_model_inputs(model, states, state0,
+                                   {k: v[idxs] for k, v in ephem.items()},
+                                   pitch[idxs], roll[idxs])
+            if i > 0:
+                for name, temp in node_temps(models[i - 1]).items():
+                    model.comp[name].set_data(temp)
+            model.make()
+            model.calc()
+        return SteppedModel(models)
+
+    def _new_model(self, model_spec, tstart, tstop, dt=None):
+        # Create a xija model with no inputs set
         import xija
-        model = xija.ThermalModel(self.name, start=tstart, stop=tstop,
-                                  model_spec=model_spec)
-        ephem = self.get_ephemeris(tstart, tstop, model.times)
+        # The time step of the specification is used unless another is given
+        kwargs = {} if dt is None else {"dt": dt}
+        return xija.ThermalModel(self.name, start=tstart, stop=tstop,
+                                 model_spec=load_model_spec(model_spec),
+                                 **kwargs)
+
+    def setup_model(self, model_spec, states, tstart, tstop, state0=None,
+                    ephem=None, pitch=None, roll=None, dt=None):
+        """
+        Create the xija model and set its inputs from the commanded
+        states, ephemeris, and initial state, without running it.
+        The ephemeris, pitch and roll can be supplied by the caller
+        when they have already been computed for the same model
+        times, e.g. when the same model is run many times.
+
+        Parameters
+        ----------
+        model_spec : string
+            Path to the JSON file containing the model specification.
+        states : NumPy record array
+            Commanded states
+        tstart : float
+            The start time of the model run.
+        tstop : float
+            The end time of the model run. 
+        state0 : dict, optional
+            This is used to set the initial temperature. It's a dictionary
+            indexed by MSID name so that more than one can be input if 
+            necessary. 
+        ephem : dict of NumPy arrays, optional
+            The orbit and solar ephemeris at the model times. Default is
+            to fetch it from the engineering archive.
+        pitch : NumPy array, optional
+            The pitch at the model times. Default is to compute it from
+            the commanded attitude and the ephemeris.
+        roll : NumPy array, optional
+            The off-nominal roll at the model times. Default is to compute
+            it from the commanded attitude and the ephemeris.
+        dt : float, optional
+            The time step of the model in seconds. Default: the time
+            step of the model specification.
+        """
+        model = self._new_model(model_spec, tstart, tstop, dt=dt)
+        if ephem is None:
+            ephem = self.get_ephemeris(tstart, tstop, model.times)
+        return self._set_model_inputs(model, states, state0, ephem, pitch, roll)
+
+    def _set_model_inputs(self, model, states, state0, ephem, pitch=None,
+                          roll=None):
+        # Set the inputs of a xija model, see setup_model
         state_times = np.array([states['tstart'], states['tstop']])
         model.comp['sim_z'].set_data(states['simpos'], state_times)
         model.comp['eclipse'].set_data(False)
         for name in ('ccd_count', 'fep_count', 'vid_board', 'clocking'):
             model.comp[name].set_data(states[name], state_times)
-        pitch, roll = calc_pitch_roll(model.times, ephem, states)
+        if pitch is None or roll is None:
+            calc_pitch, calc_roll = calc_pitch_roll(model.times, ephem, states)
+            if pitch is None:
+                pitch = calc_pitch
+            if roll is None:
+                roll = calc_roll
         model.comp['roll'].set_data(roll, model.times)
         model.comp['pitch'].set_data(pitch, model.times)
 
-        if self.name in ["psmc", "acisfp"] and state0 is not None:
-            # Detector housing heater contribution to heating
-            htrbfn = os.path.join(TASK_DATA, 'acis_thermal_check', 'data',
-                                  'dahtbon_history.rdb')
-            mylog.info('Reading file of dahtrb commands from file %s' % htrbfn)
-            htrb = ascii.read(htrbfn, format='rdb')
-            dh_heater_times = date2secs(htrb['time'])
-            dh_heater = htrb['dahtbon'].astype(bool)
-            model.comp['dh_heater'].set_data(dh_heater, dh_heater_times)
-
         if state0 is not None:
+            # Auxiliary inputs such as the detector housing heater history
+            from acis_thermal_check.model_inputs import set_static_inputs
+            set_static_inputs(model, self.name)
             model.comp[self.msid].set_data(state0[self.msid], None)
 
         self._calc_model_supp(model, state_times, states, ephem, state0)
 
-        model.make()
-        model.calc()
-
         return model
 
     def make_validation_viols(self, plots_validation):
@@ -439,11 +1357,11 @@ class ACISThermalCheck(object):
                       (times[change[0]] < load_start < times[change[1]])
             if in_load:
                 if times[change[0]] > load_start:
-                    datestart = DateTime(times[change[0]]).date
+                    datestart = to_date(times[change[0]])
                 else:
-                    datestart = DateTime(load_start).date
+                    datestart = to_date(load_start)
                 viol = {'datestart': datestart,
-                        'datestop': DateTime(times[change[1] - 1]).date,
+                        'datestop': to_date(times[change[1] - 1]),
                         '%stemp' % lim_type: op(temp[change[0]:change[1]])}
                 mylog.info('WARNING: %s violates %s limit ' % (self.msid,
                                                               lim_name) +
@@ -493,6 +1411,7 @@ class ACISThermalCheck(object):
         states : NumPy record array
             The commanded states to be written to the file.
         """
+        from astropy.table import Table
         outfile = os.path.join(outdir, 'states.dat')
         mylog.info('Writing states to %s' % outfile)
         states_table = Table(states, copy=False)
@@ -514,10 +1433,11 @@ class ACISThermalCheck(object):
         temps : NumPy array
             Temperatures in Celsius
         """
+        from astropy.table import Table
         outfile = os.path.join(outdir, 'temperatures.dat')
         mylog.info('Writing temperatures to %s' % outfile)
         T = temps[self.name]
-        temp_table = Table([times, secs2date(times), T],
+        temp_table = Table([times, to_date(times), T],
                            names=['time', 'date', self.msid],
                            copy=False)
         temp_table['time'].format = '%.2f'
@@ -526,6 +1446,7 @@ class ACISThermalCheck(object):
 
     def _make_state_plots(self, plots, num_figs, w1, plot_start,
                           outdir, states, load_start, figsize=(12, 6)):
+        from Ska.Matplotlib import pointpair
         # Make a plot of ACIS CCDs and SIM-Z position
         plots['pow_sim'] = plot_two(
             fig_id=num_figs+1,
@@ -585,15 +1506,136 @@ class ACISThermalCheck(object):
             The start time of the load in seconds from the beginning of the
             mission.
         """
+        plots = self.make_temperature_plot(outdir, temps, load_start)
+        load_start, plot_start = self._plot_range(load_start)
+
+        # The next line is to ensure that the width of the axes
+        # of all the weekly prediction plots are the same.
+        w1, _ = plots[self.name]['fig'].get_size_inches()
+
+        self._make_state_plots(plots, 1, w1, plot_start,
+                               outdir, states, load_start)
+
+        plots['default'] = plots[self.name]
+
+        return plots
+
+    def make_summary_prediction_plots(self, outdir, states, temps,
+                                      load_start):
+        """
+        Make the plots of the thermal prediction for the "summary"
+        output profile, which by default is only the temperature plot
+        made by ``make_temperature_plot``. Models which make their own
+        prediction plots can override this to make their own summary.
+        The parameters are the same as those of
+        ``make_prediction_plots``.
+        """
+        return self.make_temperature_plot(outdir, temps, load_start)
+
+    def make_interactive_prediction_plots(self, outdir, states, temps,
+                                          load_start):
+        """
+        Write the data files of the plots of the thermal prediction and
+        the commanded states for the interactive report, which are the
+        same as those made by ``make_prediction_plots``. Models which
+        make their own prediction plots override this as well, or the
+        static report is made for them instead (see ``run``).
+
+        Parameters
+        ----------
+        outdir : string
+            The path to the output directory.
+        states : NumPy record array
+            Commanded states
+        temps : dict of NumPy arrays
+            Dictionary of temperature arrays
+        load_start : float
+            The start time of the load in seconds from the beginning of the
+            mission.
+        """
+        from acis_thermal_check.interactive import InteractivePlot
         plots = {}
 
         times = self.predict_model.times
+        xlim = (max(load_start - 2.0 * 86400.0, times[0]), times[-1])
+
+        mylog.info('Making interactive temperature prediction plots')
+        plot = InteractivePlot(self.msid.lower(), title=self.msid.upper(),
+                               ylabel='Temperature (C)', ylabel2='Pitch (deg)',
+                               ylim2=(40, 180), xlim=xlim, group="prediction")
+        plot.add_series(times, temps[self.name], color=thermal_blue)
+        plot.add_series(times, self.predict_model.comp["pitch"].mvals,
+                        color='magenta', axis=1)
+        # Add horizontal lines for the planning and caution limits,
+        # which some models (e.g. ACIS FP) do not have
+        limits = [(self.yellow_hi, 'gold'), (self.plan_limit_hi, 'C2')]
+        if self.flag_cold_viols:
+            limits += [(self.yellow_lo, 'gold'), (self.plan_limit_lo, 'C2')]
+        for limit, color in limits:
+            if limit is not None:
+                plot.add_hline(limit, color)
+        if self.predict_ensemble is not None:
+            # Shade the 5-95% and 16-84% bands of the ensemble
+            pct = self.predict_ensemble.percentiles
+            for lo, hi, alpha in [(5, 95, 0.15), (16, 84, 0.3)]:
+                plot.add_series(self.predict_ensemble.times, pct[lo],
+                                y2=pct[hi], kind="band", color=thermal_blue,
+                                alpha=alpha)
+        plot.add_vline(load_start, 'g')
+        plots[self.name] = {'filename': plot.write(outdir)}
+
+        # The commanded states are drawn as steps
+        tstates = np.column_stack([states['tstart'], states['tstop']]).ravel()
+        plot = InteractivePlot('pow_sim', title='ACIS CCDs/FEPs and SIM-Z position',
+                               ylabel='CCD/FEP Count', ylabel2='SIM-Z (steps)',
+                               ylim=(-0.1, 6.1), ylim2=(-105000, 105000),
+                               xlim=xlim, group="prediction")
+        plot.add_series(tstates, np.repeat(states['ccd_count'], 2),
+                        label='CCDs', color=thermal_blue)
+        plot.add_series(tstates, np.repeat(states['fep_count'], 2),
+                        label='FEPs', color=thermal_blue, dash=[8, 4])
+        plot.add_series(tstates, np.repeat(states['simpos'], 2),
+                        color='magenta', axis=1)
+        plot.add_vline(load_start, 'g')
+        plots['pow_sim'] = {'filename': plot.write(outdir)}
+
+        plot = InteractivePlot('roll', title='Off-Nominal Roll',
+                               ylabel='Roll Angle (deg)', ylim=(-20.0, 20.0),
+                               xlim=xlim, group="prediction")
+        plot.add_series(times, self.predict_model.comp["roll"].mvals,
+                        color=thermal_blue)
+        plot.add_vline(load_start, 'g')
+        plots['roll'] = {'filename': plot.write(outdir)}
 
-        # Start time of loads being reviewed expressed in units for plotdate()
-        load_start = cxctime2plotdate([load_start])[0]
-        # Value for left side of plots
-        plot_start = max(load_start-2.0, 
-                         cxctime2plotdate([times[0]])[0])
+        plots['default'] = plots[self.name]
+
+        return plots
+
+    def make_temperature_plot(self, outdir, temps, load_start):
+        """
+        Make the plot of the predicted temperature and pitch, which
+        is the first of the prediction plots.
+
+        Parameters
+        ----------
+        outdir : string
+            The path to the output directory.
+        temps : dict of NumPy arrays
+            Dictionary of temperature arrays
+        load_start : float
+            The start time of the load in seconds from the beginning of the
+            mission.
+
+        Returns
+        -------
+        A dictionary of plots, with the temperature plot keyed on the
+        name of the model.
+        """
+        from Ska.Matplotlib import cxctime2plotdate
+        plots = {}
+
+        times = self.predict_model.times
+        load_start, plot_start = self._plot_range(load_start)
 
         w1 = None
         mylog.info('Making temperature prediction plots')
@@ -604,19 +1646,35 @@ class ACISThermalCheck(object):
                                     xlabel='Date', ylabel='Temperature (C)',
                                     ylabel2='Pitch (deg)', ylim2=(40, 180),
                                     width=w1, load_start=load_start)
-        # Add horizontal lines for the planning and caution limits
+        # Add horizontal lines for the planning and caution limits,
+        # which some models (e.g. ACIS FP) do not have
         ymin, ymax = plots[self.name]['ax'].get_ylim()
-        ymax = max(self.yellow_hi+1, ymax)
-        plots[self.name]['ax'].axhline(self.yellow_hi, linestyle='-', color='gold',
-                                       linewidth=2.0)
-        plots[self.name]['ax'].axhline(self.plan_limit_hi, linestyle='-', 
-                                       color='C2', linewidth=2.0)
+        if self.yellow_hi is not None:
+            ymax = max(self.yellow_hi+1, ymax)
+            plots[self.name]['ax'].axhline(self.yellow_hi, linestyle='-',
+                                           color='gold', linewidth=2.0)
+        if self.plan_limit_hi is not None:
+            plots[self.name]['ax'].axhline(self.plan_limit_hi, linestyle='-',
+                                           color='C2', linewidth=2.0)
         if self.flag_cold_viols:
-            ymin = min(self.yellow_lo-1, ymin)
-            plots[self.name]['ax'].axhline(self.yellow_lo, linestyle='-', color='gold',
-                                           linewidth=2.0, zorder=-8)
-            plots[self.name]['ax'].axhline(self.plan_limit_lo, linestyle='-',
-                                           color='C2', linewidth=2.0, zorder=-8)
+            if self.yellow_lo is not None:
+                ymin = min(self.yellow_lo-1, ymin)
+                plots[self.name]['ax'].axhline(self.yellow_lo, linestyle='-',
+                                               color='gold', linewidth=2.0,
+                                               zorder=-8)
+            if self.plan_limit_lo is not None:
+                plots[self.name]['ax'].axhline(self.plan_limit_lo, linestyle='-',
+                                               color='C2', linewidth=2.0,
+                                               zorder=-8)
+        if self.predict_ensemble is not None:
+            # Shade the 5-95% and 16-84% bands of the ensemble
+            et = cxctime2plotdate(self.predict_ensemble.times)
+            pct = self.predict_ensemble.percentiles
+            ax = plots[self.name]['ax']
+            ax.fill_between(et, pct[5], pct[95], color=thermal_blue,
+                            alpha=0.15, linewidth=0, zorder=-5)
+            ax.fill_between(et, pct[16], pct[84], color=thermal_blue,
+                            alpha=0.3, linewidth=0, zorder=-4)
         plots[self.name]['ax'].set_ylim(ymin, ymax)
         filename = self.msid.lower() + '.png'
         outfile = os.path.join(outdir, filename)
@@ -624,17 +1682,17 @@ class ACISThermalCheck(object):
         plots[self.name]['fig'].savefig(outfile)
         plots[self.name]['filename'] = filename
 
-        # The next line is to ensure that the width of the axes
-        # of all the weekly prediction plots are the same.
-        w1, _ = plots[self.name]['fig'].get_size_inches()
-
-        self._make_state_plots(plots, 1, w1, plot_start,
-                               outdir, states, load_start)
-
-        plots['default'] = plots[self.name]
-
         return plots
 
+    def _plot_range(self, load_start):
+        # The start time of the load being reviewed and the left side
+        # of the prediction plots, in units for plotdate()
+        from Ska.Matplotlib import cxctime2plotdate
+        load_start = cxctime2plotdate([load_start])[0]
+        plot_start = max(load_start-2.0,
+                         cxctime2plotdate([self.predict_model.times[0]])[0])
+        return load_start, plot_start
+
     def get_histogram_mask(self, tlm, limits):
         """
         This method determines which values of telemetry
@@ -652,21 +1710,56 @@ class ACISThermalCheck(object):
         limits : list of floats or 2-tuples of floats
             The limit or limits to use in the masking.
         """
-        masks = []
-        for i, limit in enumerate(limits):
-            if isinstance(limit, tuple):
-                mask = (tlm[self.msid] >= limit[0]) & (tlm[self.msid] <= limit[1])
-            else:
-                op = getattr(np, self.hist_ops[i])
-                mask = op(tlm[self.msid], limit)
-            masks.append(mask)
-        return masks
+        bitmask = calc_band_bitmask(tlm[self.msid], limits, self.hist_ops)
+        return [(bitmask & np.uint64(1 << i)) > 0 for i in range(len(limits))]
 
-    def make_validation_plots(self, tlm, model_spec, outdir, run_start):
+    def get_histogram_bitmask(self, tlm, limits):
         """
-        Make validation output plots by running the thermal model from a
-        time in the past forward to the present and compare it to real
-        telemetry
+        Determine which of the histogram limit bands each value of
+        telemetry falls in, packed into the bits of an integer array
+        (see ``calc_band_bitmask``).
+
+        Parameters
+        ----------
+        tlm : NumPy record array
+            NumPy record array of telemetry
+        limits : list of floats or 2-tuples of floats
+            The limit or limits to use in the masking.
+        """
+        if type(self).get_histogram_mask is not ACISThermalCheck.get_histogram_mask:
+            # A subclass has its own masks, so pack those instead
+            bitmask = np.zeros(len(tlm), dtype=np.uint64)
+            for i, mask in enumerate(self.get_histogram_mask(tlm, limits)):
+                bitmask[mask] |= np.uint64(1 << i)
+            return bitmask
+        return calc_band_bitmask(tlm[self.msid], limits, self.hist_ops)
+
+    def describe_histogram_bands(self):
+        """
+        Describe each of the histogram limit bands for the report.
+
+        Returns
+        -------
+        A list with a dictionary for each band, giving a description
+        of the points in the band and the color of its histogram.
+        """
+        bands = []
+        for i, limit in enumerate(self.hist_limit):
+            if isinstance(limit, (tuple, list)):
+                desc = "%s <= %s <= %s degC" % (limit[0], self.msid.upper(),
+                                                limit[1])
+            else:
+                op = self.hist_ops[i]
+                desc = "%s %s %s degC" % (self.msid.upper(),
+                                          op_map.get(op, op), limit)
+            color = hist_band_colors[i % len(hist_band_colors)][1]
+            bands.append({"desc": desc, "color": color})
+        return bands
+
+    def calc_validation(self, tlm, model_spec, states=None):
+        """
+        Run the thermal model over the span of the telemetry, and
+        interpolate the telemetry to the model times.
 
         Parameters
         ----------
@@ -674,14 +1767,20 @@ class ACISThermalCheck(object):
             NumPy record array of telemetry
         model_spec : string
             The path to the thermal model specification.
-        outdir : string
-            The directory to write outputs to.
-        run_start : string
-            The starting date/time of the run. 
+        states : NumPy record array, optional
+            The commanded states covering the span of the telemetry.
+            Default is to get them from the state builder.
+
+        Returns
+        -------
+        The model, an OrderedDict of the modeled quantities keyed on
+        MSID, the telemetry at the model times, and a mask of the times
+        which are good for validation.
         """
         start = tlm['date'][0]
         stop = tlm['date'][-1]
-        states = self.state_builder.get_validation_states(start, stop)
+        if states is None:
+            states = self.state_builder.get_validation_states(start, stop)
 
         mylog.info('Calculating %s thermal model for validation' % self.name.upper())
 
@@ -689,7 +1788,14 @@ class ACISThermalCheck(object):
         # to the end, so we can compare its outputs to the real values
         model = self.calc_model(model_spec, states, start, stop)
 
-        self.validate_model = model
+        pred, tlm, good_mask = self._validation_outputs(model, tlm)
+
+        return model, pred, tlm, good_mask
+
+    def _validation_outputs(self, model, tlm):
+        # Get the modeled quantities from a validation model, the
+        # telemetry at the model times and the mask of the times
+        # which are good for validation
 
         # Use an OrderedDict here because we want the plots on the validation
         # page to appear in this order
@@ -704,50 +1810,155 @@ class ACISThermalCheck(object):
                                      method='nearest')
         tlm = tlm[idxs]
 
-        # Set up labels for validation plots
-        labels = {self.msid: 'Degrees (C)',
-                  'pitch': 'Pitch (degrees)',
-                  'tscpos': 'SIM-Z (steps/1000)',
-                  'roll': 'Off-Nominal Roll (degrees)'}
-
-        scales = {'tscpos': 1000.}
-
-        fmts = {self.msid: '%.2f',
-                'pitch': '%.3f',
-                'tscpos': '%d',
-                'roll': '%.3f'}
-
         # Set up a mask of "good times" for which the validation is
         # "valid", e.g., not during situations where we expect in
         # advance that telemetry and model data will not match. This
         # is so we do not flag violations during these times
-        good_mask = np.ones(len(tlm), dtype='bool')
         if hasattr(model, "bad_times"):
-            for interval in model.bad_times:
-                bad = ((tlm['date'] >= DateTime(interval[0]).secs)
-                    & (tlm['date'] < DateTime(interval[1]).secs))
-                good_mask[bad] = False
+            bad_starts, bad_stops = parse_intervals(model.bad_times)
+            good_mask = ~interval_mask(tlm['date'], bad_starts, bad_stops)
+        else:
+            good_mask = np.ones(len(tlm), dtype='bool')
+
+        return pred, tlm, good_mask
+
+    def calc_residuals(self, msid, tlm, pred, good_mask):
+        """
+        Compute the sorted residuals (data - model) of a validation
+        quantity, for the points used in the quantiles and histograms.
+
+        Parameters
+        ----------
+        msid : string
+            The quantity to compute the residuals for.
+        tlm : NumPy record array
+            The telemetry at the model times.
+        pred : dict of NumPy arrays
+            The modeled quantities.
+        good_mask : NumPy boolean array
+            The mask of times which are good for validation.
+
+        Returns
+        -------
+        A list of the sorted residuals of the points in each histogram
+        band for the modeled MSID, or a list with the sorted residuals
+        of all of the points for any other quantity.
+        """
+        resid = tlm[msid] - pred[msid]
+        if msid != self.msid:
+            return [np.sort(resid)]
+        # Figure out which histogram band each point is in, and
+        # drop the points which are not good for validation
+        bitmask = self.get_histogram_bitmask(tlm, self.hist_limit)
+        bitmask[~good_mask] = 0
+        return [np.sort(resid[(bitmask & np.uint64(1 << i)) > 0])
+                for i in range(len(self.hist_limit))]
+
+    def calc_residual_sketches(self, tlm, pred, good_mask):
+        """
+        Make mergeable sketches of the residuals (data - model) of each
+        validation quantity (see ``acis_thermal_check.sketches``), of
+        the same points as ``calc_residuals``.
+
+        Parameters
+        ----------
+        tlm : NumPy record array
+            The telemetry at the model times.
+        pred : dict of NumPy arrays
+            The modeled quantities.
+        good_mask : NumPy boolean array
+            The mask of times which are good for validation.
+
+        Returns
+        -------
+        An OrderedDict keyed on the validated quantity, with a list of
+        the sketches of the points in each histogram band for the
+        modeled MSID, or a list with the sketch of all of the points
+        for any other quantity.
+        """
+        from acis_thermal_check.sketches import ResidualSketch, residual_width
+        sketches = OrderedDict()
+        for msid in pred:
+            width = residual_width(msid)
+            sketches[msid] = [ResidualSketch(width, diff) for diff in
+                              self.calc_residuals(msid, tlm, pred, good_mask)]
+        return sketches
+
+    def make_validation_plots(self, tlm, model_spec, outdir, run_start,
+                              states=None, validation=None):
+        """
+        Make validation output plots by running the thermal model from a
+        time in the past forward to the present and compare it to real
+        telemetry
+
+        Parameters
+        ----------
+        tlm : NumPy record array
+            NumPy record array of telemetry
+        model_spec : string
+            The path to the thermal model specification.
+        outdir : string
+            The directory to write outputs to.
+        run_start : string
+            The starting date/time of the run. 
+        states : NumPy record array, optional
+            The commanded states covering the span of the telemetry.
+            Default is to get them from the state builder.
+        validation : tuple, optional
+            The outputs of a validation of the same telemetry which has
+            already been run, as returned by ``calc_validation``, to
+            make the plots from. Default is to run the validation model.
+        """
+        import Ska.Matplotlib
+        from Ska.Matplotlib import cxctime2plotdate, plot_cxctime
+
+        start = tlm['date'][0]
+        stop = tlm['date'][-1]
+
+        if validation is None:
+            validation = self.calc_validation(tlm, model_spec, states=states)
+        model, pred, tlm, good_mask = validation
+
+        self.validate_model = model
+
+        # Set up labels for validation plots
+        labels, scales = self._validation_labels()
 
         # find perigee passages
-        rzs = events.rad_zones.filter(start, stop)
+        rzs = self.get_rad_zones(start, stop)
 
         plots = []
         mylog.info('Making %s model validation plots and quantile table' % self.name.upper())
-        quantiles = (1, 5, 16, 50, 84, 95, 99)
         # store lines of quantile table in a string and write out later
         quant_table = ''
-        quant_head = ",".join(['MSID'] + ["quant%d" % x for x in quantiles])
+        quant_head = ",".join(['MSID'] + ["quant%d" % x for x in validation_quantiles])
         quant_table += quant_head + "\n"
         xmin, xmax = cxctime2plotdate(model.times)[[0, -1]]
-        for fig_id, msid in enumerate(pred.keys()):
+        for msid in pred.keys():
             plot = dict(msid=msid.upper())
-            fig = plt.figure(10 + fig_id, figsize=(12, 6))
-            fig.clf()
+            tmpl = get_figure_template(("valid", msid), (12, 6))
+            fig = tmpl.fig
             scale = scales.get(msid, 1.0)
-            ticklocs, fig, ax = plot_cxctime(model.times, pred[msid] / scale,
-                                             fig=fig, ls='-', lw=4, color=thermal_red)
-            ticklocs, fig, ax = plot_cxctime(model.times, tlm[msid] / scale,
-                                             fig=fig, ls='-', lw=2, color=thermal_blue)
+            # Only draw the samples which are visible at the plot resolution
+            n_buckets = plot_buckets(fig)
+            idxs = decimate_indices(n_buckets, pred[msid])
+            x_pred, y_pred = model.times[idxs], pred[msid][idxs] / scale
+            idxs = decimate_indices(n_buckets, tlm[msid])
+            x_tlm, y_tlm = model.times[idxs], tlm[msid][idxs] / scale
+            if tmpl.new:
+                ticklocs, fig, ax = plot_cxctime(x_pred, y_pred, fig=fig, ls='-',
+                                                 lw=4, color=thermal_red)
+                ticklocs, fig, ax = plot_cxctime(x_tlm, y_tlm, fig=fig, ls='-',
+                                                 lw=2, color=thermal_blue)
+                ax.grid()
+                tmpl.finish([ax])
+            else:
+                ax = tmpl.axes[0]
+                ax.lines[0].set_data(cxctime2plotdate(x_pred), y_pred)
+                ax.lines[1].set_data(cxctime2plotdate(x_tlm), y_tlm)
+                ax.set_autoscaley_on(True)
+                ax.relim()
+                ax.autoscale_view(scalex=False)
             if np.any(~good_mask):
                 ticklocs, fig, ax = plot_cxctime(model.times[~good_mask], 
                                                  tlm[msid][~good_mask] / scale,
@@ -755,13 +1966,8 @@ class ACISThermalCheck(object):
             ax.set_title(msid.upper() + ' validation; data: blue, model: red')
             ax.set_xlabel("Date")
             ax.set_ylabel(labels[msid])
-            ax.grid()
             # add lines for perigee passages
-            for rz in rzs:
-                ptimes = cxctime2plotdate([rz.tstart, rz.tstop])
-                for ptime in ptimes:
-                    ax.axvline(ptime, ls='--', color='C2', 
-                               linewidth=2, zorder=-10)
+            plot_rad_zones(ax, rzs)
             # Add horizontal lines for the planning and caution limits
             # or the limits for the focal plane model. Make sure we can
             # see all of the limits.
@@ -786,46 +1992,35 @@ class ACISThermalCheck(object):
                         ymin = min(self.yellow_lo-1, ymin)
                 ax.set_ylim(ymin, ymax)
             ax.set_xlim(xmin, xmax)
+            Ska.Matplotlib.set_time_ticks(ax)
             filename = msid + '_valid.png'
             outfile = os.path.join(outdir, filename)
             mylog.info('Writing plot file %s' % outfile)
             fig.savefig(outfile)
             plot['lines'] = filename
 
-            # Figure out histogram masks
-            if msid == self.msid:
-                masks = self.get_histogram_mask(tlm, self.hist_limit)
-                ok = masks[0] & good_mask
-                # Some models have a second histogram limit
-                if len(self.hist_limit) == 2:
-                    ok2 = masks[1] & good_mask
-                else:
-                    ok2 = np.zeros(tlm[msid].size, dtype=bool)
-            else:
-                ok = np.ones(tlm[msid].size, dtype=bool)
-                ok2 = np.zeros(tlm[msid].size, dtype=bool)
-            diff = np.sort(tlm[msid][ok] - pred[msid][ok])
-            if ok2.any():
-                diff2 = np.sort(tlm[msid][ok2] - pred[msid][ok2])
-            quant_line = "%s" % msid
-            for quant in quantiles:
-                quant_val = diff[(len(diff) * quant) // 100]
-                plot['quant%02d' % quant] = fmts[msid] % quant_val
-                quant_line += (',' + fmts[msid] % quant_val)
-            quant_table += quant_line + "\n"
+            diffs = self.calc_residuals(msid, tlm, pred, good_mask)
+            quant_table += self._calc_quantiles(plot, msid, diffs) + "\n"
             # We make two histogram plots for each validation,
             # one with linear and another with log scaling.
-            fig, axes = plt.subplots(ncols=2, num=20+fig_id, figsize=(12.0, 3.5))
+            tmpl = get_figure_template(("valid_hist", msid), (12.0, 3.5))
+            fig = tmpl.fig
+            if tmpl.new:
+                axes = fig.subplots(ncols=2)
+                fig.subplots_adjust(bottom=0.18, left=0.15, wspace=0.6)
+                tmpl.finish(axes)
             for i, histscale in enumerate(('log', 'lin')):
-                ax = axes[i]
-                ax.hist(diff / scale, bins=50, log=(histscale == 'log'),
-                        histtype='step', color=thermal_blue, linewidth=2)
-                if ok2.any():
-                    ax.hist(diff2 / scale, bins=50, log=(histscale == 'log'),
-                            color=thermal_red, histtype='step', linewidth=2)
+                # The histograms are drawn again from scratch
+                ax = tmpl.axes[i]
+                ax.cla()
+                for j, band_diff in enumerate(diffs):
+                    if j > 0 and len(band_diff) == 0:
+                        continue
+                    color = hist_band_colors[j % len(hist_band_colors)][0]
+                    ax.hist(band_diff / scale, bins=50, log=(histscale == 'log'),
+                            histtype='step', color=color, linewidth=2)
                 ax.set_title(msid.upper() + ' residuals: data - model')
                 ax.set_xlabel(labels[msid])
-            fig.subplots_adjust(bottom=0.18, left=0.15, wspace=0.6)
             filename = '%s_valid_hist.png' % msid
             outfile = os.path.join(outdir, filename)
             mylog.info('Writing plot file %s' % outfile)
@@ -834,26 +2029,33 @@ class ACISThermalCheck(object):
 
             plots.append(plot)
 
-        fig = plt.figure(10+fig_id, figsize=(12, 6))
-        fig.clf()
-        ticklocs, fig, ax = plot_cxctime(model.times, model.comp['ccd_count'].dvals,
-                                         fig=fig, ls='-', lw=2, color=thermal_blue)
-        ticklocs, fig, ax = plot_cxctime(model.times, model.comp['fep_count'].dvals,
-                                         fig=fig, ls='--', lw=2, color=thermal_blue)
-        ax.set_ylim(0, 6.5)
-        ax.set_title("ACIS CCD/FEPs")
-        ax.set_xlabel("Date")
-        ax.set_ylabel("CCD/FEP Count")
-        ax.grid()
+        tmpl = get_figure_template(("valid", "ccd_count"), (12, 6))
+        fig = tmpl.fig
+        ccd_count = model.comp['ccd_count'].dvals
+        fep_count = model.comp['fep_count'].dvals
+        idxs = decimate_indices(plot_buckets(fig), ccd_count, fep_count)
+        if tmpl.new:
+            ticklocs, fig, ax = plot_cxctime(model.times[idxs], ccd_count[idxs],
+                                             fig=fig, ls='-', lw=2, color=thermal_blue)
+            ticklocs, fig, ax = plot_cxctime(model.times[idxs], fep_count[idxs],
+                                             fig=fig, ls='--', lw=2, color=thermal_blue)
+            ax.set_ylim(0, 6.5)
+            ax.set_title("ACIS CCD/FEPs")
+            ax.set_xlabel("Date")
+            ax.set_ylabel("CCD/FEP Count")
+            ax.grid()
+            ax.lines[0].set_label('CCDs')
+            ax.lines[1].set_label('FEPs')
+            tmpl.finish([ax])
+        else:
+            ax = tmpl.axes[0]
+            xt = cxctime2plotdate(model.times[idxs])
+            ax.lines[0].set_data(xt, ccd_count[idxs])
+            ax.lines[1].set_data(xt, fep_count[idxs])
         ax.set_xlim(xmin, xmax)
-        ax.lines[0].set_label('CCDs')
-        ax.lines[1].set_label('FEPs')
+        Ska.Matplotlib.set_time_ticks(ax)
         # add lines for perigee passages
-        for rz in rzs:
-            ptimes = cxctime2plotdate([rz.tstart, rz.tstop])
-            for ptime in ptimes:
-                ax.axvline(ptime, ls='--', color='C2',
-                           linewidth=2, zorder=-10)
+        plot_rad_zones(ax, rzs)
         ax.legend(fancybox=True, framealpha=0.5, loc=2)
         filename = 'ccd_count_valid.png'
         outfile = os.path.join(outdir, filename)
@@ -865,27 +2067,29 @@ class ACISThermalCheck(object):
 
         plots.append(plot)
 
-        fig_id += 1
-
         if 'earthheat__fptemp' in model.comp:
 
-            fig = plt.figure(10 + fig_id, figsize=(12, 6))
-            fig.clf()
-            ticklocs, fig, ax = plot_cxctime(model.times, model.comp['earthheat__fptemp'].dvals,
-                                             fig=fig, ls='-', lw=2, color=thermal_blue)
-            ax.set_title("Earth Solid Angle in Rad FOV")
-            ax.set_xlabel("Date")
-            ax.set_ylabel("Earth Solid Angle (sr)")
-            ax.set_yscale("log")
-            ax.grid()
+            tmpl = get_figure_template(("valid", "earth_solid_angle"), (12, 6))
+            fig = tmpl.fig
+            esa = model.comp['earthheat__fptemp'].dvals
+            idxs = decimate_indices(plot_buckets(fig), esa)
+            if tmpl.new:
+                ticklocs, fig, ax = plot_cxctime(model.times[idxs], esa[idxs],
+                                                 fig=fig, ls='-', lw=2, color=thermal_blue)
+                ax.set_title("Earth Solid Angle in Rad FOV")
+                ax.set_xlabel("Date")
+                ax.set_ylabel("Earth Solid Angle (sr)")
+                ax.set_yscale("log")
+                ax.grid()
+                ax.set_ylim(1.0e-3, 1.0)
+                tmpl.finish([ax])
+            else:
+                ax = tmpl.axes[0]
+                ax.lines[0].set_data(cxctime2plotdate(model.times[idxs]), esa[idxs])
             ax.set_xlim(xmin, xmax)
-            ax.set_ylim(1.0e-3, 1.0)
+            Ska.Matplotlib.set_time_ticks(ax)
             # add lines for perigee passages
-            for rz in rzs:
-                ptimes = cxctime2plotdate([rz.tstart, rz.tstop])
-                for ptime in ptimes:
-                    ax.axvline(ptime, ls='--', color='C2',
-                               linewidth=2, zorder=-10)
+            plot_rad_zones(ax, rzs)
             filename = 'earth_solid_angle_valid.png'
             outfile = os.path.join(outdir, filename)
             mylog.info('Writing plot file %s' % outfile)
@@ -896,8 +2100,231 @@ class ACISThermalCheck(object):
 
             plots.append(plot)
 
-            fig_id += 1
+        self._write_validation_data(outdir, run_start, quant_table, pred, tlm)
+
+        return plots
+
+    def make_validation_stats(self, tlm, model_spec, outdir, run_start,
+                              states=None):
+        """
+        Run the validation model and compute the quantiles of its
+        residuals, as ``make_validation_plots`` does, but without
+        making any plots.
+
+        Parameters
+        ----------
+        tlm : NumPy record array
+            NumPy record array of telemetry
+        model_spec : string
+            The path to the thermal model specification.
+        outdir : string
+            The directory to write outputs to.
+        run_start : string
+            The starting date/time of the run.
+        states : NumPy record array, optional
+            The commanded states covering the span of the telemetry.
+            Default is to get them from the state builder.
+
+        Returns
+        -------
+        A list with a dictionary of the quantiles of each validated
+        quantity, like those returned by ``make_validation_plots``.
+        """
+        model, pred, tlm, good_mask = self.calc_validation(tlm, model_spec,
+                                                           states=states)
+        self.validate_model = model
+        return self.calc_validation_stats(pred, tlm, good_mask, outdir,
+                                          run_start)
+
+    def calc_validation_stats(self, pred, tlm, good_mask, outdir, run_start):
+        """
+        Compute the quantiles of the residuals of the modeled quantities
+        of a validation, and write them out.
 
+        Parameters
+        ----------
+        pred : dict of NumPy arrays
+            The modeled quantities, keyed on MSID.
+        tlm : NumPy record array
+            The telemetry at the model times.
+        good_mask : NumPy boolean array
+            The mask of times which are good for validation.
+        outdir : string
+            The directory to write outputs to.
+        run_start : string
+            The starting date/time of the run.
+
+        Returns
+        -------
+        A list with a dictionary of the quantiles of each validated
+        quantity, like those returned by ``make_validation_plots``.
+        """
+        mylog.info('Making %s model quantile table' % self.name.upper())
+        stats = []
+        quant_table = ",".join(['MSID'] + ["quant%d" % x for x in validation_quantiles])
+        quant_table += "\n"
+        for msid in pred:
+            stat = dict(msid=msid.upper())
+            diffs = self.calc_residuals(msid, tlm, pred, good_mask)
+            quant_table += self._calc_quantiles(stat, msid, diffs) + "\n"
+            stats.append(stat)
+        self._write_validation_data(outdir, run_start, quant_table, pred, tlm)
+        return stats
+
+    def make_interactive_validation_plots(self, tlm, model_spec, outdir,
+                                          run_start, states=None):
+        """
+        Run the validation model and write the data files of the
+        validation plots for the interactive report, which are the
+        same as those made by ``make_validation_plots``.
+
+        Parameters
+        ----------
+        tlm : NumPy record array
+            NumPy record array of telemetry
+        model_spec : string
+            The path to the thermal model specification.
+        outdir : string
+            The directory to write outputs to.
+        run_start : string
+            The starting date/time of the run.
+        states : NumPy record array, optional
+            The commanded states covering the span of the telemetry.
+            Default is to get them from the state builder.
+        """
+        from acis_thermal_check.interactive import InteractivePlot
+
+        start = tlm['date'][0]
+        stop = tlm['date'][-1]
+
+        model, pred, tlm, good_mask = self.calc_validation(tlm, model_spec,
+                                                           states=states)
+
+        self.validate_model = model
+
+        labels, scales = self._validation_labels()
+
+        # find perigee passages
+        rzs = self.get_rad_zones(start, stop)
+
+        def add_rad_zones(plot):
+            for t in np.concatenate([rzs['tstart'], rzs['tstop']]):
+                plot.add_vline(t, 'C2', dash=[6, 4])
+
+        plots = []
+        mylog.info('Making %s model interactive validation plots and '
+                   'quantile table' % self.name.upper())
+        quant_table = ",".join(['MSID'] + ["quant%d" % x for x in validation_quantiles])
+        quant_table += "\n"
+        for msid in pred:
+            stat = dict(msid=msid.upper())
+            scale = scales.get(msid, 1.0)
+            plot = InteractivePlot('%s_valid' % msid,
+                                   title=msid.upper() + ' validation',
+                                   ylabel=labels[msid], group="validation")
+            plot.add_series(model.times, pred[msid] / scale, label='Model',
+                            color=thermal_red, width=4)
+            plot.add_series(model.times, tlm[msid] / scale, label='Data',
+                            color=thermal_blue)
+            if np.any(~good_mask):
+                plot.add_series(model.times[~good_mask],
+                                tlm[msid][~good_mask] / scale,
+                                label='Bad data', color='c', kind="points")
+            add_rad_zones(plot)
+            # Add horizontal lines for the planning and caution limits
+            # or the limits for the focal plane model
+            if self.msid == msid:
+                if msid == "fptemp":
+                    fp_sens, acis_s, acis_i = get_acis_limits("fptemp")
+                    plot.add_hline(acis_i, 'purple', dash=[8, 3, 2, 3])
+                    plot.add_hline(acis_s, 'blue', dash=[8, 3, 2, 3])
+                else:
+                    plot.add_hline(self.yellow_hi, 'gold')
+                    plot.add_hline(self.plan_limit_hi, 'C2')
+                    if self.flag_cold_viols:
+                        plot.add_hline(self.yellow_lo, 'y')
+                        plot.add_hline(self.plan_limit_lo, 'y', dash=[8, 4])
+            stat['lines'] = plot.write(outdir)
+
+            diffs = self.calc_residuals(msid, tlm, pred, good_mask)
+            quant_table += self._calc_quantiles(stat, msid, diffs) + "\n"
+            plot = InteractivePlot('%s_valid_hist' % msid, xtype="linear",
+                                   title=msid.upper() + ' residuals: data - model',
+                                   xlabel=labels[msid], ylabel='Number',
+                                   ylog=True)
+            for j, band_diff in enumerate(diffs):
+                if j > 0 and len(band_diff) == 0:
+                    continue
+                counts, edges = np.histogram(band_diff / scale, bins=50)
+                color = hist_band_colors[j % len(hist_band_colors)][0]
+                plot.add_series(edges, counts, kind="steps", color=color)
+            stat['hist'] = plot.write(outdir)
+
+            plots.append(stat)
+
+        plot = InteractivePlot('ccd_count_valid', title="ACIS CCD/FEPs",
+                               ylabel="CCD/FEP Count", ylim=(0, 6.5),
+                               group="validation")
+        plot.add_series(model.times, model.comp['ccd_count'].dvals,
+                        label='CCDs', color=thermal_blue)
+        plot.add_series(model.times, model.comp['fep_count'].dvals,
+                        label='FEPs', color=thermal_blue, dash=[8, 4])
+        add_rad_zones(plot)
+        plots.append({"msid": "ccd_count", "lines": plot.write(outdir)})
+
+        if 'earthheat__fptemp' in model.comp:
+            plot = InteractivePlot('earth_solid_angle_valid',
+                                   title="Earth Solid Angle in Rad FOV",
+                                   ylabel="Earth Solid Angle (sr)",
+                                   ylim=(1.0e-3, 1.0), ylog=True,
+                                   group="validation")
+            plot.add_series(model.times, model.comp['earthheat__fptemp'].dvals,
+                            color=thermal_blue)
+            add_rad_zones(plot)
+            plots.append({"msid": 'earthheat__fptemp',
+                          "lines": plot.write(outdir)})
+
+        self._write_validation_data(outdir, run_start, quant_table, pred, tlm)
+
+        return plots
+
+    def _validation_labels(self):
+        # The labels of the validation plots and the scales of
+        # the validated quantities
+        labels = {self.msid: 'Degrees (C)',
+                  'pitch': 'Pitch (degrees)',
+                  'tscpos': 'SIM-Z (steps/1000)',
+                  'roll': 'Off-Nominal Roll (degrees)'}
+        scales = {'tscpos': 1000.}
+        return labels, scales
+
+    def _calc_quantiles(self, plot, msid, diffs):
+        # Store the quantiles of the residuals of a validated quantity,
+        # of each histogram band if there is more than one, in the
+        # dictionary describing its plots, and return its line of the
+        # quantile table
+        fmts = {self.msid: '%.2f',
+                'pitch': '%.3f',
+                'tscpos': '%d',
+                'roll': '%.3f'}
+        diff = diffs[0]
+        quant_line = "%s" % msid
+        for quant in validation_quantiles:
+            quant_val = diff[(len(diff) * quant) // 100]
+            plot['quant%02d' % quant] = fmts[msid] % quant_val
+            quant_line += (',' + fmts[msid] % quant_val)
+        if len(diffs) > 1:
+            plot['band_quants'] = []
+            for i, band_diff in enumerate(diffs):
+                if len(band_diff) == 0:
+                    continue
+                band = {'band': i,
+                        'quants': [fmts[msid] % band_diff[(len(band_diff) * quant) // 100]
+                                   for quant in validation_quantiles]}
+                plot['band_quants'].append(band)
+        return quant_line
+
+    def _write_validation_data(self, outdir, run_start, quant_table, pred, tlm):
         # Write quantile tables to a CSV file
         filename = os.path.join(outdir, 'validation_quant.csv')
         mylog.info('Writing quantile table %s' % filename)
@@ -915,8 +2342,6 @@ class ACISThermalCheck(object):
             pickle.dump({'pred': pred, 'tlm': tlm}, f, protocol=2)
             f.close()
 
-        return plots
-
     def rst_to_html(self, outdir, proc):
         """Run rst2html.py to render index.rst as HTML]
 
@@ -970,21 +2395,29 @@ class ACISThermalCheck(object):
             Dictionary of items which will be written to the ReST file.
         """
         import jinja2
+        outfile = os.path.join(outdir, 'index.rst')
+        mylog.info('Writing report file %s' % outfile)
+        # Open up the reST template and send the context to it using jinja2.
+        # The compiled template is kept around until the file changes.
+        template_file = self._template_file()
+        key = _file_key(template_file)
+        if key not in _template_cache:
+            index_template = open(template_file).read()
+            index_template = re.sub(r' %}\n', ' %}', index_template)
+            _template_cache[key] = jinja2.Template(index_template)
+        template = _template_cache[key]
+        # Render the template and write it to a file
+        open(outfile, 'w').write(template.render(**context))
+
+    def _template_file(self):
+        # The path to the reST template of the report
         if self.msid == "fptemp":
             import acisfp_check
             template_path = os.path.join(os.path.dirname(acisfp_check.__file__), 'templates')
         else:
             template_path = os.path.join(TASK_DATA, 'acis_thermal_check',
                                          'templates')
-        outfile = os.path.join(outdir, 'index.rst')
-        mylog.info('Writing report file %s' % outfile)
-        # Open up the reST template and send the context to it using jinja2
-        index_template = open(os.path.join(template_path,
-                                           'index_template.rst')).read()
-        index_template = re.sub(r' %}\n', ' %}', index_template)
-        template = jinja2.Template(index_template)
-        # Render the template and write it to a file
-        open(outfile, 'w').write(template.render(**context))
+        return os.path.join(template_path, 'index_template.rst')
 
     def _setup_proc_and_logger(self, args):
         """
@@ -1000,6 +2433,7 @@ class ACISThermalCheck(object):
         import ska_helpers
         import hashlib
         import json
+        import acis_thermal_check
 
         if not os.path.exists(args.outdir):
             os.mkdir(args.outdir)
@@ -1025,7 +2459,7 @@ class ACISThermalCheck(object):
                    '#######################################')
         mylog.info('# %s_check (version %s) run at %s by %s'
                    % (self.name, pkg_version, proc['run_time'], proc['run_user']))
-        mylog.info('# acis_thermal_check version = %s' % version)
+        mylog.info('# acis_thermal_check version = %s' % acis_thermal_check.__version__)
         mylog.info('# model_spec file = %s' % os.path.abspath(args.model_spec))
         mylog.info('# model_spec file MD5sum = %s' % md5sum)
         mylog.info('###############################'
@@ -1070,7 +2504,43 @@ class ACISThermalCheck(object):
 
         return tstart, tstop, tnow
 
-    def get_telem_values(self, tstart, days=14):
+    def _telem_msid(self):
+        # The name of the modeled MSID in the engineering archive
+        if self.other_map is not None:
+            for key, value in self.other_map.items():
+                if value == self.msid:
+                    return key
+        return self.msid
+
+    def get_initial_telem(self, tstart, hours=12.0, days=14):
+        """
+        Fetch only the modeled MSID for the last ``hours`` of available
+        telemetry before time ``tstart``. This is all a prediction needs
+        to determine its start time and initial temperature. If there
+        is not enough telemetry in that window, the full ``days`` of
+        telemetry are fetched instead.
+
+        Parameters
+        ----------
+        tstart: float
+            Start time for telemetry (secs)
+        hours : float, optional
+            Length of the short telemetry request before ``tstart`` in
+            hours. Default: 12.0
+        days: integer, optional
+            Length of the telemetry request before ``tstart`` in days if
+            the short request does not find enough telemetry. Default: 14
+        """
+        try:
+            return self.get_telem_values(tstart, days=hours/24.0,
+                                         msids=[self._telem_msid()])
+        except ValueError:
+            mylog.info('Not enough telemetry within %g hours of %s, '
+                       'fetching %d days' % (hours, to_date(tstart), days))
+            return self.get_telem_values(tstart, days=days,
+                                         msids=[self._telem_msid()])
+
+    def get_telem_values(self, tstart, days=14, cadence=328.0, msids=None):
         """
         Fetch last ``days`` of available telemetry values before
         time ``tstart``.
@@ -1081,39 +2551,65 @@ class ACISThermalCheck(object):
             Start time for telemetry (secs)
         days: integer, optional
             Length of telemetry request before ``tstart`` in days. Default: 14
+        cadence : float, optional
+            The time between the samples of the returned telemetry in
+            seconds. The cheapest archive product which resolves this
+            cadence, but no coarser than the 5-minute statistics, is
+            fetched (see ``select_stat``). For longer cadences the
+            5-minute statistics are thinned out to the cadence, except
+            for the last ``initial_state_window`` seconds, which keep
+            every sample. Default: 328.0, i.e. the 5-minute statistics
+        msids : list of strings, optional
+            The archive MSIDs to fetch. Default: the modeled MSID, the
+            model inputs which are validated, and any others the model
+            asks for.
         """
         # Get temperature and other telemetry for 3 weeks prior to min(tstart, NOW)
-        the_msid = self.msid
-        if self.other_map is not None:
-            for key, value in self.other_map.items():
-                if value == self.msid:
-                    the_msid = key
-                    break
-        telem_msids = [the_msid, 'sim_z', 'dp_pitch', 'dp_dpa_power', 'roll']
+        if msids is not None:
+            telem_msids = list(msids)
+        else:
+            telem_msids = [self._telem_msid(), 'sim_z', 'dp_pitch',
+                           'dp_dpa_power', 'roll']
 
-        # If the calling program has other MSIDs it wishes us to check, add them
-        # to the list which is supposed to be grabbed from the engineering archive
-        if self.other_telem is not None:
-            telem_msids += self.other_telem
+            # If the calling program has other MSIDs it wishes us to check, add them
+            # to the list which is supposed to be grabbed from the engineering archive
+            if self.other_telem is not None:
+                telem_msids += self.other_telem
 
         # This is a map of MSIDs
         name_map = {'sim_z': 'tscpos', 'dp_pitch': 'pitch'}
         if self.other_map is not None:
             name_map.update(self.other_map)
 
-        tstart = DateTime(tstart).secs
-        start = DateTime(tstart - days * 86400).date
-        stop = DateTime(tstart).date
+        tstart = to_secs(tstart)
+        start = to_date(tstart - days * 86400)
+        stop = to_date(tstart)
+        stat = select_stat(cadence)
         mylog.info('Fetching telemetry between %s and %s' % (start, stop))
-        msidset = fetch.MSIDset(telem_msids, start, stop, stat='5min')
+        msidset = fetch_msidset(telem_msids, start, stop, stat=stat)
+        if any(len(x.times) == 0 for x in msidset.values()):
+            raise ValueError('Found no telemetry within %g days of %s'
+                             % (days, str(tstart)))
         start = max(x.times[0] for x in msidset.values())
         stop = min(x.times[-1] for x in msidset.values())
-        # Interpolate the MSIDs to a common set of times, 5 mins apart (328 s)
-        msidset.interpolate(328.0, start, stop + 1)
+        # Interpolate the MSIDs to a common set of times, spaced
+        # by the cadence (by default 5 mins apart, 328 s), or by the
+        # samples of the archive product if the cadence is longer
+        interval = dict(archive_stats)[stat]
+        dt = cadence if stat is None else min(cadence, interval)
+        msidset.interpolate(dt, start, stop + 1)
+        keep = slice(None)
+        if dt < cadence:
+            # Thin out the samples to the cadence, except at the end
+            # where the initial state of a prediction is taken from
+            times = msidset.times
+            nth = int(round(cadence / interval))
+            keep = (np.arange(len(times)) % nth == 0) | \
+                (times >= times[-1] - initial_state_window)
 
         # Finished when we found at least 4 good records (20 mins)
         if len(msidset.times) < 4:
-            raise ValueError('Found no telemetry within %d days of %s'
+            raise ValueError('Found no telemetry within %g days of %s'
                              % (days, str(tstart)))
 
         # Construct the NumPy record array of telemetry values
@@ -1121,12 +2617,13 @@ class ACISThermalCheck(object):
         # In some cases we replace the MSID name with something
         # more human-readable.
         outnames = ['date'] + [name_map.get(x, x) for x in telem_msids]
-        vals = {name_map.get(x, x): msidset[x].vals for x in telem_msids}
-        vals['date'] = msidset.times
+        vals = {name_map.get(x, x): msidset[x].vals[keep] for x in telem_msids}
+        vals['date'] = msidset.times[keep]
         out = Ska.Numpy.structured_array(vals, colnames=outnames)
 
         # tscpos needs to be converted to steps and must be in the right direction
-        out['tscpos'] *= -397.7225924607
+        if 'tscpos' in out.dtype.names:
+            out['tscpos'] *= -397.7225924607
 
         return out
 
@@ -0,0 +1,229 @@
+"""
+A manifest of the outputs of a model run, used to skip the stages of
+a run whose inputs have not changed since the last run into the same
+output directory.
+
+Each stage of a run (the prediction, the validation and the report)
+is given a hash of all of its inputs. The manifest records, for each
+stage, the hash of its inputs, the hash of the contents of every file
+it wrote, and the value it returned. When the same stage is run again
+with the same inputs and all of its files are still as it left them,
+the stored value is returned and the stage is not run. For instance,
+a rerun after a change to the report template only renders the report.
+
+Since the stored values are pickled, the manifest is not kept in the
+output directory, which may be shared with other users, but in a
+directory of the "manifests" subdirectory of the cache directory which
+only the user running the model can read (see
+``get_private_cache_dir``), keyed on the path of the output directory.
+A manifest which belongs to another user is never read.
+"""
+import hashlib
+import os
+import pickle
+import numpy as np
+from acis_thermal_check.utils import mylog, get_private_cache_dir, \
+    atomic_write
+
+# Files in the output directory which are not outputs of any
+# stage: the log of the run
+ignore_files = ("run.dat",)
+
+
+def _update_hash(h, obj):
+    # Feed an object into a hash in a way which only depends on
+    # its contents, recursing into containers
+    if isinstance(obj, np.ndarray):
+        h.update(str(obj.dtype).encode("utf-8"))
+        h.update(str(obj.shape).encode("utf-8"))
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(b"{")
+        for key in sorted(obj, key=str):
+            _update_hash(h, key)
+            _update_hash(h, obj[key])
+        h.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"[")
+        for item in obj:
+            _update_hash(h, item)
+        h.update(b"]")
+    elif isinstance(obj, bytes):
+        h.update(obj)
+    else:
+        h.update(repr(obj).encode("utf-8"))
+        h.update(b";")
+
+
+def hash_inputs(inputs):
+    """
+    Compute a hash of a set of inputs, which may be nested lists,
+    tuples and dictionaries of NumPy arrays, strings and numbers.
+
+    Parameters
+    ----------
+    inputs : object
+        The inputs to hash.
+
+    Returns
+    -------
+    The hash as a hexadecimal string.
+    """
+    h = hashlib.sha1()
+    _update_hash(h, inputs)
+    return h.hexdigest()
+
+
+def file_hash(filename):
+    """
+    Compute the hash of the contents of a file.
+
+    Parameters
+    ----------
+    filename : string
+        The path to the file.
+    """
+    h = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def manifest_filename(outdir):
+    """
+    The path to the file the manifest of an output directory is kept
+    in, in a directory of the cache directory which is only readable
+    by the user running the model.
+
+    Parameters
+    ----------
+    outdir : string
+        The output directory of the run.
+    """
+    cache_dir = get_private_cache_dir("manifests")
+    key = hash_inputs(os.path.realpath(outdir))
+    return os.path.join(cache_dir, "run_manifest_%s.pkl" % key)
+
+
+class RunManifest(object):
+    """
+    The manifest of the outputs of the model runs in a directory.
+
+    Parameters
+    ----------
+    outdir : string
+        The output directory of the run.
+    salt : object, optional
+        Mixed into the hash of every stage, e.g. the versions of the
+        code, so that outputs made by other versions are not reused.
+    force : boolean, optional
+        If True, run every stage regardless of the manifest, and
+        record the new outputs. Default: False
+    filename : string, optional
+        The path to the file the manifest is kept in. Default is a
+        file in the "manifests" subdirectory of the cache directory.
+
+    Raises an OSError if the directory of the manifest cannot be used.
+    """
+    def __init__(self, outdir, salt="", force=False, filename=None):
+        self.outdir = outdir
+        self.salt = salt
+        self.force = force
+        if filename is None:
+            filename = manifest_filename(outdir)
+        self.filename = filename
+        self.stages = {}
+        # The files written or reused by each stage run in this process
+        self.outputs = {}
+        # The stages whose outputs were reused rather than remade
+        self.skipped = set()
+        if os.path.exists(self.filename):
+            try:
+                # Only unpickle a file which the user running the
+                # model wrote
+                if os.stat(self.filename).st_uid != os.getuid():
+                    raise RuntimeError("it belongs to another user")
+                with open(self.filename, "rb") as f:
+                    self.stages = pickle.load(f)
+            except Exception as err:
+                mylog.warning("Could not read run manifest %s: %s"
+                              % (self.filename, err))
+
+    def _snapshot(self):
+        # The modification times and sizes of the files in the
+        # output directory
+        files = {}
+        for entry in os.scandir(self.outdir):
+            if entry.is_file() and entry.name not in ignore_files:
+                st = entry.stat()
+                files[entry.name] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def _artifacts_ok(self, artifacts):
+        for name, digest in artifacts.items():
+            path = os.path.join(self.outdir, name)
+            if not os.path.exists(path) or file_hash(path) != digest:
+                return False
+        return True
+
+    def run_stage(self, name, inputs, func, *args, **kwargs):
+        """
+        Run a stage of a model run, unless its inputs are the same
+        as those of the last time it was run and its outputs are
+        unchanged, in which case the value it returned then is
+        returned.
+
+        Parameters
+        ----------
+        name : string
+            The name of the stage, e.g. "prediction".
+        inputs : object
+            Everything the outputs of the stage depend on, which is
+            hashed with ``hash_inputs``.
+        func : callable
+            The function which runs the stage. It is called with the
+            remaining positional and keyword arguments.
+        """
+        key = hash_inputs([self.salt, inputs])
+        entry = self.stages.get(name, None)
+        if not self.force and entry is not None and entry["key"] == key \
+                and self._artifacts_ok(entry["artifacts"]):
+            mylog.info("Inputs of the %s stage are unchanged, reusing its outputs"
+                       % name)
+            self.outputs[name] = sorted(entry["artifacts"])
+            self.skipped.add(name)
+            return pickle.loads(entry["result"])
+        self.skipped.discard(name)
+        before = self._snapshot()
+        result = func(*args, **kwargs)
+        after = self._snapshot()
+        artifacts = {}
+        for fn, stamp in after.items():
+            if before.get(fn, None) != stamp:
+                artifacts[fn] = file_hash(os.path.join(self.outdir, fn))
+        self.outputs[name] = sorted(artifacts)
+        try:
+            stored = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as err:
+            # The stage will simply be run again next time
+            mylog.warning("Cannot record the outputs of the %s stage: %s"
+                          % (name, err))
+            self.stages.pop(name, None)
+        else:
+            self.stages[name] = {"key": key, "artifacts": artifacts,
+                                 "result": stored}
+        try:
+            self.write()
+        except OSError as err:
+            mylog.warning("Cannot write run manifest %s: %s"
+                          % (self.filename, err))
+        return result
+
+    def write(self):
+        """
+        Write the manifest to its file.
+        """
+        atomic_write(self.filename,
+                     lambda f: pickle.dump(self.stages, f,
+                                           protocol=pickle.HIGHEST_PROTOCOL))
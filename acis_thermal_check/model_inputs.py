@@ -0,0 +1,190 @@
+"""
+Static auxiliary inputs for thermal models.
+
+Some models need a time series which does not come from the commanded
+states or the engineering archive, e.g. the history of the detector
+housing heater commands used by the PSMC and ACIS FP models. These are
+kept in RDB files in the ``data`` directory of this package. Each one
+is registered here with the models and the xija component it applies
+to, and is read once per process, or again if the file has changed
+since it was read. A binary copy of each file is kept
+in the cache directory (see ``get_cache_dir``) and is regenerated when
+the RDB file changes, so that the RDB file is only parsed again after
+it has been updated.
+
+Other inputs can be plugged in the same way:
+
+.. code-block:: python
+
+    from acis_thermal_check.model_inputs import register_static_input
+
+    register_static_input("my_heater", "/path/to/my_heater.rdb",
+                          "my_heater", ["dpa"], value_col="heater_on",
+                          dtype=bool)
+"""
+import os
+import numpy as np
+from acis_thermal_check.utils import mylog, get_cache_dir, atomic_write
+
+# The registered inputs, keyed on name
+static_inputs = {}
+
+# The inputs which have been loaded in this process, keyed on name,
+# as (stamp, times, values)
+_loaded = {}
+
+data_dir = os.path.join(os.path.dirname(__file__), "data")
+
+
+class StaticInput(object):
+    """
+    A time series read from an RDB file and used as the data of
+    a xija model component.
+
+    Parameters
+    ----------
+    name : string
+        The name of the input.
+    filename : string
+        The path to the RDB file.
+    comp : string
+        The name of the xija model component which the input sets.
+    models : list of strings
+        The names of the models (e.g. "psmc") which use the input.
+    time_col : string, optional
+        The column of the file with the dates. Default: "time"
+    value_col : string, optional
+        The column of the file with the values. Default: the name
+        of the input.
+    dtype : type, optional
+        The type of the values. Default: float
+    """
+    def __init__(self, name, filename, comp, models, time_col="time",
+                 value_col=None, dtype=float):
+        self.name = name
+        self.filename = filename
+        self.comp = comp
+        self.models = list(models)
+        self.time_col = time_col
+        self.value_col = name if value_col is None else value_col
+        self.dtype = dtype
+
+    def _read_rdb(self):
+        from astropy.io import ascii
+        from Chandra.Time import date2secs
+        mylog.info('Reading %s from file %s' % (self.name, self.filename))
+        table = ascii.read(self.filename, format='rdb')
+        times = np.asarray(date2secs(table[self.time_col]), dtype=np.float64)
+        vals = np.asarray(table[self.value_col]).astype(self.dtype)
+        return times, vals
+
+    def stamp(self):
+        """
+        The modification time and size of the RDB file, which change
+        when it is updated.
+        """
+        st = os.stat(self.filename)
+        return np.array([st.st_mtime_ns, st.st_size], dtype=np.int64)
+
+    def load(self, stamp=None):
+        """
+        Read the input, from its binary copy if that is up to date
+        and from the RDB file otherwise.
+
+        Parameters
+        ----------
+        stamp : NumPy array, optional
+            The stamp of the RDB file, if it has already been taken.
+
+        Returns
+        -------
+        2 NumPy arrays: the times of the input in seconds from the
+        beginning of the mission, and the values.
+        """
+        if stamp is None:
+            stamp = self.stamp()
+        sidecar = os.path.join(get_cache_dir("model_inputs"),
+                               "%s.npz" % self.name)
+        if os.path.exists(sidecar):
+            with np.load(sidecar) as f:
+                if np.array_equal(f["stamp"], stamp):
+                    return f["times"], f["vals"].astype(self.dtype)
+        times, vals = self._read_rdb()
+        atomic_write(sidecar, lambda f: np.savez(f, times=times, vals=vals,
+                                                 stamp=stamp))
+        return times, vals
+
+
+def register_static_input(name, filename, comp, models, time_col="time",
+                          value_col=None, dtype=float):
+    """
+    Register a static input, which is then set on the matching
+    component of every model named in ``models`` when it is built.
+    See ``StaticInput`` for the parameters.
+    """
+    static_inputs[name] = StaticInput(name, filename, comp, models,
+                                      time_col=time_col, value_col=value_col,
+                                      dtype=dtype)
+    _loaded.pop(name, None)
+
+
+def get_static_input(name):
+    """
+    Get the times and values of a registered static input, loading
+    it the first time it is asked for in this process and again
+    whenever its file has changed since.
+
+    Parameters
+    ----------
+    name : string
+        The name of the input.
+    """
+    if name not in static_inputs:
+        raise RuntimeError("No static model input named '%s'!" % name)
+    stamp = static_inputs[name].stamp()
+    entry = _loaded.get(name, None)
+    if entry is None or not np.array_equal(entry[0], stamp):
+        times, vals = static_inputs[name].load(stamp=stamp)
+        entry = _loaded[name] = (stamp, times, vals)
+    return entry[1], entry[2]
+
+
+def static_input_stamps(name):
+    """
+    Get the stamps (see ``StaticInput.stamp``) of the static inputs
+    of a model, e.g. to tell whether its outputs are out of date.
+
+    Parameters
+    ----------
+    name : string
+        The name of the model, e.g. "psmc".
+
+    Returns
+    -------
+    A dictionary of the stamps keyed on the name of the input.
+    """
+    return {inp.name: inp.stamp() for inp in static_inputs.values()
+            if name in inp.models}
+
+
+def set_static_inputs(model, name):
+    """
+    Set the data of the model components which have a registered
+    static input.
+
+    Parameters
+    ----------
+    model : xija.ThermalModel
+        The model to set the inputs of.
+    name : string
+        The name of the model, e.g. "psmc".
+    """
+    for inp in static_inputs.values():
+        if name in inp.models:
+            times, vals = get_static_input(inp.name)
+            model.comp[inp.comp].set_data(vals, times)
+
+
+# Detector housing heater contribution to heating
+register_static_input("dahtbon", os.path.join(data_dir, "dahtbon_history.rdb"),
+                      "dh_heater", ["psmc", "acisfp"], dtype=bool)
@@ -0,0 +1,170 @@
+"""
+Running several thermal models over the same commanded states at once.
+
+Models such as 1DEAMZT, 1DPAMZT, 1PDEAAT, PSMC and the FEP and BEP
+boards are all driven by the same inputs: the SIM position, the CCD
+and FEP counts, the video boards, the clocking, the pitch, the roll and
+the eclipses. When they are run one after another, each run fetches
+the ephemeris and computes the pitch and roll again. ``propagate_models``
+prepares these once for every time grid the models use, and then
+builds and runs each model in its own worker process. The workers are
+forked after the shared inputs are made, so they read them from the
+memory of the parent process instead of having them pickled and sent
+to each one (see ``parallel_map``). Only the modeled values come back.
+
+.. code-block:: python
+
+    from acis_thermal_check.multimodel import ModelRun, propagate_models
+
+    runs = [ModelRun(dpa_check, dpa_spec, state0={"1dpamzt": 25.0}),
+            ModelRun(dea_check, dea_spec, state0={"1deamzt": 22.0})]
+    outputs = propagate_models(runs, states, tstart, tstop)
+    dpa_temps = outputs["dpa"]["mvals"]["1dpamzt"]
+"""
+from collections import OrderedDict
+import numpy as np
+from acis_thermal_check.utils import mylog, parallel_map, shared_inputs, \
+    calc_pitch_roll
+from acis_thermal_check.timeconv import to_date
+
+
+class ModelRun(object):
+    """
+    A model to run with ``propagate_models``.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model checking object.
+    model_spec : string
+        Path to the JSON file containing the model specification.
+    state0 : dict, optional
+        The initial temperatures, keyed on MSID, as for
+        ``ACISThermalCheck.calc_model``. Default: None, in which case
+        xija sets them from telemetry.
+    """
+    def __init__(self, atc, model_spec, state0=None):
+        self.atc = atc
+        self.model_spec = model_spec
+        self.state0 = state0
+
+    @property
+    def name(self):
+        return self.atc.name
+
+
+def _time_grid(run, tstart, tstop):
+    # The times of a model, which only depend on its time step
+    import xija
+    from acis_thermal_check.main import load_model_spec
+    model = xija.ThermalModel(run.name, start=tstart, stop=tstop,
+                              model_spec=load_model_spec(run.model_spec))
+    return model.times
+
+
+def prepare_shared_inputs(runs, states, tstart, tstop):
+    """
+    Compute the inputs of a set of models which do not depend on the
+    model: the ephemeris, pitch and roll at the model times. Models
+    with the same time step share the same arrays.
+
+    Parameters
+    ----------
+    runs : list of ModelRun
+        The models to run.
+    states : NumPy record array
+        Commanded states
+    tstart : float
+        The start time of the model runs.
+    tstop : float
+        The end time of the model runs.
+
+    Returns
+    -------
+    A list with the index of the shared inputs of each run, and a list
+    of dictionaries of the shared inputs ("times", "ephem", "pitch"
+    and "roll").
+    """
+    from acis_thermal_check.main import load_model_spec
+    grids = OrderedDict()
+    index = []
+    for run in runs:
+        dt = load_model_spec(run.model_spec).get("dt", 328.0)
+        if dt not in grids:
+            grids[dt] = len(grids)
+        index.append(grids[dt])
+    # The first model on each grid gets the ephemeris for all of them
+    shared = []
+    atc = runs[0].atc
+    atc.preload_ephemeris(tstart, tstop)
+    for dt, i in grids.items():
+        run = runs[index.index(i)]
+        times = _time_grid(run, tstart, tstop)
+        ephem = atc.get_ephemeris(tstart, tstop, times)
+        pitch, roll = calc_pitch_roll(times, ephem, states)
+        shared.append(dict(times=times, ephem=ephem, pitch=pitch, roll=roll))
+    return index, shared
+
+
+def _propagate(i):
+    """
+    Build and run a single model. This is called in the worker
+    processes, and takes its inputs from ``shared_inputs``.
+    """
+    inp = shared_inputs()
+    run = inp["runs"][i]
+    shared = inp["shared"][inp["index"][i]]
+    model = run.atc.setup_model(run.model_spec, inp["states"], inp["tstart"],
+                                inp["tstop"], state0=run.state0,
+                                ephem=shared["ephem"], pitch=shared["pitch"],
+                                roll=shared["roll"])
+    model.make()
+    model.calc()
+    mvals = OrderedDict()
+    for comp in model.comps:
+        vals = getattr(comp, "mvals", None)
+        if isinstance(vals, np.ndarray) and vals.shape == model.times.shape:
+            mvals[comp.name] = vals
+    return {"times": model.times, "mvals": mvals}
+
+
+def propagate_models(runs, states, tstart, tstop, n_jobs=None):
+    """
+    Run a set of thermal models over the same commanded states, each
+    in its own worker process, after computing the inputs they share
+    once.
+
+    Parameters
+    ----------
+    runs : list of ModelRun
+        The models to run. Each model must have a different name.
+    states : NumPy record array
+        Commanded states
+    tstart : float
+        The start time of the model runs.
+    tstop : float
+        The end time of the model runs.
+    n_jobs : integer, optional
+        The number of worker processes. Default: one per CPU.
+
+    Returns
+    -------
+    An OrderedDict keyed on the name of each model, in the order of
+    ``runs``, with a dictionary of the model times ("times") and the
+    modeled values of each of its components keyed on the name of the
+    component ("mvals").
+    """
+    names = [run.name for run in runs]
+    if len(runs) == 0:
+        raise RuntimeError("There are no models to run!")
+    if len(set(names)) != len(names):
+        raise RuntimeError("The models to run must have different names, "
+                           "not %s!" % ", ".join(names))
+    mylog.info('Running the %s thermal models between %s and %s'
+               % (", ".join(name.upper() for name in names), to_date(tstart),
+                  to_date(tstop)))
+    index, shared = prepare_shared_inputs(runs, states, tstart, tstop)
+    results = parallel_map(_propagate, range(len(runs)), n_jobs=n_jobs,
+                           shared=dict(runs=runs, states=states, tstart=tstart,
+                                       tstop=tstop, index=index, shared=shared))
+    return OrderedDict(zip(names, results))
@@ -0,0 +1,180 @@
+"""
+Command-line options for the thermal model checking tools.
+
+This module is deliberately kept free of any imports beyond the
+standard library, so that parsing the command line (and answering
+``--version``) does not require loading the modeling stack.
+"""
+import os
+import sys
+
+
+def get_options(name, model_path, opts=None, argv=None):
+    """
+    Construct the argument parser for command-line options for running
+    predictions and validations for a load. Sets up the parser and 
+    defines default options. This function should be used by the specific 
+    thermal model checking tools.
+
+    Parameters
+    ----------
+    name : string
+        The name of the ACIS component whose temperature is being modeled.
+    model_path : string
+        The default directory path where the model JSON files are located.
+        This is internal to the ``acis_thermal_check`` package.
+    opts: dictionary
+        A (key, value) dictionary of additional options for the parser. These
+        may be defined by the thermal model checking tool if necessary.
+    argv : list of strings, optional
+        The arguments to parse. Default is to parse the command line.
+    """
+    from argparse import ArgumentParser
+    parser = ArgumentParser()
+    parser.set_defaults()
+    parser.add_argument("--outdir", default="out", help="Output directory. If it does not "
+                                                        "exist it will be created. Default: 'out'")
+    parser.add_argument("--backstop_file", help="Path to the backstop file. If a directory, "
+                                                "the backstop file will be searched for within "
+                                                "this directory. Default: None")
+    parser.add_argument("--oflsdir", help="Path to the directory containing the backstop "
+                                          "file (legacy argument). If specified, it will "
+                                          "override the value of the backstop_file "
+                                          "argument. Default: None")
+    parser.add_argument("--model-spec", 
+                        default=os.path.join(model_path, '%s_model_spec.json' % name),
+                        help="Model specification file. Defaults to the one included with "
+                             "the model package.")
+    parser.add_argument("--days", type=float, default=21.0,
+                        help="Days of validation data. Default: 21")
+    parser.add_argument("--run-start", help="Reference time to replace run start time "
+                                            "for regression testing. The default is to "
+                                            "use the current time.")
+    parser.add_argument("--interrupt", help="Set this flag if this is an interrupt load.",
+                        action='store_true')
+    parser.add_argument("--traceback", action='store_false', help='Enable tracebacks. Default: True')
+    parser.add_argument("--pred-only", action='store_true', help='Only make predictions. Default: False')
+    parser.add_argument("--verbose", type=int, default=1,
+                        help="Verbosity (0=quiet, 1=normal, 2=debug)")
+    parser.add_argument("--T-init", type=float,
+                        help="Starting temperature (degC). Default is to compute it from telemetry.")
+    parser.add_argument("--state-builder", default="acis",
+                        help="StateBuilder to use (sql|acis). Default: acis")
+    parser.add_argument("--nlet_file",
+                        default='/data/acis/LoadReviews/NonLoadTrackedEvents.txt',
+                        help="Full path to the Non-Load Event Tracking file that should be "
+                             "used for this model run.")
+    parser.add_argument("--ensemble", type=int, default=0,
+                        help="Number of members of a Monte Carlo ensemble of "
+                             "predictions to run in addition to the nominal "
+                             "prediction. Default: 0 (no ensemble)")
+    parser.add_argument("--ensemble-T-sigma", type=float, default=1.0,
+                        help="Standard deviation of the initial temperature of the "
+                             "ensemble members (degC). Default: 1.0")
+    parser.add_argument("--ensemble-pitch-sigma", type=float, default=0.0,
+                        help="Standard deviation of the pitch of each commanded "
+                             "state for the ensemble members (deg). Default: 0.0")
+    parser.add_argument("--ensemble-roll-sigma", type=float, default=0.0,
+                        help="Standard deviation of the roll of each commanded "
+                             "state for the ensemble members (deg). Default: 0.0")
+    parser.add_argument("--ensemble-par", action='append',
+                        help="Perturb a xija model parameter in the ensemble, given "
+                             "as NAME=SIGMA. May be given more than once.")
+    parser.add_argument("--ensemble-jobs", type=int, default=0,
+                        help="Number of processes used to run the ensemble. "
+                             "Default: 0 (one per CPU)")
+    parser.add_argument("--ensemble-seed", type=int,
+                        help="Random seed for the ensemble. Default: None")
+    parser.add_argument("--force-outputs", action='store_true',
+                        help="Remake every output, even if the inputs of the run "
+                             "are unchanged since the last run in the same "
+                             "output directory. Default: False")
+    parser.add_argument("--output-profile", default="full",
+                        choices=["full", "summary", "data-only"],
+                        help="Outputs to make: 'full' for the report with all "
+                             "of the plots, 'summary' for only the temperature "
+                             "plot and 'data-only' for only the data files. "
+                             "Default: 'full'")
+    parser.add_argument("--report-backend", default="static",
+                        choices=["static", "interactive"],
+                        help="How the report is made: 'static' for PNG plots, "
+                             "'interactive' for plots which are drawn and "
+                             "zoomed in the browser. Default: 'static'")
+    parser.add_argument("--model-dt", type=float,
+                        help="Time step of the model in seconds. Default: the "
+                             "time step of the model specification.")
+    parser.add_argument("--coarse-dt", type=float,
+                        help="Run the prediction with adaptive time steps, "
+                             "using this coarser time step in seconds inside "
+                             "long commanded states. Must be a multiple of the "
+                             "time step of the model and of 32.8 s, and at "
+                             "most 4 times the time step the model was "
+                             "fitted at. Cannot be combined with --ensemble. "
+                             "Default: None (a fixed time step)")
+    parser.add_argument("--rolling-validation", action='store_true',
+                        help="Bring the validation of the last run up to date, "
+                             "only modeling the time since then, instead of "
+                             "validating the full period again. Only the "
+                             "quantiles are reported. Default: False")
+    parser.add_argument("--version", action='store_true', help="Print version")
+
+    if opts is not None:
+        for opt_name, opt in opts:
+            parser.add_argument("--%s" % opt_name, **opt)
+
+    args = parser.parse_args(argv)
+
+    # Answer --version here, before the caller gets a chance
+    # to import and set up the model
+    if args.version:
+        print_version(name)
+        sys.exit(0)
+
+    check_options(args)
+
+    return args
+
+
+def check_options(args):
+    """
+    Resolve legacy arguments and check that a set of options
+    is consistent. This is called by ``get_options``, but is
+    also needed when options are modified after parsing, e.g.
+    by the service mode.
+
+    Parameters
+    ----------
+    args : ArgumentParser arguments
+        The options object, which is modified in place.
+    """
+    if args.oflsdir is not None:
+        args.backstop_file = args.oflsdir
+
+    if args.coarse_dt is not None:
+        # The time step of the model specification, which the coarse
+        # time step is also checked against, is only known once the
+        # model is run
+        from acis_thermal_check.stepping import check_time_steps
+        check_time_steps(args.coarse_dt, fine_dt=args.model_dt)
+        # The members of an ensemble are run at one fixed time step
+        if args.ensemble:
+            raise RuntimeError("Adaptive time steps (--coarse-dt) cannot be "
+                               "combined with an ensemble (--ensemble)!")
+
+    if args.pred_only and args.backstop_file is None:
+        raise RuntimeError("You turned off both prediction and validation!!")
+
+
+def print_version(name):
+    """
+    Print the versions of a thermal model checking tool and
+    of ``acis_thermal_check``.
+
+    Parameters
+    ----------
+    name : string
+        The name of the ACIS component whose temperature is being modeled.
+    """
+    import ska_helpers
+    for package in ("{}_check".format(name), "acis_thermal_check"):
+        print("%s version %s" % (package, ska_helpers.get_version(package)))
@@ -83,6 +83,19 @@ class TestArgs(object):
             model_spec = os.path.join(model_path, "%s_model_spec.json" % name)
         self.model_spec = model_spec
         self.version = None
+        self.ensemble = 0
+        self.ensemble_T_sigma = 1.0
+        self.ensemble_pitch_sigma = 0.0
+        self.ensemble_roll_sigma = 0.0
+        self.ensemble_par = None
+        self.ensemble_jobs = 0
+        self.ensemble_seed = None
+        self.force_outputs = True
+        self.output_profile = "full"
+        self.report_backend = "static"
+        self.rolling_validation = False
+        self.model_dt = None
+        self.coarse_dt = None
         if name == "acisfp":
             self.fps_nopref = os.path.join(model_path, "FPS_NoPref.txt")
 
@@ -161,12 +174,16 @@ class RegressionTester(object):
             override_limits : dict, optional
             Override any margin by setting a new value to its name
             in this dictionary. SHOULD ONLY BE USED FOR TESTING.
+
+        Returns
+        -------
+        The ``RunResult`` of the model run.
         """
         out_dir = os.path.join(self.outdir, load_week)
         args = TestArgs(self.name, out_dir, self.model_path, run_start=run_start,
                         load_week=load_week, interrupt=interrupt,
                         state_builder=state_builder, model_spec=self.test_model_spec)
-        self.atc_obj.run(args, override_limits=override_limits)
+        return self.atc_obj.run(args, override_limits=override_limits)
 
     def run_models(self, normal=True, interrupt=True, run_start=None,
                    state_builder='acis'):
@@ -207,6 +224,8 @@ class RegressionTester(object):
         This method runs the answer test in one of two modes:
         either comparing the answers from this test to the "gold
         standard" answers or to simply run the model to generate answers.
+        The validation test also checks the sketches of the validation
+        residuals, see ``check_sketch_error``.
 
         Parameters
         ----------
@@ -234,6 +253,8 @@ class RegressionTester(object):
         else:
             answer_dir = self._set_answer_dir(load_week)
             self.copy_new_files(out_dir, answer_dir, filenames)
+        if test_name == "validation":
+            self.check_sketch_error(load_week)
 
     def compare_validation(self, load_week, out_dir, filenames):
         """
@@ -370,36 +391,132 @@ class RegressionTester(object):
             viol_data["temps"] = []
             if self.msid == "fptemp":
                 viol_data["obsids"] = []
-        load_year = "20%s" % load_week[-3:-1]
-        self.run_model(load_week, run_start=viol_data['run_start'], 
-                       override_limits=viol_data['limits'])
-        out_dir = os.path.join(self.outdir, load_week)
-        index_rst = os.path.join(out_dir, "index.rst")
-        with open(index_rst, 'r') as myfile:
-            i = 0
-            for line in myfile.readlines():
-                if line.startswith("Model status"):
-                    assert "NOT OK" in line
-                if line.startswith(load_year):
-                    if answer_store:
-                        words = line.strip().split()
-                        viol_data["datestarts"].append(words[0])
-                        viol_data["datestops"].append(words[1])
-                        viol_data["temps"].append(words[2])
-                        if self.msid == "fptemp":
-                            viol_data["obsids"].append(words[3])
-                    else:
-                        try:
-                            assert viol_data["datestarts"][i] in line
-                            assert viol_data["datestops"][i] in line
-                            assert viol_data["temps"][i] in line
-                            if self.msid == "fptemp":
-                                assert viol_data["obsids"][i] in line
-                        except AssertionError:
-                            raise AssertionError("Comparison failed. Check file at "
-                                                 "%s." % index_rst)
-                    i += 1
+        result = self.run_model(load_week, run_start=viol_data['run_start'],
+                                override_limits=viol_data['limits'])
+        assert not result.ok
+        # The violations in the order they are listed in the report
+        viols = [(viol, "maxtemp") for viol in result.viols["hi"]]
+        viols += [(viol, "mintemp") for viol in result.viols.get("lo", [])]
+        if not answer_store:
+            assert len(viols) == len(viol_data["datestarts"])
+        for i, (viol, key) in enumerate(viols):
+            temp = "%.2f" % viol[key]
+            if answer_store:
+                viol_data["datestarts"].append(viol["datestart"])
+                viol_data["datestops"].append(viol["datestop"])
+                viol_data["temps"].append(temp)
+                if self.msid == "fptemp":
+                    viol_data["obsids"].append(str(viol["obsid"]))
+            else:
+                try:
+                    assert viol_data["datestarts"][i] == viol["datestart"]
+                    assert viol_data["datestops"][i] == viol["datestop"]
+                    assert viol_data["temps"][i] == temp
+                    if self.msid == "fptemp":
+                        assert viol_data["obsids"][i] == str(viol["obsid"])
+                except AssertionError:
+                    raise AssertionError("Comparison failed for violation %d "
+                                         "of load %s." % (i, load_week))
         if answer_store:
             with open(viol_json, "w") as f:
                 json.dump(viol_data, f, indent=4)
 
+
+    def check_sketch_error(self, load_week, n_shards=4):
+        """
+        This method checks that the quantiles of the mergeable sketches
+        of the validation residuals of a model run are within the
+        error bound of the sketches of the exact quantiles, and that
+        merging the sketches of parts of the residuals gives the same
+        sketch as sketching all of them. The model must already have
+        been run for the load, e.g. by ``run_models``.
+
+        Parameters
+        ----------
+        load_week : string
+            The load week to check, in a format like "MAY2016A".
+        n_shards : integer, optional
+            The number of parts the residuals are split into to check
+            the merging of sketches. Default: 4
+        """
+        from acis_thermal_check.main import validation_quantiles
+        from acis_thermal_check.sketches import ResidualSketch, \
+            merge_sketches, residual_width
+        out_dir = os.path.join(self.outdir, load_week)
+        with open(os.path.join(out_dir, "validation_data.pkl"), "rb") as f:
+            results = pickle.load(f)
+        pred = results["pred"]
+        tlm = results["tlm"]
+        for msid in pred:
+            resid = tlm[msid] - pred[msid]
+            resid = np.sort(resid[np.isfinite(resid)])
+            sketch = ResidualSketch(residual_width(msid), resid)
+            for quant in validation_quantiles:
+                exact = resid[(len(resid) * quant) // 100]
+                err = abs(sketch.quantile(quant) - exact)
+                # Allow for rounding in the binning of the residuals
+                if err > sketch.error_bound * (1.0 + 1.0e-6):
+                    raise AssertionError("The %d%% quantile of the sketch of "
+                                         "%s is off by %g, more than %g!"
+                                         % (quant, msid, err,
+                                            sketch.error_bound))
+            # Merge the sketches of interleaved parts of the residuals
+            merged = merge_sketches([ResidualSketch(sketch.width, resid[i::n_shards])
+                                     for i in range(n_shards)])
+            try:
+                assert merged.n == sketch.n
+                assert_array_equal(merged.bins, sketch.bins)
+                assert_array_equal(merged.counts, sketch.counts)
+            except AssertionError:
+                raise AssertionError("Merged sketches of %s are not the same "
+                                     "as the sketch of all of the residuals!"
+                                     % msid)
+
+    def check_adaptive_step(self, load_week, coarse_dt=1312.0, atol=0.25,
+                            run_start=None, state_builder='acis'):
+        """
+        This method checks the accuracy of a prediction run with
+        adaptive time steps, by comparing its temperatures to those of
+        the same prediction run at the fixed time step of the model.
+
+        Parameters
+        ----------
+        load_week : string
+            The load week to check, in a format like "MAY2016A".
+        coarse_dt : float, optional
+            The coarse time step of the adaptive prediction in seconds.
+            Default: 1312.0
+        atol : float, optional
+            The largest allowed difference between the temperatures of
+            the two predictions in degC. Default: 0.25
+        run_start : string, optional
+            The run start time in YYYY:DOY:HH:MM:SS.SSS format. If not
+            specified, one will be created 3 days prior to the model run.
+        state_builder : string, optional
+            The mode used to create the list of commanded states. "sql" or
+            "acis", default "acis".
+
+        Returns
+        -------
+        The largest difference between the temperatures of the two
+        predictions in degC.
+        """
+        results = []
+        for step, dt in (("fixed_step", None), ("adaptive_step", coarse_dt)):
+            out_dir = os.path.join(self.outdir, load_week, step)
+            args = TestArgs(self.name, out_dir, self.model_path,
+                            run_start=run_start, load_week=load_week,
+                            state_builder=state_builder,
+                            model_spec=self.test_model_spec)
+            args.pred_only = True
+            args.output_profile = "data-only"
+            args.coarse_dt = dt
+            results.append(self.atc_obj.run(args))
+        fixed, adaptive = results
+        temps = np.interp(fixed.times, adaptive.times, adaptive.temps)
+        err = np.abs(temps - fixed.temps).max()
+        if err > atol:
+            raise AssertionError("The prediction with adaptive time steps is "
+                                 "off by %g degC, more than %g degC!"
+                                 % (err, atol))
+        return err
@@ -0,0 +1,121 @@
+"""
+The results of a model run, as returned by ``ACISThermalCheck.run``.
+
+Everything which goes into the report of a run is also kept in a
+``RunResult``, so that callers which run models in-process (batch
+drivers, the service mode, the regression tests) can use the results
+directly instead of reading them back from the files of the run:
+
+.. code-block:: python
+
+    result = dpa_check.run(args)
+    if not result.ok:
+        for viol in result.viols["hi"]:
+            print(viol["datestart"], viol["datestop"], viol["maxtemp"])
+"""
+import os
+import numpy as np
+from acis_thermal_check.main import validation_quantiles
+
+
+class RunResult(object):
+    """
+    The results of a model run.
+
+    Parameters
+    ----------
+    name : string
+        The name of the model, e.g. "dpa".
+    msid : string
+        The MSID of the modeled temperature, e.g. "1dpamzt".
+    outdir : string
+        The output directory of the run.
+    pred : dict
+        The outputs of the prediction, as returned by
+        ``make_week_predict``, or None if no prediction was made.
+    valid_viols : list of dicts
+        The validation violations, or None if no validation was made.
+    plots_validation : list of dicts
+        The validation plots or statistics, or None if no validation
+        was made.
+    timings : dict, optional
+        The time taken by each step of the run in seconds.
+    counters : dict, optional
+        Counts of the work done by the run, e.g. the number of
+        time conversions saved by caching.
+    artifacts : list of strings, optional
+        The files written by the run.
+    """
+    def __init__(self, name, msid, outdir, pred=None, valid_viols=None,
+                 plots_validation=None, timings=None, counters=None,
+                 artifacts=None):
+        self.name = name
+        self.msid = msid
+        self.outdir = outdir
+        if pred is None:
+            pred = {}
+        self.states = pred.get("states", None)
+        self.times = pred.get("times", None)
+        temps = pred.get("temps", None)
+        self.temps = None if temps is None else np.asarray(temps[name])
+        self.viols = pred.get("viols", None)
+        self.ensemble = pred.get("ensemble", None)
+        self.plots = pred.get("plots", None)
+        self.valid_viols = valid_viols
+        self.plots_validation = plots_validation
+        self.timings = {} if timings is None else dict(timings)
+        self.counters = {} if counters is None else dict(counters)
+        self.artifacts = [] if artifacts is None else sorted(artifacts)
+
+    @property
+    def ok(self):
+        """
+        True if the prediction has no planning limit violations.
+        """
+        if self.viols is None:
+            return True
+        return not any(self.viols.get(k, None) for k in ("hi", "lo"))
+
+    @property
+    def quantiles(self):
+        """
+        The quantiles of the validation residuals of each validated
+        quantity, as a dictionary keyed on MSID of dictionaries
+        keyed on quantile.
+        """
+        quants = {}
+        if self.plots_validation is None:
+            return quants
+        for plot in self.plots_validation:
+            if "quant01" not in plot:
+                continue
+            quants[plot["msid"].lower()] = {
+                q: float(plot["quant%02d" % q]) for q in validation_quantiles}
+        return quants
+
+    def artifact_path(self, filename):
+        """
+        Get the full path to a file written by the run, e.g.
+        "index.html".
+        """
+        if filename not in self.artifacts:
+            raise RuntimeError("The run did not write the file '%s'!"
+                               % filename)
+        return os.path.join(self.outdir, filename)
+
+    def to_dict(self):
+        """
+        A summary of the results without the arrays, which can be
+        serialized as JSON.
+        """
+        return {"name": self.name,
+                "msid": self.msid,
+                "outdir": os.path.abspath(self.outdir),
+                "ok": self.ok,
+                "viols": self.viols,
+                "ensemble": self.ensemble,
+                "valid_viols": self.valid_viols,
+                "quantiles": self.quantiles,
+                "timings": self.timings,
+                "counters": self.counters,
+                "artifacts": self.artifacts}
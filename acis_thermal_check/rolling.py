@@ -0,0 +1,356 @@
+"""
+Rolling validation, which brings the validation of the previous run
+up to date instead of remaking it.
+
+A daily validation run models the last ``days`` (by default 21) of
+telemetry from scratch, although all but the last day of that period
+was already modeled by the run of the day before. A
+``RollingValidation`` keeps, between runs, the modeled quantities and
+the telemetry of the validation period at the model times, and the
+temperatures of every node of the model at the end of the period.
+The next run fetches telemetry and states for, and runs the model
+over, only the time since then, starting each node from its stored
+temperature. The new samples are appended and those which have
+fallen out of the validation period are dropped, and the quantiles
+are computed from the updated period.
+
+Sketches of the residuals of each day (see
+``acis_thermal_check.sketches``) are also kept, for longer than the
+validation period, so that the statistics of any range of days, e.g.
+a month or a year, are available from ``summary`` without running the
+model again.
+
+The store is kept in a directory of the "rolling" subdirectory of the
+cache directory which only the user running the model can read (see
+``get_private_cache_dir``), as a NumPy ``.npz`` file with the sketches
+stored as JSON, so that reading it never unpickles anything. It is
+keyed on the model, the contents of its specification and its limits,
+so that a change to the model starts a new validation period from
+scratch. The period is also remade from scratch if the last run is
+too old to continue from, or if it covers less than the period asked
+for.
+
+Since the model is not restarted from telemetry at the beginning of
+each period, its temperatures at the start of the period differ from
+those of a validation made from scratch until the initial conditions
+have been forgotten, which takes a day or two of model time.
+"""
+import os
+import json
+from collections import OrderedDict
+import numpy as np
+from acis_thermal_check.utils import mylog, get_private_cache_dir, \
+    atomic_write
+from acis_thermal_check.timeconv import to_date
+from acis_thermal_check.stepping import node_temps
+
+# The version of the format of the stored validations
+store_version = 3
+
+# The time before the end of the stored validation from which new
+# telemetry is fetched, so that the first new model times have
+# telemetry on both sides of them
+overlap = 3600.0
+
+# The shortest stretch of new telemetry which is worth running the
+# model for, in seconds
+min_update = 1200.0
+
+
+class RollingValidation(object):
+    """
+    The stored validation of a model, which is brought up to date by
+    each run.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck
+        The model checking object.
+    model_spec : string
+        The path to the thermal model specification.
+    days : float, optional
+        The length of the validation period in days. Default: 21.0
+    filename : string, optional
+        The path to the file the validation is stored in. Default is
+        a file in the "rolling" subdirectory of the cache directory.
+        If that cannot be used, the validation is not stored.
+    history_days : float, optional
+        How long the sketches of the residuals of each day are kept,
+        in days. Default: 1830.0
+    """
+    def __init__(self, atc, model_spec, days=21.0, filename=None,
+                 history_days=1830.0):
+        import acis_thermal_check
+        from acis_thermal_check.main import load_model_spec
+        from acis_thermal_check.manifest import hash_inputs
+        self.atc = atc
+        self.model_spec = model_spec
+        self.days = days
+        self.history_days = history_days
+        self.key = hash_inputs([acis_thermal_check.__version__,
+                                type(atc).__name__, atc.name, atc.msid,
+                                load_model_spec(model_spec),
+                                atc._limits_inputs()])
+        if filename is None:
+            try:
+                filename = os.path.join(get_private_cache_dir("rolling"),
+                                        "%s_%s.npz" % (atc.name, self.key))
+            except OSError as e:
+                mylog.warning("Cannot store the rolling validation: %s" % e)
+        self.filename = filename
+        self.state = self._load()
+
+    def _load(self):
+        from acis_thermal_check.sketches import ResidualSketch
+        if self.filename is None or not os.path.exists(self.filename):
+            return None
+        try:
+            # Only read a file which the user running the model wrote
+            if os.stat(self.filename).st_uid != os.getuid():
+                raise RuntimeError("it belongs to another user")
+            with np.load(self.filename, allow_pickle=False) as f:
+                meta = json.loads(str(f["meta"]))
+                if meta.get("version") != store_version or \
+                        meta.get("key") != self.key:
+                    return None
+                pred = OrderedDict((msid, f["pred%d" % i])
+                                   for i, msid in enumerate(meta["msids"]))
+                daily = {}
+                for day, sketches in meta["daily"]:
+                    daily[day] = OrderedDict(
+                        (msid, [ResidualSketch.from_dict(d) for d in bands])
+                        for msid, bands in sketches)
+                return {"version": store_version,
+                        "key": self.key,
+                        "tbegin": meta["tbegin"],
+                        "tstop": meta["tstop"],
+                        "times": f["times"],
+                        "pred": pred,
+                        "tlm": f["tlm"],
+                        "good_mask": f["good_mask"],
+                        "nodes": meta["nodes"],
+                        "daily": daily}
+        except Exception as e:
+            mylog.warning("Could not read the rolling validation %s: %s"
+                          % (self.filename, e))
+            return None
+
+    def save(self):
+        """
+        Write the validation to its file.
+        """
+        if self.state is None or self.filename is None:
+            return
+        state = self.state
+        meta = {"version": store_version,
+                "key": self.key,
+                "tbegin": float(state["tbegin"]),
+                "tstop": float(state["tstop"]),
+                "msids": list(state["pred"]),
+                "nodes": state["nodes"],
+                "daily": [[int(day), [[msid, [sketch.to_dict() for sketch in bands]]
+                                      for msid, bands in sketches.items()]]
+                          for day, sketches in sorted(state["daily"].items())]}
+        arrays = {"meta": np.array(json.dumps(meta)),
+                  "times": state["times"],
+                  "tlm": np.asarray(state["tlm"]),
+                  "good_mask": state["good_mask"]}
+        for i, msid in enumerate(meta["msids"]):
+            arrays["pred%d" % i] = state["pred"][msid]
+        atomic_write(self.filename, lambda f: np.savez(f, **arrays))
+
+    def fetch_start(self, tstop):
+        """
+        The earliest time which the validation ending at ``tstop``
+        needs inputs (e.g. ephemeris) for.
+
+        Parameters
+        ----------
+        tstop : float
+            The end of the validation period in seconds from the
+            beginning of the mission.
+        """
+        tbegin = tstop - self.days * 86400.0
+        if self._can_update(tbegin, tstop):
+            return self.state["tstop"] - overlap
+        return tbegin
+
+    def _can_update(self, tbegin, tstop):
+        # Whether the stored validation can be brought up to date, or
+        # the validation period has to be modeled from scratch
+        if self.state is None:
+            return False
+        return self.state["tbegin"] <= tbegin + 1.0 and \
+            tbegin < self.state["tstop"] <= tstop
+
+    def update(self, tstop):
+        """
+        Bring the validation up to ``tstop``, and store it.
+
+        Parameters
+        ----------
+        tstop : float
+            The end of the validation period in seconds from the
+            beginning of the mission.
+        """
+        tbegin = tstop - self.days * 86400.0
+        if self._can_update(tbegin, tstop):
+            self._extend(tstop)
+        else:
+            self._remake(tstop)
+        self._trim(tbegin)
+        self.save()
+
+    def _remake(self, tstop):
+        atc = self.atc
+        mylog.info('Making the rolling %s validation from scratch'
+                   % atc.name.upper())
+        tlm = atc.get_telem_values(tstop, days=self.days)
+        model, pred, tlm, good_mask = atc.calc_validation(tlm, self.model_spec)
+        atc.validate_model = model
+        # The days modeled again replace those of the old validation
+        daily = {} if self.state is None else self.state["daily"]
+        first_day = int(model.times[0] // 86400.0)
+        daily = {day: v for day, v in daily.items() if day < first_day}
+        self._add_daily(daily, model.times, pred, tlm, good_mask)
+        self.state = {"version": store_version,
+                      "key": self.key,
+                      "tbegin": tstop - self.days * 86400.0,
+                      "tstop": model.times[-1],
+                      "times": model.times.copy(),
+                      "pred": pred,
+                      "tlm": tlm,
+                      "good_mask": good_mask,
+                      "nodes": node_temps(model),
+                      "daily": daily}
+
+    def _extend(self, tstop):
+        atc = self.atc
+        state = self.state
+        start = state["tstop"]
+        try:
+            tlm = atc.get_telem_values(tstop,
+                                       days=(tstop - start + overlap) / 86400.0)
+        except ValueError:
+            mylog.info('No new telemetry since %s for the rolling validation'
+                       % to_date(start))
+            return
+        stop = tlm['date'][-1]
+        if stop - start < min_update:
+            mylog.info('No new telemetry since %s for the rolling validation'
+                       % to_date(start))
+            return
+        mylog.info('Updating the rolling %s validation from %s to %s'
+                   % (atc.name.upper(), to_date(start), to_date(stop)))
+        states = atc.state_builder.get_validation_states(start, stop)
+        model = atc.setup_model(self.model_spec, states, start, stop)
+        # Start every node from where the last run left it
+        for name, temp in state["nodes"].items():
+            model.comp[name].set_data(temp)
+        model.make()
+        model.calc()
+        atc.validate_model = model
+        pred, tlm, good_mask = atc._validation_outputs(model, tlm)
+        new = model.times > start
+        self._add_daily(state["daily"], model.times[new],
+                        OrderedDict((k, v[new]) for k, v in pred.items()),
+                        tlm[new], good_mask[new])
+        state["times"] = np.concatenate([state["times"], model.times[new]])
+        for msid in state["pred"]:
+            state["pred"][msid] = np.concatenate([state["pred"][msid],
+                                                  pred[msid][new]])
+        state["tlm"] = np.concatenate([state["tlm"], tlm[new]])
+        state["good_mask"] = np.concatenate([state["good_mask"],
+                                             good_mask[new]])
+        state["tstop"] = model.times[-1]
+        state["nodes"] = node_temps(model)
+
+    def _trim(self, tbegin):
+        # Drop the samples before the start of the validation period
+        state = self.state
+        keep = state["times"] >= tbegin
+        state["times"] = state["times"][keep]
+        for msid in state["pred"]:
+            state["pred"][msid] = state["pred"][msid][keep]
+        state["tlm"] = state["tlm"][keep]
+        state["good_mask"] = state["good_mask"][keep]
+        state["tbegin"] = tbegin
+        oldest = int((tbegin - self.history_days * 86400.0) // 86400.0)
+        state["daily"] = {day: v for day, v in state["daily"].items()
+                          if day >= oldest}
+
+    def _add_daily(self, daily, times, pred, tlm, good_mask):
+        # Add the sketches of the residuals of new samples to those
+        # of the days they fall in
+        from acis_thermal_check.sketches import merge_sketch_sets
+        days = (times // 86400.0).astype(np.int64)
+        for day in np.unique(days):
+            idxs = days == day
+            sketches = self.atc.calc_residual_sketches(
+                tlm[idxs], OrderedDict((k, v[idxs]) for k, v in pred.items()),
+                good_mask[idxs])
+            if day in daily:
+                sketches = merge_sketch_sets([daily[day], sketches])
+            daily[int(day)] = sketches
+
+    def stats(self, outdir, run_start):
+        """
+        Compute the quantiles of the residuals of the stored validation,
+        and write them out, as ``ACISThermalCheck.make_validation_stats``
+        does.
+
+        Parameters
+        ----------
+        outdir : string
+            The directory to write outputs to.
+        run_start : string
+            The starting date/time of the run.
+        """
+        if self.state is None:
+            raise RuntimeError("The rolling validation has not been made yet!")
+        state = self.state
+        return self.atc.calc_validation_stats(state["pred"], state["tlm"],
+                                              state["good_mask"], outdir,
+                                              run_start)
+
+    def summary(self, start=None, stop=None):
+        """
+        Get the sketches of the residuals of a range of days, merged
+        from the sketches of each day which have been kept.
+
+        Parameters
+        ----------
+        start : float or string, optional
+            The start of the range. Default: the first day kept.
+        stop : float or string, optional
+            The end of the range. Default: the last day kept.
+
+        Returns
+        -------
+        An OrderedDict keyed on the validated quantity, with a list
+        of sketches for each, as returned by
+        ``ACISThermalCheck.calc_residual_sketches``.
+        """
+        from acis_thermal_check.sketches import merge_sketch_sets
+        from acis_thermal_check.timeconv import to_secs
+        if self.state is None:
+            raise RuntimeError("The rolling validation has not been made yet!")
+        days = sorted(self.state["daily"])
+        if start is not None:
+            first = int(to_secs(start) // 86400.0)
+            days = [day for day in days if day >= first]
+        if stop is not None:
+            last = int(to_secs(stop) // 86400.0)
+            days = [day for day in days if day <= last]
+        if len(days) == 0:
+            raise RuntimeError("No days of the rolling validation are "
+                               "in the range asked for!")
+        return merge_sketch_sets([self.state["daily"][day] for day in days])
+
+    def run(self, tstop, outdir, run_start):
+        """
+        Bring the validation up to ``tstop`` and compute its quantiles.
+        See ``update`` and ``stats``.
+        """
+        self.update(tstop)
+        return self.stats(outdir, run_start)
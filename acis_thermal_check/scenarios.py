@@ -0,0 +1,270 @@
+"""
+"What if" scenarios for thermal model predictions.
+
+Load planners often want to know what a change to a load would do to
+the predicted temperatures, e.g. "what if we drop to 4 CCDs here" or
+"what if this dwell is at pitch 150". This module runs a baseline set
+of commanded states together with any number of edited versions of it,
+sharing the telemetry, initial state and ephemeris between them, and
+compares the results.
+
+.. code-block:: python
+
+    from acis_thermal_check.scenarios import Scenario, StateEdit, \\
+        get_baseline, run_scenarios
+
+    baseline = get_baseline(dpa_check, args)
+    scenarios = [Scenario("4 CCDs", [StateEdit("2020:210:00:00:00",
+                                               "2020:211:00:00:00",
+                                               ccd_count=4, fep_count=4)]),
+                 Scenario("pitch 150", [StateEdit("2020:212:03:00:00",
+                                                  "2020:212:20:00:00",
+                                                  pitch=150.0)])]
+    table = run_scenarios(dpa_check, args.model_spec, baseline, scenarios)
+"""
+import numpy as np
+from Chandra.Time import DateTime, secs2date
+from acis_thermal_check.utils import mylog, parallel_map, shared_inputs, \
+    calc_pitch_roll, make_state_builder
+
+# State columns which may be edited
+state_cols = ("ccd_count", "fep_count", "vid_board", "clocking",
+              "simpos", "q1", "q2", "q3", "q4")
+
+# Model inputs which may be overridden directly
+override_cols = ("pitch", "roll")
+
+
+class StateEdit(object):
+    """
+    An edit to the commanded states over a time range.
+
+    Parameters
+    ----------
+    tstart : float or string
+        The start of the time range, in seconds from the beginning of
+        the mission or as a date string.
+    tstop : float or string
+        The end of the time range, in seconds from the beginning of the
+        mission or as a date string.
+    **values
+        The new values. Any of "ccd_count", "fep_count", "vid_board",
+        "clocking", "simpos", and the attitude quaternion "q1"-"q4"
+        replace the values of the commanded states in the time range.
+        "pitch" and "roll" replace the values of the model pitch and
+        off-nominal roll in the time range directly.
+    """
+    def __init__(self, tstart, tstop, **values):
+        self.tstart = DateTime(tstart).secs
+        self.tstop = DateTime(tstop).secs
+        for key in values:
+            if key not in state_cols + override_cols:
+                raise RuntimeError("Cannot edit '%s' in a scenario!" % key)
+        self.values = values
+
+    @property
+    def state_values(self):
+        return {k: v for k, v in self.values.items() if k in state_cols}
+
+    @property
+    def override_values(self):
+        return {k: v for k, v in self.values.items() if k in override_cols}
+
+
+class Scenario(object):
+    """
+    A named set of edits to the baseline commanded states.
+
+    Parameters
+    ----------
+    name : string
+        The name of the scenario, used in the comparison table.
+    edits : list of StateEdit instances
+        The edits to apply, in order.
+    """
+    def __init__(self, name, edits):
+        self.name = name
+        self.edits = list(edits)
+
+
+def _split_states(states, t):
+    # Split the state which contains time t into two states at t
+    i = np.searchsorted(states['tstart'], t, side='right') - 1
+    if i < 0 or t >= states['tstop'][i] or t == states['tstart'][i]:
+        return states
+    first = states[i:i+1].copy()
+    second = states[i:i+1].copy()
+    date = secs2date(t)
+    first['tstop'] = t
+    first['datestop'] = date
+    second['tstart'] = t
+    second['datestart'] = date
+    return np.concatenate([states[:i], first, second,
+                           states[i+1:]]).view(np.recarray)
+
+
+def apply_state_edits(states, edits):
+    """
+    Apply a list of edits to a set of commanded states, splitting
+    states at the boundaries of the edits where necessary.
+
+    Parameters
+    ----------
+    states : NumPy record array
+        The commanded states. These are not modified.
+    edits : list of StateEdit instances
+        The edits to apply, in order.
+
+    Returns
+    -------
+    A new NumPy record array of commanded states.
+    """
+    states = states.copy()
+    for edit in edits:
+        values = edit.state_values
+        if not values:
+            continue
+        states = _split_states(states, edit.tstart)
+        states = _split_states(states, edit.tstop)
+        idxs = (states['tstart'] >= edit.tstart) & (states['tstop'] <= edit.tstop)
+        for key, value in values.items():
+            states[key][idxs] = value
+    return states
+
+
+def get_baseline(atc, args):
+    """
+    Get the baseline inputs for a set of scenarios for a load: the
+    commanded states and initial state of the prediction, from the
+    same telemetry and state builder that ``run`` would use.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model to run.
+    args : ArgumentParser arguments
+        The command-line options object, which must specify a
+        backstop file.
+
+    Returns
+    -------
+    A dictionary with the commanded states, the initial state, and the
+    start time of the load and stop time of the prediction.
+    """
+    if args.backstop_file is None:
+        raise RuntimeError("Scenarios need a backstop file for the baseline!")
+    atc.state_builder = make_state_builder(args.state_builder, args)
+    tstart, tstop, tnow = atc._determine_times(args.run_start, True)
+    tlm = atc.get_initial_telem(min(tstart, tnow), days=args.days)
+    states, state0 = atc.get_states(tlm, args.T_init)
+    return dict(states=states, state0=state0, load_start=tstart, tstop=tstop)
+
+
+def _run_scenario(i):
+    """
+    Run a single scenario. This is called in the worker processes,
+    and takes its inputs from ``shared_inputs``.
+    """
+    inp = shared_inputs()
+    atc = inp["atc"]
+    times = inp["times"]
+    if i < 0:
+        edits = []
+    else:
+        edits = inp["scenarios"][i].edits
+    states = apply_state_edits(inp["states"], edits)
+    if any(k.startswith("q") for edit in edits for k in edit.state_values):
+        # The attitude changed, so recompute pitch and roll
+        pitch, roll = calc_pitch_roll(times, inp["ephem"], states)
+    else:
+        pitch, roll = inp["pitch"].copy(), inp["roll"].copy()
+    for edit in edits:
+        idxs = (times >= edit.tstart) & (times <= edit.tstop)
+        for key, value in edit.override_values.items():
+            if key == "pitch":
+                pitch[idxs] = value
+            else:
+                roll[idxs] = value
+    state0 = inp["state0"]
+    model = atc.setup_model(inp["model_spec"], states, state0['tstart'],
+                            inp["tstop"], state0=state0, ephem=inp["ephem"],
+                            pitch=pitch, roll=roll)
+    model.make()
+    model.calc()
+    return model.comp[atc.msid].mvals.copy()
+
+
+def run_scenarios(atc, model_spec, baseline, scenarios, n_jobs=None):
+    """
+    Run the baseline prediction and a list of scenarios, and compare
+    the maximum and minimum temperatures and violations of each.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model to run.
+    model_spec : string
+        Path to the JSON file containing the model specification.
+    baseline : dict
+        The baseline inputs, as returned by ``get_baseline``.
+    scenarios : list of Scenario instances
+        The scenarios to run.
+    n_jobs : integer, optional
+        The number of worker processes. Default: one per CPU.
+
+    Returns
+    -------
+    An astropy Table with one row for the baseline and one for each
+    scenario. The violation counts are only given for the planning
+    limits the model has. The model times and temperatures of each are stored in
+    the "times" and "temps" items of the table's ``meta``.
+    """
+    from astropy.table import Table
+    states = baseline["states"]
+    state0 = baseline["state0"]
+    tstop = baseline["tstop"]
+    load_start = baseline["load_start"]
+
+    # The model times, ephemeris and baseline pitch and roll are the same
+    # for all of the scenarios, so compute them once
+    times = atc._new_model(model_spec, state0['tstart'], tstop).times
+    ephem = atc.get_ephemeris(state0['tstart'], tstop, times)
+    pitch, roll = calc_pitch_roll(times, ephem, states)
+
+    mylog.info('Running %d scenarios for the %s thermal model'
+               % (len(scenarios), atc.name.upper()))
+    shared = dict(atc=atc, model_spec=model_spec, states=states,
+                  state0=state0, tstop=tstop, times=times, ephem=ephem,
+                  pitch=pitch, roll=roll, scenarios=scenarios)
+    # Index -1 is the baseline
+    results = parallel_map(_run_scenario, range(-1, len(scenarios)),
+                           n_jobs=n_jobs, shared=shared)
+
+    names = ["baseline"] + [sc.name for sc in scenarios]
+    in_load = times >= load_start
+    rows = []
+    for name, temp in zip(names, results):
+        row = {"scenario": name,
+               "max_temp": temp[in_load].max(),
+               "datemax": secs2date(times[in_load][temp[in_load].argmax()]),
+               "min_temp": temp[in_load].min(),
+               "datemin": secs2date(times[in_load][temp[in_load].argmin()])}
+        # Models without planning limits (e.g. the focal plane)
+        # have no violations to count
+        if atc.plan_limit_hi is not None:
+            hot = atc._make_prediction_viols(times, temp, load_start,
+                                             atc.plan_limit_hi, "planning",
+                                             "max")
+            row["n_hot_viols"] = len(hot)
+        if atc.flag_cold_viols and atc.plan_limit_lo is not None:
+            cold = atc._make_prediction_viols(times, temp, load_start,
+                                              atc.plan_limit_lo, "planning", "min")
+            row["n_cold_viols"] = len(cold)
+        rows.append(row)
+    table = Table(rows=rows, names=list(rows[0].keys()))
+    table["delta_max_temp"] = table["max_temp"] - table["max_temp"][0]
+    for col in ("max_temp", "min_temp", "delta_max_temp"):
+        table[col].format = '%.2f'
+    table.meta["times"] = times
+    table.meta["temps"] = dict(zip(names, results))
+    return table
@@ -0,0 +1,254 @@
+"""
+Screening loads for how close they come to the planning limits.
+
+For most loads the prediction never comes near the planning limits, and
+the plots, data files and report of a full run are not needed to know
+that. ``screen_headroom`` runs only the prediction model, with adaptive
+time steps (see ``acis_thermal_check.stepping``), and returns how far
+the temperature stays from the hot and cold planning limits in each
+segment of the load, so that tools which build loads can screen many
+candidates and only run the full model on the marginal ones.
+
+.. code-block:: python
+
+    from acis_thermal_check.scenarios import get_baseline
+    from acis_thermal_check.screening import screen_headroom
+
+    baseline = get_baseline(dpa_check, args)
+    screen = screen_headroom(dpa_check, args.model_spec, baseline)
+    if screen["min_headroom_hi"] < 2.0:
+        dpa_check.run(args)
+
+Many candidate loads with the same initial state are screened in
+parallel with ``screen_loads``.
+"""
+import numpy as np
+from acis_thermal_check.utils import mylog, parallel_map, shared_inputs
+from acis_thermal_check.timeconv import to_date
+
+# The coarse time step of the screening model, in seconds
+default_coarse_dt = 1312.0
+
+
+def load_segments(states, load_start, tstop, by="obsid"):
+    """
+    Split a load into segments.
+
+    Parameters
+    ----------
+    states : NumPy record array
+        Commanded states
+    load_start : float
+        The start time of the load.
+    tstop : float
+        The end time of the load.
+    by : string or float, optional
+        "obsid" for a segment for each run of states with the same
+        obsid, or a length of time in hours for segments of that
+        length. Default: "obsid"
+
+    Returns
+    -------
+    A list of (tstart, tstop, obsid) for each segment, where obsid is
+    None for segments of fixed length.
+    """
+    if by != "obsid":
+        length = float(by) * 3600.0
+        starts = np.arange(load_start, tstop, length)
+        return [(t, min(t + length, tstop), None) for t in starts]
+    ok = (states['tstop'] > load_start) & (states['tstart'] < tstop)
+    segments = []
+    for state in states[ok]:
+        start = max(state['tstart'], load_start)
+        stop = min(state['tstop'], tstop)
+        obsid = int(state['obsid'])
+        if segments and segments[-1][2] == obsid:
+            segments[-1] = (segments[-1][0], stop, obsid)
+        else:
+            segments.append((start, stop, obsid))
+    return segments
+
+
+def calc_headroom(atc, times, temp, segments):
+    """
+    Compute the headroom of a predicted temperature to the planning
+    limits in each segment of a load.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model which was run.
+    times : NumPy array
+        The model times.
+    temp : NumPy array
+        The predicted temperature.
+    segments : list of 3-tuples
+        The segments of the load, as returned by ``load_segments``.
+
+    Returns
+    -------
+    A dictionary with the smallest headroom to the hot ("min_headroom_hi")
+    and cold ("min_headroom_lo") planning limits over the load, in
+    degC, and a list of dictionaries for each segment ("segments").
+    Headroom is negative where a limit is violated. The cold headroom
+    is None for models which do not check the cold limit.
+    """
+    if atc.plan_limit_hi is None:
+        raise RuntimeError("The %s model has no planning limits to screen "
+                           "against!" % atc.name.upper())
+    out = []
+    for tstart, tstop, obsid in segments:
+        idxs = (times >= tstart) & (times <= tstop)
+        if not idxs.any():
+            # Shorter than a time step, so take the nearest time
+            idxs = [np.abs(times - 0.5 * (tstart + tstop)).argmin()]
+        seg_temp = temp[idxs]
+        seg = {"datestart": to_date(tstart),
+               "datestop": to_date(tstop),
+               "obsid": obsid,
+               "max_temp": float(seg_temp.max()),
+               "min_temp": float(seg_temp.min())}
+        seg["headroom_hi"] = atc.plan_limit_hi - seg["max_temp"]
+        if atc.flag_cold_viols:
+            seg["headroom_lo"] = seg["min_temp"] - atc.plan_limit_lo
+        else:
+            seg["headroom_lo"] = None
+        out.append(seg)
+    min_hi = min(seg["headroom_hi"] for seg in out)
+    if atc.flag_cold_viols:
+        min_lo = min(seg["headroom_lo"] for seg in out)
+    else:
+        min_lo = None
+    return {"min_headroom_hi": min_hi, "min_headroom_lo": min_lo,
+            "segments": out}
+
+
+def _screen(atc, model_spec, states, state0, load_start, tstop, coarse_dt,
+            by):
+    # Run the prediction model and compute the headroom of one load
+    model = atc.calc_model(model_spec, states, state0['tstart'], tstop,
+                           state0=state0, coarse_dt=coarse_dt)
+    segments = load_segments(states, load_start, tstop, by=by)
+    return calc_headroom(atc, model.times, model.comp[atc.msid].mvals,
+                         segments)
+
+
+def screen_headroom(atc, model_spec, baseline, coarse_dt=default_coarse_dt,
+                    by="obsid"):
+    """
+    Run the prediction model for a load, without any plots or files,
+    and compute its headroom to the planning limits in each segment
+    of the load.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model to run.
+    model_spec : string
+        Path to the JSON file containing the model specification.
+    baseline : dict
+        The commanded states ("states"), initial state ("state0"), start
+        of the load ("load_start") and end of the prediction ("tstop"),
+        as returned by ``acis_thermal_check.scenarios.get_baseline``.
+    coarse_dt : float, optional
+        The coarse time step of the model in seconds, or None to run the
+        model at the fixed time step of its specification. Default: 1312.0
+    by : string or float, optional
+        How the load is split into segments, see ``load_segments``.
+        Default: "obsid"
+
+    Returns
+    -------
+    A dictionary of the headroom, see ``calc_headroom``.
+    """
+    state0 = baseline["state0"]
+    atc.preload_ephemeris(state0['tstart'], baseline["tstop"])
+    return _screen(atc, model_spec, baseline["states"], state0,
+                   baseline["load_start"], baseline["tstop"], coarse_dt, by)
+
+
+def _screen_load(i):
+    """
+    Screen a single load. This is called in the worker processes,
+    and takes its inputs from ``shared_inputs``.
+    """
+    inp = shared_inputs()
+    return _screen(inp["atc"], inp["model_spec"], inp["loads"][i],
+                   inp["state0"], inp["load_start"], inp["tstop"],
+                   inp["coarse_dt"], inp["by"])
+
+
+def screen_loads(atc, model_spec, loads, state0, load_start, tstop,
+                 coarse_dt=default_coarse_dt, by="obsid", n_jobs=None):
+    """
+    Screen a list of candidate loads which start from the same initial
+    state, in parallel.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model to run.
+    model_spec : string
+        Path to the JSON file containing the model specification.
+    loads : list of NumPy record arrays
+        The commanded states of each candidate load.
+    state0 : dict
+        The initial state, including the initial temperature.
+    load_start : float
+        The start time of the loads.
+    tstop : float
+        The end time of the predictions.
+    coarse_dt : float, optional
+        The coarse time step of the model in seconds, or None to run the
+        model at the fixed time step of its specification. Default: 1312.0
+    by : string or float, optional
+        How each load is split into segments, see ``load_segments``.
+        Default: "obsid"
+    n_jobs : integer, optional
+        The number of worker processes. Default: one per CPU.
+
+    Returns
+    -------
+    A list with the headroom of each load, see ``calc_headroom``.
+    """
+    mylog.info('Screening %d loads with the %s thermal model'
+               % (len(loads), atc.name.upper()))
+    # The ephemeris is the same for all of the loads
+    atc.preload_ephemeris(state0['tstart'], tstop)
+    shared = dict(atc=atc, model_spec=model_spec, loads=loads,
+                  state0=state0, load_start=load_start, tstop=tstop,
+                  coarse_dt=coarse_dt, by=by)
+    return parallel_map(_screen_load, range(len(loads)), n_jobs=n_jobs,
+                        shared=shared)
+
+
+def screen_load(atc, args, by="obsid"):
+    """
+    Screen the load given by a set of command-line options, getting
+    its commanded states and initial state as ``run`` would.
+
+    Parameters
+    ----------
+    atc : ACISThermalCheck instance
+        The model to run.
+    args : ArgumentParser arguments
+        The command-line options object, which must specify a backstop
+        file. ``args.coarse_dt`` sets the coarse time step, if given.
+    by : string or float, optional
+        How the load is split into segments, see ``load_segments``.
+        Default: "obsid"
+
+    Returns
+    -------
+    A dictionary of the headroom, see ``calc_headroom``.
+    """
+    from acis_thermal_check.scenarios import get_baseline
+    baseline = get_baseline(atc, args)
+    coarse_dt = args.coarse_dt
+    if coarse_dt is None:
+        coarse_dt = default_coarse_dt
+    screen = screen_headroom(atc, args.model_spec, baseline,
+                             coarse_dt=coarse_dt, by=by)
+    mylog.info('Smallest headroom of %s to the hot planning limit is %.2f degC'
+               % (atc.msid, screen["min_headroom_hi"]))
+    return screen
@@ -0,0 +1,220 @@
+"""
+A long-running service mode for ``acis_thermal_check`` models.
+
+Every ``*_check`` invocation from the command line is a fresh process
+which has to import the modeling stack, connect to the commanded states
+database and read the model limits before it can do any work. The
+``ACISThermalServer`` keeps one instance of each model class resident
+in a single process, along with the database connection, the parsed
+model specifications, the compiled report template and the most recent
+archive fetches, and runs models on request over a simple local HTTP
+interface.
+
+A request is a JSON object POSTed to the server, e.g.::
+
+    {"models": ["dpa", "dea"],
+     "backstop_file": "/data/acis/LoadReviews/2020/JUL2720/ofls",
+     "run_start": "2020:205:00:00:00",
+     "T_init": {"dpa": 25.0},
+     "outdir": "/data/acis/LoadReviews/2020/JUL2720/ofls/out"}
+
+Any other option understood by ``get_options`` (e.g. ``days``,
+``interrupt``, ``pred_only``) may also be given. ``T_init`` may be a
+single value or a dictionary keyed on model name. If ``models`` is not
+given, all of the models the server knows about are run. Each model
+writes its outputs to a subdirectory of ``outdir`` with the model name.
+
+The response is a JSON object keyed on model name, giving the path
+to the report, the violations, the validation quantiles and the files
+written for each model (see ``RunResult.to_dict``).
+
+A request with ``"action": "screen"`` only runs the prediction model of
+each model for the load, without writing anything, and responds with
+the headroom to the planning limits in each segment of the load (see
+``acis_thermal_check.screening``). Segments are observations, unless
+``"segment_hours"`` gives their length in hours.
+"""
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from acis_thermal_check.utils import mylog, get_options, \
+    check_options
+
+
+def _json_default(obj):
+    # NumPy scalars and arrays are not JSON serializable
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8")
+    raise TypeError("Cannot serialize object of type %s" % type(obj))
+
+
+class ACISThermalServer(object):
+    """
+    Run ACIS thermal models on request from a single long-lived
+    process.
+
+    Parameters
+    ----------
+    models : dict
+        A dictionary mapping model names (e.g., "dpa") to 2-tuples of
+        (ACISThermalCheck instance, model_path), where model_path is
+        the default directory path where the model JSON files are
+        located, as passed to ``get_options``. An optional third item
+        gives the additional command-line options for that model.
+    host : string, optional
+        The host to listen on. Default: "localhost"
+    port : integer, optional
+        The port to listen on. Default: 8400
+    """
+    def __init__(self, models, host="localhost", port=8400):
+        self.models = {}
+        for name, model in models.items():
+            if len(model) == 2:
+                model = tuple(model) + (None,)
+            self.models[name] = model
+        self.host = host
+        self.port = port
+
+    def make_args(self, name, request):
+        """
+        Construct the options object for a single model run from
+        a request, starting from the defaults of ``get_options``.
+
+        Parameters
+        ----------
+        name : string
+            The name of the model to run.
+        request : dict
+            The request, as described in the module docstring.
+        """
+        atc, model_path, opts = self.models[name]
+        args = get_options(name, model_path, opts=opts, argv=[])
+        for key, value in request.items():
+            if key in ("models", "outdir", "action", "segment_hours"):
+                continue
+            # Per-model values are given as a dictionary
+            if isinstance(value, dict):
+                value = value.get(name, None)
+            if not hasattr(args, key):
+                raise RuntimeError("Unknown option '%s' in request!" % key)
+            setattr(args, key, value)
+        args.outdir = os.path.join(request.get("outdir", "out"), name)
+        check_options(args)
+        return args
+
+    def run_request(self, request):
+        """
+        Run the models specified in a request.
+
+        Parameters
+        ----------
+        request : dict
+            The request, as described in the module docstring.
+
+        Returns
+        -------
+        A dictionary keyed on model name with the outputs of each
+        model run.
+        """
+        names = request.get("models", None)
+        if names is None:
+            names = sorted(self.models.keys())
+        action = request.get("action", "run")
+        if action not in ("run", "screen"):
+            return {"error": "Unknown action '%s'!" % action}
+        response = {}
+        for name in names:
+            if name not in self.models:
+                response[name] = {"status": "error",
+                                  "error": "No such model '%s'!" % name}
+                continue
+            t0 = time.time()
+            try:
+                args = self.make_args(name, request)
+                atc = self.models[name][0]
+                if action == "screen":
+                    from acis_thermal_check.screening import screen_load
+                    screen = screen_load(atc, args,
+                                         by=request.get("segment_hours", "obsid"))
+                else:
+                    result = atc.run(args)
+            except Exception as err:
+                mylog.error("Model run for %s failed: %s" % (name, err))
+                response[name] = {"status": "error", "error": str(err)}
+                continue
+            if action == "screen":
+                response[name] = screen
+                response[name]["status"] = "ok"
+                response[name]["run_time"] = time.time() - t0
+                continue
+            response[name] = result.to_dict()
+            response[name]["status"] = "ok"
+            if "index.html" in result.artifacts:
+                response[name]["report"] = result.artifact_path("index.html")
+            response[name]["run_time"] = time.time() - t0
+        return response
+
+    def serve_forever(self):
+        """
+        Start the HTTP server and handle requests until interrupted.
+        Requests are handled one at a time.
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, code, body):
+                out = json.dumps(body, default=_json_default).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def do_GET(self):
+                # A simple health check which lists the available models
+                self._send(200, {"models": sorted(server.models.keys())})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length))
+                except ValueError as err:
+                    self._send(400, {"error": "Bad request: %s" % err})
+                    return
+                self._send(200, server.run_request(request))
+
+            def log_message(self, format, *args):
+                mylog.debug(format % args)
+
+        httpd = HTTPServer((self.host, self.port), Handler)
+        mylog.info("Serving models %s on http://%s:%d" %
+                   (", ".join(sorted(self.models.keys())), self.host, self.port))
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+
+
+def run_server(models, host="localhost", port=8400):
+    """
+    Convenience function to create an ``ACISThermalServer`` and
+    start serving requests.
+
+    Parameters
+    ----------
+    models : dict
+        A dictionary mapping model names (e.g., "dpa") to 2-tuples of
+        (ACISThermalCheck instance, model_path). See
+        ``ACISThermalServer``.
+    host : string, optional
+        The host to listen on. Default: "localhost"
+    port : integer, optional
+        The port to listen on. Default: 8400
+    """
+    ACISThermalServer(models, host=host, port=port).serve_forever()
@@ -0,0 +1,282 @@
+"""
+Mergeable sketches of the distributions of validation residuals.
+
+The quantiles in the validation report are exact order statistics of
+the sorted residuals of one validation period, which cannot be
+combined with those of other periods without going back to the
+residuals themselves. A ``ResidualSketch`` is a histogram of residuals
+in bins of a fixed width, aligned on multiples of the width, so that
+the sketches of any two sets of residuals of the same quantity are
+combined by adding the counts of their bins. This makes the statistics
+of e.g. the days of a rolling validation, the windows of a
+back-validation run in parallel, or several years of validations
+cheap to combine.
+
+Each quantile of a sketch is the center of the bin which holds that
+order statistic, so it is never further than half a bin width from
+the exact quantile of the same residuals, however many sketches were
+merged to make it:
+
+.. code-block:: python
+
+    from acis_thermal_check.sketches import ResidualSketch, merge_sketches
+
+    sketch = merge_sketches([ResidualSketch(0.01, resid1),
+                             ResidualSketch(0.01, resid2)])
+    print(sketch.quantile(50), sketch.error_bound)
+"""
+import numpy as np
+
+# The widths of the bins of the sketches of each validated quantity,
+# chosen to be finer than the precision the quantiles are reported to.
+# Temperatures use default_width.
+residual_widths = {'pitch': 0.001,
+                   'tscpos': 1.0,
+                   'roll': 0.001}
+default_width = 0.01
+
+
+def residual_width(msid):
+    """
+    The width of the bins of the sketch of the residuals of a
+    validated quantity.
+
+    Parameters
+    ----------
+    msid : string
+        The validated quantity, e.g. "1dpamzt" or "pitch".
+    """
+    return residual_widths.get(msid, default_width)
+
+
+class ResidualSketch(object):
+    """
+    A histogram of residuals in bins of a fixed width, which can be
+    merged with other sketches of the same width.
+
+    Parameters
+    ----------
+    width : float
+        The width of the bins. The edges of the bins are the
+        multiples of the width.
+    values : array-like, optional
+        Residuals to add to the sketch. Values which are not finite
+        are left out.
+    """
+    def __init__(self, width, values=None):
+        if width <= 0.0:
+            raise RuntimeError("The width of the bins of a sketch must be "
+                               "positive, not %g!" % width)
+        self.width = float(width)
+        # The indices of the bins which are not empty, in order,
+        # and the number of values in each
+        self.bins = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.sum = 0.0
+        if values is not None:
+            self.add(values)
+
+    @property
+    def error_bound(self):
+        """
+        The largest difference between a quantile of the sketch and
+        the exact quantile of the residuals it was made from.
+        """
+        return 0.5 * self.width
+
+    @property
+    def mean(self):
+        """
+        The mean of the residuals, which is exact.
+        """
+        if self.n == 0:
+            return np.nan
+        return self.sum / self.n
+
+    def _combine(self, bins, counts):
+        bins = np.concatenate([self.bins, bins])
+        counts = np.concatenate([self.counts, counts])
+        self.bins, inverse = np.unique(bins, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts,
+                                  minlength=len(self.bins)).astype(np.int64)
+
+    def add(self, values):
+        """
+        Add residuals to the sketch.
+
+        Parameters
+        ----------
+        values : array-like
+            The residuals to add. Values which are not finite are
+            left out.
+
+        Returns
+        -------
+        The sketch itself.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        bins, counts = np.unique(np.floor(values / self.width).astype(np.int64),
+                                 return_counts=True)
+        self._combine(bins, counts)
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.sum += values.sum()
+        return self
+
+    def merge(self, other):
+        """
+        Combine the sketch with another one of the same width.
+
+        Parameters
+        ----------
+        other : ResidualSketch
+            The sketch to merge with.
+
+        Returns
+        -------
+        A new sketch of the residuals of both sketches.
+        """
+        if other.width != self.width:
+            raise RuntimeError("Cannot merge sketches with bins of width "
+                               "%g and %g!" % (self.width, other.width))
+        out = self.copy()
+        out._combine(other.bins, other.counts)
+        out.n += other.n
+        out.min = min(out.min, other.min)
+        out.max = max(out.max, other.max)
+        out.sum += other.sum
+        return out
+
+    def copy(self):
+        """
+        Make a copy of the sketch.
+        """
+        out = ResidualSketch(self.width)
+        out.bins = self.bins.copy()
+        out.counts = self.counts.copy()
+        out.n = self.n
+        out.min = self.min
+        out.max = self.max
+        out.sum = self.sum
+        return out
+
+    def quantile(self, quant):
+        """
+        Get a quantile of the residuals, in the same sense as the
+        quantiles of the validation report: the order statistic with
+        index ``(n * quant) // 100``.
+
+        Parameters
+        ----------
+        quant : float
+            The quantile in percent, e.g. 50 for the median.
+        """
+        if self.n == 0:
+            return np.nan
+        k = min(int((self.n * quant) // 100), self.n - 1)
+        i = np.searchsorted(np.cumsum(self.counts), k, side='right')
+        value = (self.bins[i] + 0.5) * self.width
+        # The residuals all lie between the smallest and the largest
+        return float(np.clip(value, self.min, self.max))
+
+    def quantiles(self, quants):
+        """
+        Get a list of quantiles of the residuals, see ``quantile``.
+        """
+        return [self.quantile(quant) for quant in quants]
+
+    def histogram(self, width=None):
+        """
+        Get the histogram of the residuals.
+
+        Parameters
+        ----------
+        width : float, optional
+            The width of the bins of the histogram, which is rounded to
+            a whole number of bins of the sketch. Default: the width
+            of the bins of the sketch.
+
+        Returns
+        -------
+        2 NumPy arrays: the edges of the bins and the number of
+        residuals in each bin.
+        """
+        factor = 1 if width is None else max(int(round(width / self.width)), 1)
+        if self.n == 0:
+            return np.zeros(1), np.zeros(0, dtype=np.int64)
+        bins = np.floor_divide(self.bins, factor)
+        first = bins[0]
+        counts = np.bincount(bins - first, weights=self.counts).astype(np.int64)
+        edges = (first + np.arange(len(counts) + 1)) * factor * self.width
+        return edges, counts
+
+    def to_dict(self):
+        """
+        The contents of the sketch as a dictionary of plain numbers and
+        lists, which can be serialized as JSON.
+        """
+        return {"width": self.width, "bins": self.bins.tolist(),
+                "counts": self.counts.tolist(), "n": self.n,
+                "min": float(self.min), "max": float(self.max),
+                "sum": float(self.sum)}
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Make a sketch from a dictionary written by ``to_dict``.
+        """
+        out = cls(d["width"])
+        out.bins = np.array(d["bins"], dtype=np.int64)
+        out.counts = np.array(d["counts"], dtype=np.int64)
+        out.n = d["n"]
+        out.min = d["min"]
+        out.max = d["max"]
+        out.sum = d["sum"]
+        return out
+
+
+def merge_sketches(sketches):
+    """
+    Combine a list of sketches of the same width into one.
+
+    Parameters
+    ----------
+    sketches : list of ResidualSketch
+        The sketches to merge.
+    """
+    if len(sketches) == 0:
+        raise RuntimeError("There are no sketches to merge!")
+    out = sketches[0].copy()
+    for sketch in sketches[1:]:
+        out = out.merge(sketch)
+    return out
+
+
+def merge_sketch_sets(sketch_sets):
+    """
+    Combine sets of sketches of validated quantities, as returned by
+    ``ACISThermalCheck.calc_residual_sketches``, quantity by quantity
+    and band by band.
+
+    Parameters
+    ----------
+    sketch_sets : list of dicts
+        The sets of sketches, each of which is a dictionary keyed on
+        the validated quantity of lists of sketches, one per band.
+    """
+    from collections import OrderedDict
+    out = OrderedDict()
+    for sketches in sketch_sets:
+        for msid, bands in sketches.items():
+            if msid not in out:
+                out[msid] = [sketch.copy() for sketch in bands]
+            else:
+                out[msid] = [a.merge(b) for a, b in zip(out[msid], bands)]
+    return out
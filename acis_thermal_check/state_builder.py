@@ -5,6 +5,58 @@ from pprint import pformat
 import Chandra.cmd_states as cmd_states
 import logging
 from Ska.File import get_globfiles
+from acis_thermal_check.timeconv import to_secs, to_date
+
+# Connections to the commanded states database, keyed on the
+# path to the database file. These are kept open for the life
+# of the process so that a long-running service does not have
+# to reconnect for every model run.
+_db_connections = {}
+
+
+def get_cmd_states_db(logger=None):
+    """
+    Return a connection to the commanded states database,
+    reusing an existing connection if one is already open.
+
+    Parameters
+    ----------
+    logger : Logger object, optional
+        The Python Logger object to be used when logging.
+    """
+    server = os.path.join(os.environ['SKA'], 'data', 'cmd_states', 'cmd_states.db3')
+    if server not in _db_connections:
+        if logger is not None:
+            logger.info('Connecting to {} to get cmd_states'.format(server))
+        _db_connections[server] = Ska.DBI.DBI(dbi="sqlite", server=server,
+                                              user='aca_read', database='aca')
+    return _db_connections[server]
+
+
+def window_states(states, tstart, tstop):
+    """
+    Select the commanded states which intersect a time range, and
+    trim the first and last states to the range, in the same way as
+    ``StateBuilder.get_validation_states``.
+
+    Parameters
+    ----------
+    states : NumPy record array
+        The commanded states. These are not modified.
+    tstart : float
+        The start of the time range in seconds from the beginning of the
+        mission.
+    tstop : float
+        The end of the time range in seconds from the beginning of the
+        mission.
+    """
+    ok = (states['tstop'] > tstart) & (states['tstart'] < tstop)
+    states = states[ok].copy()
+    states['tstart'][0] = tstart - 0.01
+    states['datestart'][0] = to_date(states['tstart'][0])
+    states['tstop'][-1] = tstop + 0.01
+    states['datestop'][-1] = to_date(states['tstop'][-1])
+    return states
 
 
 class StateBuilder(object):
@@ -60,8 +112,8 @@ class StateBuilder(object):
         datestop : string
             The end date to grab states before.
         """
-        datestart = DateTime(datestart).date
-        datestop = DateTime(datestop).date
+        datestart = to_date(datestart)
+        datestop = to_date(datestop)
         self.logger.info('Getting commanded states between %s - %s' %
                          (datestart, datestop))
 
@@ -78,10 +130,10 @@ class StateBuilder(object):
         # to date and back to secs.  (The reference tstop could be just over the
         # 0.001 precision of date and thus cause an out-of-bounds error when
         # interpolating state values).
-        states[0].tstart = DateTime(datestart).secs - 0.01
-        states[0].datestart = DateTime(states[0].tstart).date
-        states[-1].tstop = DateTime(datestop).secs + 0.01
-        states[-1].datestop = DateTime(states[-1].tstop).date
+        states[0].tstart = to_secs(datestart) - 0.01
+        states[0].datestart = to_date(states[0].tstart)
+        states[-1].tstop = to_secs(datestop) + 0.01
+        states[-1].datestop = to_date(states[-1].tstop)
 
         return states
 
@@ -114,10 +166,7 @@ class SQLStateBuilder(StateBuilder):
         self.interrupt = interrupt
         self.backstop_file = backstop_file
         # Connect to database 
-        server = os.path.join(os.environ['SKA'], 'data', 'cmd_states', 'cmd_states.db3')
-        self.logger.info('Connecting to {} to get cmd_states'.format(server))
-        self.db = Ska.DBI.DBI(dbi="sqlite", server=server, user='aca_read',
-                              database='aca')
+        self.db = get_cmd_states_db(logger=self.logger)
         if self.backstop_file is not None:
             self._get_bs_cmds()
 #
@@ -152,7 +201,7 @@ class SQLStateBuilder(StateBuilder):
         state0 = cmd_states.get_state0(tbegin, self.db, datepar='datestart',
                                        date_margin=None)
 
-        self.logger.debug('state0 at %s is\n%s' % (DateTime(state0['tstart']).date,
+        self.logger.debug('state0 at %s is\n%s' % (to_date(state0['tstart']),
                                                    pformat(state0)))
 
         # Get commands after end of state0 through first backstop command time
@@ -265,10 +314,7 @@ class ACISStateBuilder(StateBuilder):
 
         # Connect to database (NEED TO USE aca_read for sybase; user is ignored for sqlite)
         # We only need this as the quick way to get the validation states.
-        server = os.path.join(os.environ['SKA'], 'data', 'cmd_states', 'cmd_states.db3')
-        self.logger.info('Connecting to {} to get cmd_states'.format(server))
-        self.db = Ska.DBI.DBI(dbi="sqlite", server=server, user='aca_read',
-                              database='aca')
+        self.db = get_cmd_states_db(logger=self.logger)
 
     def get_prediction_states(self, tbegin):
         """
@@ -420,7 +466,7 @@ class ACISStateBuilder(StateBuilder):
         states[-1].datestop = bs_cmds[-1]['date']
         states[-1].tstop = bs_cmds[-1]['time']
 
-        self.logger.debug('state0 at %s is\n%s' % (DateTime(state0['tstart']).date,
+        self.logger.debug('state0 at %s is\n%s' % (to_date(state0['tstart']),
                                                    pformat(state0)))
 
         return states, state0
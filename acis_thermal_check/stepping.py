@@ -0,0 +1,256 @@
+"""
+Adaptive time steps for model predictions.
+
+A xija model runs at one time step over its whole span, so a prediction
+over long constant dwells costs as much per day as one over a week of
+maneuvers. With adaptive stepping, the prediction is split into
+segments at the commanded states: the inside of each state which is
+long enough is run at a coarse time step, and the time around the
+transitions between states, where the temperatures change quickly, at
+the fine time step of the model. Each segment is its own xija model,
+started from the temperatures of every node at the end of the segment
+before it, and the segments are joined into a ``SteppedModel``, which
+can be used in place of the xija model of a prediction.
+
+xija puts the first time of a model on the sample of the 5min telemetry
+archive at or before its start, and steps by the time step of the model
+from there. So that each segment starts exactly on the last time of the
+segment before it, the ends of the segments are put on a grid of times
+which are samples of the archive and times of both the fine and the
+coarse grids, which is why the coarse time step must be a multiple of
+the fine one.
+"""
+from collections import OrderedDict
+import numpy as np
+
+# A sample time of the 5min telemetry archive, and the interval between
+# its samples, which xija aligns the times of models to
+archive_time0 = 410270764.0
+archive_dt = 328.0
+
+# The time steps of the models are multiples of this, in seconds
+min_dt = 32.8
+
+# The longest coarse time step, as a multiple of the time step the model
+# was fitted at, for which the integration of the model is stable
+max_step_ratio = 4.0
+
+
+def _tenths(dt):
+    # A time step as a whole number of tenths of a second
+    return int(round(dt * 10.0))
+
+
+def check_time_steps(coarse_dt, fine_dt=None, fit_dt=None):
+    """
+    Check that a coarse time step can be used for adaptive stepping,
+    and raise a RuntimeError if it cannot.
+
+    Parameters
+    ----------
+    coarse_dt : float
+        The coarse time step in seconds.
+    fine_dt : float, optional
+        The fine time step in seconds, which the coarse time step
+        must be a multiple of. Default: None, not checked.
+    fit_dt : float, optional
+        The time step the model was fitted at. The coarse time step
+        must not be more than ``max_step_ratio`` times longer.
+        Default: None, not checked.
+    """
+    for name, dt in (("coarse", coarse_dt), ("fine", fine_dt)):
+        if dt is None:
+            continue
+        if dt <= 0.0 or abs(dt * 10.0 - _tenths(dt)) > 1.0e-6 or \
+                _tenths(dt) % _tenths(min_dt) != 0:
+            raise RuntimeError("The %s time step (%g s) must be a positive "
+                               "multiple of %g s!" % (name, dt, min_dt))
+    if fine_dt is not None:
+        if coarse_dt <= fine_dt or _tenths(coarse_dt) % _tenths(fine_dt) != 0:
+            raise RuntimeError("The coarse time step (%g s) must be a multiple "
+                               "of the fine time step (%g s)!"
+                               % (coarse_dt, fine_dt))
+    if fit_dt is not None and coarse_dt > max_step_ratio * fit_dt * (1.0 + 1.0e-9):
+        raise RuntimeError("The coarse time step (%g s) is more than %g times "
+                           "the time step the model was fitted at (%g s), "
+                           "which may make the model unstable!"
+                           % (coarse_dt, max_step_ratio, fit_dt))
+
+
+def grid_start(t):
+    """
+    The first time of a xija model which starts at ``t``: the sample
+    of the 5min telemetry archive at or before it.
+    """
+    return archive_time0 + np.floor((t - archive_time0) / archive_dt) * archive_dt
+
+
+def node_temps(model):
+    """
+    Get the temperatures of the nodes of a xija model at its last time.
+
+    Parameters
+    ----------
+    model : xija.ThermalModel
+        The model, which has been run.
+
+    Returns
+    -------
+    A dictionary of the temperatures keyed on the names of the nodes.
+    """
+    import xija
+    return {comp.name: float(comp.mvals[-1]) for comp in model.comps
+            if isinstance(comp, xija.Node)}
+
+
+def plan_steps(states, tstart, tstop, fine_dt, coarse_dt, margin=10800.0):
+    """
+    Split the span of a prediction into segments run at the fine or
+    the coarse time step.
+
+    Parameters
+    ----------
+    states : NumPy record array
+        Commanded states
+    tstart : float
+        The start time of the prediction.
+    tstop : float
+        The end time of the prediction.
+    fine_dt : float
+        The time step near the transitions between states, in seconds.
+    coarse_dt : float
+        The time step inside long states, in seconds.
+    margin : float, optional
+        The time after the start and before the end of a state which is
+        run at the fine time step, in seconds. Default: 10800.0
+
+    Returns
+    -------
+    A list of (start, stop, dt) for each segment, in order, which
+    together cover the span of the prediction. The first segment starts
+    at the first time of a xija model starting at ``tstart``, and
+    the ends of the segments are on a grid of times which are times of
+    the models of the segments on both sides of them, except for the
+    end of the last segment, which is ``tstop``.
+    """
+    check_time_steps(coarse_dt, fine_dt=fine_dt)
+    # The ends of the segments are a whole number of this many seconds
+    # from the first time, which is a sample of the archive
+    step = np.lcm.reduce([_tenths(fine_dt), _tenths(coarse_dt),
+                          _tenths(archive_dt)]) / 10.0
+    t0 = grid_start(tstart)
+    # Coarse segments shorter than this are not worth a model of their own
+    min_coarse = 4 * coarse_dt
+    steps = []
+    t = t0
+    for state in states:
+        start = max(state['tstart'], tstart) + margin
+        stop = min(state['tstop'], tstop) - margin
+        start = t0 + np.ceil((start - t0) / step) * step
+        stop = t0 + np.floor((stop - t0) / step) * step
+        if stop - start < min_coarse or start - t < 2 * fine_dt:
+            continue
+        steps.append((t, start, fine_dt))
+        steps.append((start, stop, coarse_dt))
+        t = stop
+    if tstop - t < 2 * fine_dt and len(steps) > 0:
+        # Too short for a segment of its own, so the coarse segment
+        # before it runs to the end
+        steps[-1] = (steps[-1][0], tstop, steps[-1][2])
+    else:
+        steps.append((t, tstop, fine_dt))
+    return steps
+
+
+class _SteppedComponent(object):
+    # A component of a SteppedModel, which joins the values of the same
+    # component of each segment. Anything else is taken from the first.
+    def __init__(self, model, name):
+        self._model = model
+        self.name = name
+
+    def _join(self, attr):
+        vals = [getattr(m.comp[self.name], attr)[keep]
+                for m, keep in zip(self._model.models, self._model.keeps)]
+        return np.concatenate(vals)
+
+    @property
+    def mvals(self):
+        return self._join("mvals")
+
+    @property
+    def dvals(self):
+        return self._join("dvals")
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self._model.models[0].comp[self.name], attr)
+
+
+def segment_span(start, stop, dt, last=False):
+    """
+    The start and stop times to make the xija model of a segment with,
+    so that its first time is ``start`` and its last time ``stop``,
+    whatever the rounding of the times.
+
+    Parameters
+    ----------
+    start : float
+        The start of the segment, as returned by ``plan_steps``.
+    stop : float
+        The end of the segment, as returned by ``plan_steps``.
+    dt : float
+        The time step of the segment.
+    last : boolean, optional
+        Whether this is the last segment, which ends at the last time
+        step before ``stop``. Default: False
+    """
+    if last:
+        return start + 1.0, stop
+    return start + 1.0, stop + 0.5 * dt
+
+
+class SteppedModel(object):
+    """
+    The segments of a prediction run with adaptive time steps, joined
+    into one model. Its times and the ``mvals`` and ``dvals`` of its
+    components are those of every segment, with the first time of each
+    segment after the first left out, since it is the last time of the
+    segment before.
+
+    Parameters
+    ----------
+    models : list of xija.ThermalModel
+        The models of the segments, in order, which have been run.
+    """
+    def __init__(self, models):
+        self.models = models
+        self.keeps = [np.ones(len(models[0].times), dtype=bool)]
+        for prev, model in zip(models[:-1], models[1:]):
+            if abs(model.times[0] - prev.times[-1]) > 1.0e-3:
+                raise RuntimeError("A segment starts at %.3f, not at the last "
+                                   "time of the segment before (%.3f)!"
+                                   % (model.times[0], prev.times[-1]))
+            keep = np.ones(len(model.times), dtype=bool)
+            keep[0] = False
+            self.keeps.append(keep)
+        self.times = np.concatenate([m.times[keep] for m, keep
+                                     in zip(models, self.keeps)])
+        self.comp = OrderedDict((comp.name, _SteppedComponent(self, comp.name))
+                                for comp in models[0].comps)
+        self.comps = list(self.comp.values())
+
+    @property
+    def dts(self):
+        """
+        The time step of each segment.
+        """
+        return [m.dt for m in self.models]
+
+    def __getattr__(self, attr):
+        # Anything else, e.g. the model parameters or bad times,
+        # is the same for every segment
+        if attr.startswith("_") or attr == "models":
+            raise AttributeError(attr)
+        return getattr(self.models[0], attr)
@@ -0,0 +1,123 @@
+"""
+A memory-mapped store for the telemetry array of a model run.
+
+The telemetry record array built by ``ACISThermalCheck.get_telem_values``
+is the largest input of a model run. When the work of a run is fanned
+out across processes (e.g. validation windows in a back-validation), a
+copy of it would otherwise be pickled and sent to each worker. The
+``TelemetryStore`` writes the array once to a file in the ``.npy``
+format, whose small header records the dtype and shape, and every
+process which opens the store gets a read-only view of the same pages
+of memory. The store itself only carries its path when it is pickled.
+
+.. code-block:: python
+
+    from acis_thermal_check.telemetry import TelemetryStore
+
+    with TelemetryStore() as store:
+        store.write(tlm)
+        # in any process
+        tlm = store.read()
+        window = store.window(tstart, tstop)
+"""
+import os
+import tempfile
+import numpy as np
+
+
+def _default_dir():
+    # Use shared memory for the file if the system has it, so that
+    # the pages are never written out to disk
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class TelemetryStore(object):
+    """
+    A record array of telemetry shared between processes through
+    a memory-mapped file.
+
+    Parameters
+    ----------
+    filename : string, optional
+        The path to the file backing the store. Default is a new
+        temporary file, which is removed when the store is closed.
+    """
+    def __init__(self, filename=None):
+        self.owner = filename is None
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix="acis_tlm_", suffix=".npy",
+                                            dir=_default_dir())
+            os.close(fd)
+        self.filename = filename
+        self._tlm = None
+
+    def __getstate__(self):
+        # Only the path is sent to other processes, which map the
+        # file themselves. Only the creating process removes it.
+        return {"filename": self.filename, "owner": False, "_tlm": None}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, tlm):
+        """
+        Write a telemetry record array to the store.
+
+        Parameters
+        ----------
+        tlm : NumPy record array
+            The telemetry, as returned by ``get_telem_values``.
+
+        Returns
+        -------
+        A read-only view of the telemetry in the store.
+        """
+        out = np.lib.format.open_memmap(self.filename, mode="w+",
+                                        dtype=tlm.dtype, shape=tlm.shape)
+        out[:] = tlm
+        out.flush()
+        del out
+        self._tlm = None
+        return self.read()
+
+    def read(self):
+        """
+        Get a read-only view of the telemetry in the store. The file
+        is only mapped once in each process.
+        """
+        if self._tlm is None:
+            tlm = np.load(self.filename, mmap_mode="r")
+            self._tlm = tlm.view(np.recarray)
+        return self._tlm
+
+    def window(self, tstart, tstop):
+        """
+        Get a read-only view of the telemetry between two times,
+        without copying it.
+
+        Parameters
+        ----------
+        tstart : float
+            The start time in seconds from the beginning of the mission.
+        tstop : float
+            The stop time in seconds from the beginning of the mission.
+        """
+        tlm = self.read()
+        i0, i1 = np.searchsorted(tlm['date'], [tstart, tstop], side='left')
+        if i1 < len(tlm) and tlm['date'][i1] == tstop:
+            i1 += 1
+        return tlm[i0:i1]
+
+    def close(self):
+        """
+        Release the mapping, and remove the file if this store
+        created it.
+        """
+        self._tlm = None
+        if self.owner and os.path.exists(self.filename):
+            os.remove(self.filename)
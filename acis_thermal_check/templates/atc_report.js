@@ -0,0 +1,529 @@
+/*
+ * Draw the plots of an interactive acis_thermal_check report.
+ *
+ * Each plot is described by a data file which calls ATC.addPlot, and
+ * is drawn on the canvas whose data-plot attribute is the name of the
+ * plot. Drag across a plot to zoom in on a range of times, use the
+ * mouse wheel to zoom in or out around the cursor, and double-click
+ * to show all of the data again. Plots of the same group zoom together.
+ */
+var ATC = (function () {
+    "use strict";
+
+    var specs = {};
+    var plots = [];
+    var DAY = 86400.0;
+    var MARGIN = {left: 75, right: 75, top: 34, bottom: 58};
+
+    function decode(b64) {
+        // base64 string of little-endian float32 values
+        var s = atob(b64);
+        var bytes = new Uint8Array(s.length);
+        for (var i = 0; i < s.length; i++) {
+            bytes[i] = s.charCodeAt(i);
+        }
+        return new Float32Array(bytes.buffer);
+    }
+
+    function pad(n, width) {
+        var s = String(n);
+        while (s.length < width) {
+            s = "0" + s;
+        }
+        return s;
+    }
+
+    function formatDate(unix, step) {
+        // Chandra-style dates, YYYY:DOY or DOY:HH:MM for short steps
+        var d = new Date(unix * 1000.0);
+        var start = Date.UTC(d.getUTCFullYear(), 0, 1);
+        var doy = Math.floor((d.getTime() - start) / (DAY * 1000.0)) + 1;
+        if (step >= DAY) {
+            return d.getUTCFullYear() + ":" + pad(doy, 3);
+        }
+        return pad(doy, 3) + ":" + pad(d.getUTCHours(), 2) + ":" +
+            pad(d.getUTCMinutes(), 2);
+    }
+
+    function niceStep(span, n) {
+        // A round step which gives about n ticks over a span
+        var raw = span / n;
+        var mag = Math.pow(10, Math.floor(Math.log(raw) / Math.LN10));
+        var steps = [1, 2, 2.5, 5, 10];
+        for (var i = 0; i < steps.length; i++) {
+            if (steps[i] * mag >= raw) {
+                return steps[i] * mag;
+            }
+        }
+        return 10 * mag;
+    }
+
+    function timeStep(span, n) {
+        var steps = [600, 1800, 3600, 2 * 3600, 6 * 3600, 12 * 3600, DAY,
+                     2 * DAY, 5 * DAY, 7 * DAY, 14 * DAY, 30 * DAY,
+                     60 * DAY, 180 * DAY, 365 * DAY];
+        for (var i = 0; i < steps.length; i++) {
+            if (span / steps[i] <= n) {
+                return steps[i];
+            }
+        }
+        return steps[steps.length - 1];
+    }
+
+    function lowerBound(arr, value) {
+        var lo = 0, hi = arr.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (arr[mid] < value) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        return lo;
+    }
+
+    function Plot(canvas, name, spec) {
+        this.canvas = canvas;
+        this.name = name;
+        this.spec = spec;
+        this.series = spec.series.map(function (s) {
+            var out = {};
+            for (var k in s) {
+                out[k] = s[k];
+            }
+            out.x = decode(s.x);
+            out.y = decode(s.y);
+            if (s.y2 !== undefined) {
+                out.y2 = decode(s.y2);
+            }
+            return out;
+        });
+        this.full = this.dataRange();
+        this.reset();
+        this.drag = null;
+        this.bind();
+    }
+
+    Plot.prototype.dataRange = function () {
+        var lo = Infinity, hi = -Infinity;
+        this.series.forEach(function (s) {
+            if (s.x.length > 0) {
+                lo = Math.min(lo, s.x[0]);
+                hi = Math.max(hi, s.x[s.x.length - 1]);
+            }
+        });
+        if (!isFinite(lo)) {
+            lo = 0.0;
+            hi = 1.0;
+        }
+        return [lo, hi];
+    };
+
+    Plot.prototype.reset = function () {
+        // The view is kept in absolute units so that plots of a
+        // group with different origins can share it
+        var r = this.spec.xlim || this.full;
+        this.view = [r[0] + this.spec.x0, r[1] + this.spec.x0];
+    };
+
+    Plot.prototype.setView = function (view, linked) {
+        this.view = view;
+        this.draw();
+        if (!linked && this.spec.group) {
+            var self = this;
+            plots.forEach(function (p) {
+                if (p !== self && p.spec.group === self.spec.group) {
+                    p.setView(view.slice(), true);
+                }
+            });
+        }
+    };
+
+    Plot.prototype.area = function () {
+        var w = this.canvas.clientWidth, h = this.canvas.clientHeight;
+        return {x: MARGIN.left, y: MARGIN.top,
+                w: w - MARGIN.left - MARGIN.right,
+                h: h - MARGIN.top - MARGIN.bottom};
+    };
+
+    Plot.prototype.xToPx = function (x, a) {
+        // x is relative to the origin of the plot
+        var v0 = this.view[0] - this.spec.x0, v1 = this.view[1] - this.spec.x0;
+        return a.x + (x - v0) / (v1 - v0) * a.w;
+    };
+
+    Plot.prototype.pxToX = function (px, a) {
+        return this.view[0] + (px - a.x) / a.w * (this.view[1] - this.view[0]);
+    };
+
+    Plot.prototype.yRange = function (axis) {
+        var lim = axis === 0 ? this.spec.ylim : this.spec.ylim2;
+        if (lim) {
+            return lim;
+        }
+        var v0 = this.view[0] - this.spec.x0, v1 = this.view[1] - this.spec.x0;
+        var log = axis === 0 && this.spec.ylog;
+        var lo = Infinity, hi = -Infinity;
+        this.series.forEach(function (s) {
+            if (s.axis !== axis) {
+                return;
+            }
+            var i0 = Math.max(lowerBound(s.x, v0) - 1, 0);
+            var i1 = Math.min(lowerBound(s.x, v1) + 1, s.y.length);
+            var arrs = s.y2 ? [s.y, s.y2] : [s.y];
+            arrs.forEach(function (arr) {
+                for (var i = i0; i < i1; i++) {
+                    if (log && !(arr[i] > 0)) { continue; }
+                    if (arr[i] < lo) { lo = arr[i]; }
+                    if (arr[i] > hi) { hi = arr[i]; }
+                }
+            });
+        });
+        if (!isFinite(lo)) {
+            return [0.0, 1.0];
+        }
+        // Make sure that the limits can always be seen
+        this.spec.hlines.forEach(function (l) {
+            if (l.axis === axis && !(log && l.y <= 0)) {
+                lo = Math.min(lo, l.y - (log ? 0 : 1));
+                hi = Math.max(hi, l.y + (log ? 0 : 1));
+            }
+        });
+        if (hi === lo) {
+            hi = lo + 1.0;
+        }
+        if (log) {
+            return [lo / 1.5, hi * 1.5];
+        }
+        var margin = 0.05 * (hi - lo);
+        return [lo - margin, hi + margin];
+    };
+
+    Plot.prototype.yScale = function (axis, a) {
+        var r = this.yRange(axis);
+        var log = axis === 0 && this.spec.ylog;
+        var t = log ? function (v) { return Math.log(v) / Math.LN10; } :
+            function (v) { return v; };
+        var y0 = t(r[0]), y1 = t(r[1]);
+        return {range: r, log: log,
+                px: function (v) { return a.y + a.h - (t(v) - y0) / (y1 - y0) * a.h; }};
+    };
+
+    Plot.prototype.drawLine = function (ctx, s, ys, a) {
+        // Draw at most the first, last, minimum and maximum of the
+        // samples in each column of pixels
+        var v0 = this.view[0] - this.spec.x0, v1 = this.view[1] - this.spec.x0;
+        var i0 = Math.max(lowerBound(s.x, v0) - 1, 0);
+        var i1 = Math.min(lowerBound(s.x, v1) + 1, s.y.length);
+        var self = this;
+        var started = false;
+        function to(i) {
+            var px = self.xToPx(s.x[i], a), py = ys.px(s.y[i]);
+            if (!isFinite(py)) {
+                started = false;
+                return;
+            }
+            if (started) {
+                ctx.lineTo(px, py);
+            } else {
+                ctx.moveTo(px, py);
+                started = true;
+            }
+        }
+        ctx.beginPath();
+        if (i1 - i0 <= 4 * a.w) {
+            for (var i = i0; i < i1; i++) {
+                to(i);
+            }
+        } else {
+            var col = null, first = 0, last = 0, imin = 0, imax = 0;
+            for (var j = i0; j <= i1; j++) {
+                var c = j < i1 ? Math.floor(this.xToPx(s.x[j], a)) : null;
+                if (c !== col || j === i1) {
+                    if (col !== null) {
+                        [first, imin, imax, last].sort(function (p, q) {
+                            return p - q;
+                        }).forEach(to);
+                    }
+                    col = c;
+                    first = last = imin = imax = j;
+                } else {
+                    last = j;
+                    if (s.y[j] < s.y[imin]) { imin = j; }
+                    if (s.y[j] > s.y[imax]) { imax = j; }
+                }
+            }
+        }
+        ctx.stroke();
+    };
+
+    Plot.prototype.drawSeries = function (ctx, s, ys, a) {
+        ctx.save();
+        ctx.strokeStyle = s.color;
+        ctx.fillStyle = s.color;
+        ctx.globalAlpha = s.alpha;
+        ctx.lineWidth = s.width;
+        ctx.setLineDash(s.dash || []);
+        var i;
+        if (s.kind === "line") {
+            this.drawLine(ctx, s, ys, a);
+        } else if (s.kind === "points") {
+            for (i = 0; i < s.y.length; i++) {
+                ctx.fillRect(this.xToPx(s.x[i], a) - 2, ys.px(s.y[i]) - 2, 4, 4);
+            }
+        } else if (s.kind === "steps") {
+            // A histogram, with one more bin edge than counts
+            ctx.beginPath();
+            for (i = 0; i < s.y.length; i++) {
+                var py = ys.px(ys.log ? Math.max(s.y[i], 0.5) : s.y[i]);
+                if (i === 0) {
+                    ctx.moveTo(this.xToPx(s.x[0], a), py);
+                } else {
+                    ctx.lineTo(this.xToPx(s.x[i], a), py);
+                }
+                ctx.lineTo(this.xToPx(s.x[i + 1], a), py);
+            }
+            ctx.stroke();
+        } else if (s.kind === "band") {
+            ctx.beginPath();
+            for (i = 0; i < s.y.length; i++) {
+                ctx.lineTo(this.xToPx(s.x[i], a), ys.px(s.y[i]));
+            }
+            for (i = s.y.length - 1; i >= 0; i--) {
+                ctx.lineTo(this.xToPx(s.x[i], a), ys.px(s.y2[i]));
+            }
+            ctx.closePath();
+            ctx.fill();
+        }
+        ctx.restore();
+    };
+
+    Plot.prototype.drawAxes = function (ctx, a, scales) {
+        var spec = this.spec;
+        ctx.save();
+        ctx.strokeStyle = "#000";
+        ctx.lineWidth = 1.5;
+        ctx.strokeRect(a.x, a.y, a.w, a.h);
+        ctx.fillStyle = "#000";
+        ctx.font = "13px sans-serif";
+        // x ticks and grid
+        var span = this.view[1] - this.view[0];
+        var step, first, x, px;
+        if (spec.xtype === "time") {
+            step = timeStep(span, 8);
+            var u0 = spec.x0_unix - spec.x0;
+            first = Math.ceil((this.view[0] + u0) / step) * step - u0;
+        } else {
+            step = niceStep(span, 8);
+            first = Math.ceil(this.view[0] / step) * step;
+        }
+        ctx.textAlign = "center";
+        ctx.textBaseline = "top";
+        for (x = first; x <= this.view[1]; x += step) {
+            px = this.xToPx(x - spec.x0, a);
+            ctx.strokeStyle = "#ddd";
+            ctx.beginPath();
+            ctx.moveTo(px, a.y);
+            ctx.lineTo(px, a.y + a.h);
+            ctx.stroke();
+            var label = spec.xtype === "time" ?
+                formatDate(spec.x0_unix + (x - spec.x0), step) :
+                String(Math.round(x / step * 1000) * step / 1000);
+            ctx.fillText(label, px, a.y + a.h + 6);
+        }
+        ctx.fillText(spec.xlabel, a.x + a.w / 2, a.y + a.h + 30);
+        // y ticks and grid
+        var self = this;
+        [0, 1].forEach(function (axis) {
+            var ys = scales[axis];
+            if (!ys) {
+                return;
+            }
+            var r = ys.range;
+            var ticks = [];
+            var y;
+            if (ys.log) {
+                for (y = Math.pow(10, Math.ceil(Math.log(r[0]) / Math.LN10)); y <= r[1]; y *= 10) {
+                    ticks.push(y);
+                }
+            } else {
+                var ystep = niceStep(r[1] - r[0], 6);
+                for (y = Math.ceil(r[0] / ystep) * ystep; y <= r[1]; y += ystep) {
+                    ticks.push(Math.round(y / ystep) * ystep);
+                }
+            }
+            ctx.textBaseline = "middle";
+            ctx.textAlign = axis === 0 ? "right" : "left";
+            ticks.forEach(function (t) {
+                var py = ys.px(t);
+                if (axis === 0) {
+                    ctx.strokeStyle = "#ddd";
+                    ctx.beginPath();
+                    ctx.moveTo(a.x, py);
+                    ctx.lineTo(a.x + a.w, py);
+                    ctx.stroke();
+                }
+                var text = Math.abs(t) >= 1e4 || (t !== 0 && Math.abs(t) < 1e-2) ?
+                    t.toExponential(1) : String(parseFloat(t.toPrecision(6)));
+                ctx.fillText(text, axis === 0 ? a.x - 6 : a.x + a.w + 6, py);
+            });
+            ctx.save();
+            var lx = axis === 0 ? 16 : a.x + a.w + MARGIN.right - 10;
+            ctx.translate(lx, a.y + a.h / 2);
+            ctx.rotate(-Math.PI / 2);
+            ctx.textAlign = "center";
+            ctx.fillText(axis === 0 ? spec.ylabel : spec.ylabel2, 0, 0);
+            ctx.restore();
+        });
+        ctx.font = "bold 15px sans-serif";
+        ctx.textAlign = "center";
+        ctx.textBaseline = "bottom";
+        ctx.fillText(spec.title, a.x + a.w / 2, a.y - 8);
+        // Legend
+        ctx.font = "12px sans-serif";
+        ctx.textAlign = "left";
+        ctx.textBaseline = "middle";
+        var ly = a.y + 12;
+        this.series.forEach(function (s) {
+            if (!s.label) {
+                return;
+            }
+            ctx.strokeStyle = s.color;
+            ctx.lineWidth = s.width;
+            ctx.setLineDash(s.dash || []);
+            ctx.beginPath();
+            ctx.moveTo(a.x + 10, ly);
+            ctx.lineTo(a.x + 35, ly);
+            ctx.stroke();
+            ctx.fillText(s.label, a.x + 40, ly);
+            ly += 16;
+        });
+        ctx.restore();
+        return self;
+    };
+
+    Plot.prototype.draw = function () {
+        var canvas = this.canvas;
+        var ratio = window.devicePixelRatio || 1;
+        canvas.width = canvas.clientWidth * ratio;
+        canvas.height = canvas.clientHeight * ratio;
+        var ctx = canvas.getContext("2d");
+        ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+        ctx.clearRect(0, 0, canvas.clientWidth, canvas.clientHeight);
+        var a = this.area();
+        var self = this;
+        var scales = [this.yScale(0, a), null];
+        if (this.series.some(function (s) { return s.axis === 1; })) {
+            scales[1] = this.yScale(1, a);
+        }
+        ctx.save();
+        ctx.beginPath();
+        ctx.rect(a.x, a.y, a.w, a.h);
+        ctx.clip();
+        this.spec.spans.forEach(function (sp) {
+            ctx.globalAlpha = sp.alpha;
+            ctx.fillStyle = sp.color;
+            var p0 = self.xToPx(sp.x0, a), p1 = self.xToPx(sp.x1, a);
+            ctx.fillRect(p0, a.y, Math.max(p1 - p0, 1), a.h);
+        });
+        ctx.globalAlpha = 1.0;
+        this.series.forEach(function (s) {
+            self.drawSeries(ctx, s, scales[s.axis], a);
+        });
+        this.spec.hlines.forEach(function (l) {
+            var py = scales[l.axis].px(l.y);
+            ctx.strokeStyle = l.color;
+            ctx.lineWidth = l.width;
+            ctx.setLineDash(l.dash || []);
+            ctx.beginPath();
+            ctx.moveTo(a.x, py);
+            ctx.lineTo(a.x + a.w, py);
+            ctx.stroke();
+        });
+        this.spec.vlines.forEach(function (l) {
+            var px = self.xToPx(l.x, a);
+            ctx.strokeStyle = l.color;
+            ctx.lineWidth = l.width;
+            ctx.setLineDash(l.dash || []);
+            ctx.beginPath();
+            ctx.moveTo(px, a.y);
+            ctx.lineTo(px, a.y + a.h);
+            ctx.stroke();
+        });
+        ctx.setLineDash([]);
+        if (this.drag && this.drag.x1 !== undefined) {
+            ctx.fillStyle = "rgba(0, 0, 0, 0.15)";
+            ctx.fillRect(Math.min(this.drag.x0, this.drag.x1), a.y,
+                         Math.abs(this.drag.x1 - this.drag.x0), a.h);
+        }
+        ctx.restore();
+        this.drawAxes(ctx, a, scales);
+    };
+
+    Plot.prototype.bind = function () {
+        var self = this, canvas = this.canvas;
+        function pos(ev) {
+            var rect = canvas.getBoundingClientRect();
+            return ev.clientX - rect.left;
+        }
+        canvas.addEventListener("mousedown", function (ev) {
+            self.drag = {x0: pos(ev)};
+        });
+        canvas.addEventListener("mousemove", function (ev) {
+            if (self.drag) {
+                self.drag.x1 = pos(ev);
+                self.draw();
+            }
+        });
+        window.addEventListener("mouseup", function (ev) {
+            if (!self.drag) {
+                return;
+            }
+            var drag = self.drag;
+            self.drag = null;
+            if (drag.x1 !== undefined && Math.abs(drag.x1 - drag.x0) > 5) {
+                var a = self.area();
+                var v0 = self.pxToX(Math.min(drag.x0, drag.x1), a);
+                var v1 = self.pxToX(Math.max(drag.x0, drag.x1), a);
+                self.setView([v0, v1]);
+            } else {
+                self.draw();
+            }
+        });
+        canvas.addEventListener("dblclick", function () {
+            self.reset();
+            self.setView(self.view);
+        });
+        canvas.addEventListener("wheel", function (ev) {
+            ev.preventDefault();
+            var a = self.area();
+            var x = self.pxToX(pos(ev), a);
+            var f = ev.deltaY > 0 ? 1.25 : 0.8;
+            self.setView([x - (x - self.view[0]) * f,
+                          x + (self.view[1] - x) * f]);
+        }, {passive: false});
+    };
+
+    function init() {
+        var canvases = document.querySelectorAll("canvas[data-plot]");
+        for (var i = 0; i < canvases.length; i++) {
+            var name = canvases[i].getAttribute("data-plot");
+            if (specs[name] !== undefined) {
+                plots.push(new Plot(canvases[i], name, specs[name]));
+            }
+        }
+        plots.forEach(function (p) { p.draw(); });
+        window.addEventListener("resize", function () {
+            plots.forEach(function (p) { p.draw(); });
+        });
+    }
+
+    document.addEventListener("DOMContentLoaded", init);
+
+    return {
+        addPlot: function (name, spec) {
+            specs[name] = spec;
+        }
+    };
+}());
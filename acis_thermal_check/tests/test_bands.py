@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from acis_thermal_check.utils import calc_band_bitmask
+
+
+values = np.array([-1.0, 0.0, 0.5, 1.0, 2.0])
+
+
+def band(values, limit, op=None):
+    # The mask of a single band
+    return calc_band_bitmask(values, [limit], [op]).astype(bool)
+
+
+def test_open_and_closed_bounds():
+    assert list(band(values, 1.0, "greater")) == [0, 0, 0, 0, 1]
+    assert list(band(values, 1.0, "greater_equal")) == [0, 0, 0, 1, 1]
+    assert list(band(values, 0.0, "less")) == [1, 0, 0, 0, 0]
+    assert list(band(values, 0.0, "less_equal")) == [1, 1, 0, 0, 0]
+
+
+@pytest.mark.parametrize("limit", [(0.0, 1.0), [0.0, 1.0]])
+def test_pair_bands_are_inclusive(limit):
+    # A pair needs no operation, and may be a list as read from JSON
+    assert list(band(values, limit)) == [0, 1, 1, 1, 0]
+    assert list(band(values, limit, "greater")) == [0, 1, 1, 1, 0]
+
+
+def test_other_ufuncs():
+    assert list(band(values, 0.5, "not_equal")) == [1, 1, 0, 1, 1]
+    assert list(band(values, 0.5, "equal")) == [0, 0, 1, 0, 0]
+
+
+def test_unknown_op():
+    with pytest.raises(RuntimeError):
+        calc_band_bitmask(values, [1.0], ["sqrt"])
+    with pytest.raises(RuntimeError):
+        calc_band_bitmask(values, [1.0], ["spam"])
+    with pytest.raises(RuntimeError):
+        calc_band_bitmask(values, [1.0], [])
+
+
+def test_several_bands():
+    limits = [0.0, (0.0, 1.0), [1.0, 2.0], 0.5]
+    ops = ["less", None, None, "not_equal"]
+    bits = calc_band_bitmask(values, limits, ops)
+    assert list(bits) == [0b1001, 0b1010, 0b0010, 0b1110, 0b1100]
+
+
+def test_max_bands():
+    limits = [float(i) for i in range(64)]
+    bits = calc_band_bitmask(np.array([63.0, 0.0]), limits,
+                             ["equal"] * 64)
+    assert bits.dtype == np.uint64
+    assert list(bits) == [np.uint64(1) << np.uint64(63), 1]
+    with pytest.raises(RuntimeError):
+        calc_band_bitmask(values, limits + [64.0], ["equal"] * 65)
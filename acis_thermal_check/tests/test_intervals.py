@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from acis_thermal_check.utils import parse_intervals, interval_mask
+
+
+def baseline_mask(times, intervals):
+    # The loop over the bad times which interval_mask replaces
+    good_mask = np.ones(len(times), dtype='bool')
+    for interval in intervals:
+        bad = (times >= interval[0]) & (times < interval[1])
+        good_mask[bad] = False
+    return ~good_mask
+
+
+def test_merge_overlapping():
+    starts, stops = parse_intervals([(50.0, 60.0), (0.0, 10.0),
+                                     (5.0, 20.0), (20.0, 30.0),
+                                     (8.0, 9.0)], cache=False)
+    assert list(starts) == [0.0, 50.0]
+    assert list(stops) == [30.0, 60.0]
+
+
+def test_half_open():
+    starts, stops = parse_intervals([(10.0, 20.0), (30.0, 40.0)],
+                                    cache=False)
+    times = np.array([9.9, 10.0, 19.9, 20.0, 30.0, 40.0, 50.0])
+    assert list(interval_mask(times, starts, stops)) == \
+        [False, True, True, False, True, False, False]
+
+
+def test_empty():
+    starts, stops = parse_intervals([], cache=False)
+    assert len(starts) == len(stops) == 0
+    assert not interval_mask(np.arange(3.0), starts, stops).any()
+
+
+def test_cached_read_only():
+    intervals = [(100.0, 200.0), (150.0, 300.0)]
+    starts, stops = parse_intervals(intervals)
+    assert parse_intervals(list(intervals)) == (starts, stops)
+    assert parse_intervals(intervals)[0] is starts
+    with pytest.raises(ValueError):
+        starts[0] = 0.0
+    with pytest.raises(ValueError):
+        stops[0] = 0.0
+
+
+def test_same_as_baseline():
+    rng = np.random.RandomState(42)
+    times = np.sort(rng.uniform(0.0, 1000.0, 5000))
+    # Include times exactly on the ends of the intervals
+    ends = rng.uniform(0.0, 1000.0, (20, 2))
+    times = np.sort(np.concatenate([times, ends.ravel()]))
+    intervals = [(lo, lo + w) for lo, w in zip(ends[:, 0], ends[:, 1] / 10)]
+    starts, stops = parse_intervals(intervals, cache=False)
+    assert np.array_equal(interval_mask(times, starts, stops),
+                          baseline_mask(times, intervals))
@@ -0,0 +1,89 @@
+import json
+import numpy as np
+import pytest
+from acis_thermal_check.sketches import ResidualSketch, merge_sketches, \
+    merge_sketch_sets
+
+quants = (1, 5, 16, 50, 84, 95, 99)
+
+
+def make_resid(n=5000, seed=42):
+    rng = np.random.RandomState(seed)
+    return np.concatenate([rng.normal(0.3, 1.2, n), rng.normal(-2.0, 0.4, n // 5)])
+
+
+def test_quantile_error_bound():
+    resid = make_resid()
+    sketch = ResidualSketch(0.01, resid)
+    resid = np.sort(resid)
+    assert sketch.n == len(resid)
+    for quant in quants:
+        exact = resid[(len(resid) * quant) // 100]
+        assert abs(sketch.quantile(quant) - exact) <= \
+            sketch.error_bound * (1.0 + 1.0e-6)
+    assert sketch.quantile(0) >= resid[0]
+    assert sketch.quantile(100) <= resid[-1]
+    assert sketch.mean == pytest.approx(resid.mean())
+
+
+def test_not_finite():
+    sketch = ResidualSketch(0.01, [0.5, np.nan, np.inf, -0.5])
+    assert sketch.n == 2
+    assert np.isnan(ResidualSketch(0.01).quantile(50))
+    with pytest.raises(RuntimeError):
+        ResidualSketch(0.0)
+
+
+def test_merge_exact():
+    resid = make_resid()
+    sketch = ResidualSketch(0.01, resid)
+    parts = [ResidualSketch(0.01, resid[i::3]) for i in range(3)]
+    merged = merge_sketches(parts)
+    assert merged.n == sketch.n
+    np.testing.assert_array_equal(merged.bins, sketch.bins)
+    np.testing.assert_array_equal(merged.counts, sketch.counts)
+    assert merged.min == sketch.min
+    assert merged.max == sketch.max
+    assert merged.quantiles(quants) == sketch.quantiles(quants)
+    # Merging does not change the sketches merged
+    assert parts[0].n == len(resid[0::3])
+    with pytest.raises(RuntimeError):
+        sketch.merge(ResidualSketch(0.1, resid))
+    with pytest.raises(RuntimeError):
+        merge_sketches([])
+
+
+def test_merge_sketch_sets():
+    resid = make_resid()
+    sets = [{"1dpamzt": [ResidualSketch(0.01, resid[i::2]),
+                         ResidualSketch(0.01, resid[i::2][resid[i::2] > 0.0])]}
+            for i in range(2)]
+    merged = merge_sketch_sets(sets)
+    assert merged["1dpamzt"][0].n == len(resid)
+    assert merged["1dpamzt"][1].n == (resid > 0.0).sum()
+
+
+def test_histogram():
+    resid = make_resid()
+    sketch = ResidualSketch(0.01, resid)
+    edges, counts = sketch.histogram(width=0.1)
+    assert counts.sum() == len(resid)
+    assert len(edges) == len(counts) + 1
+    np.testing.assert_allclose(np.diff(edges), 0.1)
+    exact, _ = np.histogram(resid, bins=edges)
+    # Only values within rounding of an edge may fall in a different bin
+    assert np.abs(exact - counts).sum() <= 2
+    edges, counts = ResidualSketch(0.01).histogram()
+    assert len(counts) == 0
+
+
+def test_dict_round_trip():
+    sketch = ResidualSketch(0.01, make_resid())
+    d = json.loads(json.dumps(sketch.to_dict()))
+    other = ResidualSketch.from_dict(d)
+    assert other.width == sketch.width
+    assert other.n == sketch.n
+    np.testing.assert_array_equal(other.bins, sketch.bins)
+    np.testing.assert_array_equal(other.counts, sketch.counts)
+    assert other.quantiles(quants) == sketch.quantiles(quants)
+    assert other.mean == pytest.approx(sketch.mean)
@@ -0,0 +1,83 @@
+from collections import OrderedDict
+import numpy as np
+import pytest
+from acis_thermal_check.stepping import check_time_steps, plan_steps, \
+    grid_start, archive_time0, archive_dt, SteppedModel
+
+tstart = 6.5e8 + 1000.0
+tstop = tstart + 7 * 86400.0
+
+
+def make_states(edges):
+    states = np.zeros(len(edges) - 1, dtype=[('tstart', 'f8'), ('tstop', 'f8')])
+    states['tstart'] = edges[:-1]
+    states['tstop'] = edges[1:]
+    return states
+
+
+class FakeComp(object):
+    def __init__(self, name, mvals):
+        self.name = name
+        self.mvals = mvals
+
+
+class FakeModel(object):
+    def __init__(self, times):
+        self.times = times
+        self.comps = [FakeComp("1dpamzt", times - times[0])]
+        self.comp = OrderedDict((comp.name, comp) for comp in self.comps)
+
+
+def test_check_time_steps():
+    check_time_steps(1312.0, fine_dt=328.0, fit_dt=328.0)
+    # Not a multiple of 32.8 s
+    with pytest.raises(RuntimeError):
+        check_time_steps(1000.0)
+    # Not a multiple of the fine time step
+    with pytest.raises(RuntimeError):
+        check_time_steps(820.0, fine_dt=328.0)
+    # Not longer than the fine time step
+    with pytest.raises(RuntimeError):
+        check_time_steps(328.0, fine_dt=328.0)
+    # Too long for the time step the model was fitted at
+    with pytest.raises(RuntimeError):
+        check_time_steps(1640.0, fine_dt=328.0, fit_dt=328.0)
+
+
+def test_plan_steps_joins():
+    edges = [tstart - 3600.0, tstart + 2 * 86400.0, tstart + 2.1 * 86400.0,
+             tstart + 5 * 86400.0, tstop + 3600.0]
+    steps = plan_steps(make_states(edges), tstart, tstop, 328.0, 1312.0)
+    t0 = grid_start(tstart)
+    assert t0 <= tstart < t0 + archive_dt
+    assert steps[0][0] == t0
+    assert steps[-1][1] == tstop
+    assert 1312.0 in [dt for _, _, dt in steps]
+    for prev, step in zip(steps[:-1], steps[1:]):
+        assert step[0] == prev[1]
+    for start, stop, dt in steps:
+        # Every join is a sample of the archive and on both grids
+        for t in (start, stop):
+            if t == tstop:
+                continue
+            assert (t - archive_time0) % archive_dt == pytest.approx(0.0, abs=1.0e-6)
+            assert (t - t0) % 1312.0 == pytest.approx(0.0, abs=1.0e-6)
+
+
+def test_plan_steps_short_states():
+    # States shorter than the margins are run at the fine time step
+    edges = tstart + 7200.0 * np.arange(int((tstop - tstart) / 7200.0) + 2)
+    steps = plan_steps(make_states(edges), tstart, tstop, 328.0, 1312.0)
+    assert steps == [(grid_start(tstart), tstop, 328.0)]
+
+
+def test_stepped_model():
+    times1 = 1.0e8 + 328.0 * np.arange(10)
+    times2 = times1[-1] + 1312.0 * np.arange(5)
+    model = SteppedModel([FakeModel(times1), FakeModel(times2)])
+    assert len(model.times) == len(times1) + len(times2) - 1
+    assert np.all(np.diff(model.times) > 0)
+    assert len(model.comp["1dpamzt"].mvals) == len(model.times)
+    # A segment which does not start on the last time of the one before
+    with pytest.raises(RuntimeError):
+        SteppedModel([FakeModel(times1), FakeModel(times2 + 100.0)])
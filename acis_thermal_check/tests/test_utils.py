@@ -0,0 +1,47 @@
+import os
+import pytest
+from acis_thermal_check.utils import parallel_map, shared_inputs, \
+    atomic_write
+
+
+def scale(i):
+    return shared_inputs()["factor"] * i
+
+
+def nested(i):
+    # A parallel_map inside the function of another one
+    inner = parallel_map(scale, range(i), shared={"factor": -1})
+    return shared_inputs()["factor"], inner
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_parallel_map_shared(n_jobs):
+    out = parallel_map(scale, range(5), n_jobs=n_jobs, shared={"factor": 3})
+    assert out == [0, 3, 6, 9, 12]
+    # The inputs are cleared once the map is done
+    with pytest.raises(RuntimeError):
+        shared_inputs()
+
+
+def test_parallel_map_nested():
+    out = parallel_map(nested, range(3), n_jobs=2, shared={"factor": 2})
+    assert out == [(2, []), (2, [0]), (2, [0, -1])]
+    with pytest.raises(RuntimeError):
+        shared_inputs()
+
+
+def test_atomic_write(tmp_path):
+    filename = str(tmp_path / "out.bin")
+    atomic_write(filename, lambda f: f.write(b"first"))
+    with open(filename, "rb") as f:
+        assert f.read() == b"first"
+
+    def fail(f):
+        f.write(b"partial")
+        raise ValueError("failed")
+    with pytest.raises(ValueError):
+        atomic_write(filename, fail)
+    # The old file is untouched and no temporary file is left behind
+    with open(filename, "rb") as f:
+        assert f.read() == b"first"
+    assert os.listdir(str(tmp_path)) == ["out.bin"]
@@ -0,0 +1,142 @@
+"""
+Cached conversions between Chandra times in seconds and dates.
+
+The same times are converted between seconds and dates many times in
+a model run, e.g. the start and stop of the load, the start of the
+validation period and the bounds of the commanded states. Each
+conversion through ``Chandra.Time.DateTime`` parses or formats the
+time from scratch, so the results of scalar conversions are kept in a
+least-recently-used cache. Arrays of times are converted in one call,
+after removing duplicate values.
+
+The counters returned by ``conversion_stats`` show how many conversions
+were asked for and how many were actually made.
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# The maximum number of scalar conversions which are cached
+cache_size = 4096
+
+_cache = OrderedDict()
+# Times are also converted by the threads which prefetch inputs
+_lock = threading.Lock()
+_stats = {"calls": 0, "values": 0, "hits": 0, "converted": 0}
+
+
+def _key(value):
+    # A hashable key for a time, so that e.g. a NumPy float and a
+    # Python float of the same value share a cache entry
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+    if isinstance(value, (float, int, np.number)):
+        return float(value)
+    return value
+
+
+def _convert_scalar(kind, value):
+    from Chandra.Time import DateTime
+    key = (kind, _key(value))
+    with _lock:
+        _stats["calls"] += 1
+        _stats["values"] += 1
+        if key in _cache:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return _cache[key]
+    result = getattr(DateTime(key[1]), kind)
+    with _lock:
+        _stats["converted"] += 1
+        _cache[key] = result
+        if len(_cache) > cache_size:
+            _cache.popitem(last=False)
+    return result
+
+
+def _convert_array(kind, values):
+    values = np.asarray(values)
+    if kind == "secs" and values.dtype.kind in "fiu":
+        # Already in seconds, nothing to convert
+        with _lock:
+            _stats["calls"] += 1
+            _stats["values"] += values.size
+        return values.astype(np.float64)
+    from Chandra.Time import DateTime, secs2date
+    if values.dtype.kind == "S":
+        values = values.astype(str)
+    uniq, inverse = np.unique(values, return_inverse=True)
+    if kind == "date" and values.dtype.kind in "fiu":
+        out = secs2date(uniq.astype(np.float64))
+    else:
+        out = getattr(DateTime(uniq), kind)
+    with _lock:
+        _stats["calls"] += 1
+        _stats["values"] += values.size
+        _stats["converted"] += uniq.size
+    return np.asarray(out)[inverse].reshape(values.shape)
+
+
+def _convert(kind, value):
+    if value is None:
+        raise RuntimeError("A time must be given to convert!")
+    if np.ndim(value) == 0:
+        return _convert_scalar(kind, value)
+    return _convert_array(kind, value)
+
+
+def to_secs(value):
+    """
+    Convert a time, or an array or list of times, in any format
+    understood by ``Chandra.Time.DateTime`` to seconds from the
+    beginning of the mission.
+
+    Parameters
+    ----------
+    value : float, string, or array of floats or strings
+        The time(s) to convert.
+    """
+    return _convert("secs", value)
+
+
+def to_date(value):
+    """
+    Convert a time, or an array or list of times, in any format
+    understood by ``Chandra.Time.DateTime`` to a date in the format
+    YYYY:DOY:HH:MM:SS.SSS.
+
+    Parameters
+    ----------
+    value : float, string, or array of floats or strings
+        The time(s) to convert.
+    """
+    return _convert("date", value)
+
+
+def conversion_stats():
+    """
+    Get the counters of the time conversions made in this process.
+
+    Returns
+    -------
+    A dictionary with the number of calls to ``to_secs`` and
+    ``to_date`` ("calls"), the number of times they were given
+    ("values"), the number of those found in the cache ("hits"), the
+    number which were actually converted ("converted") and the number
+    of conversions saved by the cache and by removing duplicate values
+    ("saved").
+    """
+    with _lock:
+        stats = dict(_stats)
+    stats["saved"] = stats["values"] - stats["converted"]
+    return stats
+
+
+def clear_conversion_cache():
+    """
+    Empty the cache of conversions and reset the counters.
+    """
+    with _lock:
+        _cache.clear()
+        for k in _stats:
+            _stats[k] = 0
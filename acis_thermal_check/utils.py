@@ -1,10 +1,9 @@
 import numpy as np
-import Ska.Sun
 import logging
 import os
-import matplotlib.pyplot as plt
-from Ska.Matplotlib import cxctime2plotdate
-import Ska.Numpy
+from acis_thermal_check.options import \
+    get_options, check_options
+from acis_thermal_check.timeconv import to_secs
 
 TASK_DATA = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
@@ -14,6 +13,26 @@ thermal_blue = 'blue'
 thermal_red = 'red'
 
 
+def get_pyplot():
+    """
+    Import and return ``matplotlib.pyplot``, selecting the
+    non-interactive Agg backend the first time this is called.
+    The plotting stack is only imported when a plot is made,
+    so that runs which do not make plots do not pay for it.
+    """
+    import matplotlib
+    global _backend_set
+    if not _backend_set:
+        # Use Agg backend for command-line (non-interactive) operation
+        matplotlib.use('Agg')
+        _backend_set = True
+    import matplotlib.pyplot as plt
+    return plt
+
+
+_backend_set = False
+
+
 def calc_pitch_roll(times, ephem, states):
     """Calculate the normalized sun vector in body coordinates.
     Shamelessly copied from Ska.engarchive.derived.pcad but 
@@ -29,6 +48,7 @@ def calc_pitch_roll(times, ephem, states):
     -------
     3 NumPy arrays: time, pitch and roll
     """
+    import Ska.Numpy
     from Ska.engarchive.derived.pcad import arccos_clip, qrotate
     idxs = Ska.Numpy.interpolate(np.arange(len(states)), states['tstart'],
                                  times, method='nearest')
@@ -57,6 +77,281 @@ def calc_pitch_roll(times, ephem, states):
     return pitch, roll
 
 
+# The shared inputs of the parallel_map calls which are running,
+# innermost last, see shared_inputs
+_shared_inputs = []
+
+
+def parallel_map(func, items, n_jobs=1, shared=None):
+    """
+    Apply a function to a list of items, optionally in parallel
+    using a pool of worker processes.
+
+    The workers are forked from the calling process, so large or
+    unpicklable inputs which every call of ``func`` (which must be a
+    module-level function) needs can be passed as ``shared``. These
+    are set before the workers are forked, so they are not pickled
+    and sent to every worker, and ``func`` gets them from
+    ``shared_inputs``. Only the items and the return values are
+    passed between processes.
+
+    Parameters
+    ----------
+    func : callable
+        The function to apply to each item.
+    items : list
+        The items to process.
+    n_jobs : integer, optional
+        The number of worker processes to use. If 1, the items are
+        processed serially in this process. If None or 0, one worker
+        per CPU is used. Default: 1
+    shared : object, optional
+        The inputs shared by all of the calls of ``func``, which are
+        returned by ``shared_inputs`` while this runs. Default: None
+
+    Returns
+    -------
+    A list of the results, in the same order as ``items``.
+    """
+    import multiprocessing
+    items = list(items)
+    if not n_jobs:
+        n_jobs = multiprocessing.cpu_count()
+    n_jobs = min(n_jobs, len(items))
+    _shared_inputs.append(shared)
+    try:
+        if n_jobs <= 1:
+            return [func(item) for item in items]
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(n_jobs) as pool:
+            return pool.map(func, items)
+    finally:
+        _shared_inputs.pop()
+
+
+def shared_inputs():
+    """
+    Get the shared inputs of the innermost ``parallel_map`` call
+    which is running, from the function it applies.
+    """
+    if len(_shared_inputs) == 0:
+        raise RuntimeError("No parallel_map call is running!")
+    return _shared_inputs[-1]
+
+
+def atomic_write(filename, write):
+    """
+    Write a file by writing a temporary file next to it and renaming
+    it, so that other processes never see a partly written file.
+
+    Parameters
+    ----------
+    filename : string
+        The path to the file.
+    write : callable
+        A function which writes the contents of the file to the
+        binary file object it is called with.
+    """
+    tmp_file = "%s.%d.tmp" % (filename, os.getpid())
+    try:
+        with open(tmp_file, "wb") as f:
+            write(f)
+        os.replace(tmp_file, filename)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+def get_cache_dir(subdir=None):
+    """
+    Return the directory where data which is expensive to get, but
+    does not change, is cached between runs, creating it if needed.
+    This is $ACIS_THERMAL_CHECK_CACHE if it is set, and otherwise
+    ~/.cache/acis_thermal_check.
+
+    Parameters
+    ----------
+    subdir : string, optional
+        A subdirectory of the cache directory to return.
+    """
+    cache_dir = os.environ.get("ACIS_THERMAL_CHECK_CACHE",
+                               os.path.join(os.path.expanduser("~"), ".cache",
+                                            "acis_thermal_check"))
+    if subdir is not None:
+        cache_dir = os.path.join(cache_dir, subdir)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def get_private_cache_dir(subdir):
+    """
+    Return a directory in the cache directory which only the user
+    running the model can read or write, creating it if needed. This
+    is for cached files which must not be shared, e.g. pickled ones,
+    since the cache directory itself may be shared by a team. It is
+    the subdirectory of ``subdir`` named for the user ID.
+
+    Parameters
+    ----------
+    subdir : string
+        The subdirectory of the cache directory to put it in.
+
+    Raises an OSError if the directory cannot be made, or belongs
+    to another user.
+    """
+    cache_dir = os.path.join(get_cache_dir(subdir), str(os.getuid()))
+    try:
+        os.mkdir(cache_dir, 0o700)
+    except FileExistsError:
+        pass
+    if os.stat(cache_dir).st_uid != os.getuid():
+        raise PermissionError("The cache directory %s belongs to another "
+                              "user!" % cache_dir)
+    return cache_dir
+
+
+# Parsed time intervals, keyed on the intervals as given,
+# see parse_intervals
+_interval_cache = {}
+
+
+def parse_intervals(intervals, cache=True):
+    """
+    Convert a list of time intervals into sorted arrays of start and
+    stop times in seconds, merging any intervals which overlap. Lists
+    of intervals given as dates (e.g. the bad times of a model
+    specification) are only parsed once per process.
+
+    Parameters
+    ----------
+    intervals : list of 2-tuples
+        The (start, stop) of each interval, as dates or times in
+        seconds from the beginning of the mission.
+    cache : boolean, optional
+        If False, do not keep the parsed intervals, e.g. for intervals
+        which will not be seen again. Default: True
+
+    Returns
+    -------
+    2 NumPy arrays: the start and stop times of the intervals. Since
+    they may be shared with other callers, they are read-only.
+    """
+    key = tuple(tuple(interval) for interval in intervals)
+    if key in _interval_cache:
+        return _interval_cache[key]
+    if len(key) == 0:
+        starts = stops = np.array([], dtype=np.float64)
+    else:
+        times = to_secs([t for interval in key for t in interval])
+        times = np.asarray(times, dtype=np.float64).reshape(-1, 2)
+        times = times[np.argsort(times[:, 0], kind='mergesort')]
+        # Merge overlapping intervals, so that the starts and
+        # the stops are both sorted
+        stops = np.maximum.accumulate(times[:, 1])
+        new = np.ones(len(times), dtype=bool)
+        new[1:] = times[1:, 0] > stops[:-1]
+        starts = times[new, 0]
+        last = np.append(np.flatnonzero(new)[1:] - 1, len(times) - 1)
+        stops = stops[last]
+    starts.setflags(write=False)
+    stops.setflags(write=False)
+    if cache:
+        _interval_cache[key] = (starts, stops)
+    return starts, stops
+
+
+def interval_mask(times, starts, stops):
+    """
+    Determine which times fall inside any of a set of intervals,
+    i.e. start <= time < stop, with one sorted search over the
+    interval start times.
+
+    Parameters
+    ----------
+    times : NumPy array
+        The times to test, in seconds from the beginning of the mission.
+    starts : NumPy array
+        The sorted start times of the intervals, as returned by
+        ``parse_intervals``.
+    stops : NumPy array
+        The sorted stop times of the intervals.
+
+    Returns
+    -------
+    A NumPy boolean array which is True for the times inside an interval.
+    """
+    times = np.asarray(times)
+    if len(starts) == 0:
+        return np.zeros(times.shape, dtype=bool)
+    idxs = np.searchsorted(starts, times, side='right') - 1
+    inside = times < stops[np.clip(idxs, 0, None)]
+    inside &= idxs >= 0
+    return inside
+
+
+def calc_band_bitmask(values, limits, ops):
+    """
+    Determine which of a set of limit bands each value falls in, for
+    all of the bands in one vectorized pass.
+
+    Parameters
+    ----------
+    values : NumPy array
+        The values to test.
+    limits : list of floats or pairs of floats
+        The limit of each band. A pair (a tuple or a list, e.g. as
+        read from JSON) selects values between its two limits,
+        inclusive, and a single limit selects values using the
+        corresponding operation in ``ops``.
+    ops : list of strings
+        The operation of each band, the name of a NumPy comparison
+        function, e.g. "greater_equal" or "not_equal". Ignored for
+        bands given by a pair.
+
+    Returns
+    -------
+    A NumPy integer array with the same shape as ``values``, where bit
+    ``i`` of each element is set if the value is in band ``i``.
+    """
+    nbands = len(limits)
+    if nbands > 64:
+        raise RuntimeError("At most 64 histogram bands are supported!")
+    lo = np.full(nbands, -np.inf)
+    hi = np.full(nbands, np.inf)
+    lo_closed = np.ones(nbands, dtype=bool)
+    hi_closed = np.ones(nbands, dtype=bool)
+    # Bands with any other comparison, e.g. "not_equal", which are
+    # tested on their own
+    others = []
+    # Bands given by a pair need no operation
+    ops = list(ops) + [None] * (nbands - len(ops))
+    for i, (limit, op) in enumerate(zip(limits, ops)):
+        if isinstance(limit, (tuple, list)):
+            lo[i], hi[i] = limit
+        elif op in ("greater", "greater_equal"):
+            lo[i] = limit
+            lo_closed[i] = op == "greater_equal"
+        elif op in ("less", "less_equal"):
+            hi[i] = limit
+            hi_closed[i] = op == "less_equal"
+        elif getattr(getattr(np, str(op), None), "nin", None) == 2:
+            others.append((i, getattr(np, op), limit))
+        else:
+            raise RuntimeError("Unknown histogram operation '%s'!" % op)
+    v = np.asarray(values)[np.newaxis, :]
+    above = np.where(lo_closed[:, np.newaxis], v >= lo[:, np.newaxis],
+                     v > lo[:, np.newaxis])
+    below = np.where(hi_closed[:, np.newaxis], v <= hi[:, np.newaxis],
+                     v < hi[:, np.newaxis])
+    inside = above & below
+    for i, func, limit in others:
+        inside[i] = func(v[0], limit)
+    bits = np.left_shift(np.uint64(1), np.arange(nbands, dtype=np.uint64))
+    return np.bitwise_or.reduce(inside * bits[:, np.newaxis], axis=0)
+
+
 def config_logging(outdir, verbose):
     """
     Set up file and console logger.
@@ -84,6 +379,13 @@ def config_logging(outdir, verbose):
     logger = logging.getLogger('acis_thermal_check')
     logger.setLevel(logging.DEBUG)
 
+    # Remove the handlers from any previous run in this process,
+    # otherwise a long-running process would log every message
+    # once per run (and to every old run.dat)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
     # Set numerical values for the different log levels
     loglevel = {0: logging.CRITICAL,
                 1: logging.INFO,
@@ -109,6 +411,206 @@ def config_logging(outdir, verbose):
     logger.addHandler(filehandler)
 
 
+def decimate_indices(n_buckets, *ys):
+    """
+    Find the samples of one or more series which need to be drawn
+    so that a line plot of them looks the same as a plot of all of
+    the samples, when there are many more samples than pixels.
+
+    The samples are split into ``n_buckets`` buckets of consecutive
+    samples, and the first, last, minimum and maximum sample of each
+    bucket are kept, so that the peaks of the series (e.g. those
+    which come close to a limit) are always drawn.
+
+    Parameters
+    ----------
+    n_buckets : integer
+        The number of buckets, e.g. the width of the plot in pixels.
+    ys : NumPy arrays
+        The series, which all have the same length.
+
+    Returns
+    -------
+    A sorted NumPy array of the indices of the samples to keep.
+    """
+    n = len(ys[0])
+    if n_buckets is None or n <= 4 * n_buckets:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    m = n // size
+    offsets = np.arange(m) * size
+    keep = [offsets, offsets + size - 1, np.arange(m * size, n)]
+    for y in ys:
+        yb = np.asarray(y[:m * size]).reshape(m, size)
+        keep.append(offsets + np.argmin(yb, axis=1))
+        keep.append(offsets + np.argmax(yb, axis=1))
+    return np.unique(np.concatenate(keep))
+
+
+def plot_buckets(fig):
+    """
+    The number of buckets used to decimate the series drawn on a
+    figure, which is the width in pixels of the saved figure.
+
+    Parameters
+    ----------
+    fig : matplotlib Figure
+        The figure.
+    """
+    import matplotlib
+    dpi = matplotlib.rcParams['savefig.dpi']
+    if dpi == 'figure':
+        dpi = fig.dpi
+    return int(fig.get_figwidth() * dpi)
+
+
+class FigureTemplate(object):
+    """
+    A figure whose layout (axes, twin axes, lines, spacing) is built
+    the first time it is drawn, and which is then reused by later
+    plots with the same layout, which only update the data, limits and
+    labels. Artists which are added to the figure after it is built,
+    such as limit lines or legends, are removed before it is reused.
+
+    Parameters
+    ----------
+    figsize : 2-tuple of floats
+        Size of the figure in width and height in inches.
+    """
+    def __init__(self, figsize):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        # The figures are not managed by pyplot, so that they are
+        # never confused with other figures with the same number
+        self.fig = Figure(figsize=figsize)
+        FigureCanvasAgg(self.fig)
+        self.axes = []
+        self.artists = {}
+        self._base = None
+
+    @property
+    def new(self):
+        """
+        True if the layout of the figure has not been built yet.
+        """
+        return self._base is None
+
+    def finish(self, axes, **artists):
+        """
+        Record the layout of the figure once it has been built.
+
+        Parameters
+        ----------
+        axes : list of matplotlib Axes
+            The axes of the figure.
+        artists
+            The artists which are updated when the figure is reused,
+            e.g. the lines of the plot.
+        """
+        self.axes = list(axes)
+        self.artists = artists
+        self._base = [set(self._extras(ax)) for ax in self.axes]
+
+    @staticmethod
+    def _extras(ax):
+        return list(ax.lines) + list(ax.collections) + \
+            list(ax.patches) + list(ax.texts)
+
+    def reset(self):
+        """
+        Remove the artists added to the figure since it was built.
+        """
+        for ax, base in zip(self.axes, self._base):
+            for artist in self._extras(ax):
+                if artist not in base:
+                    artist.remove()
+            if ax.get_legend() is not None:
+                ax.get_legend().remove()
+
+
+# The figure templates, keyed on their layout
+_figure_templates = {}
+
+# The groups of matplotlib settings which change the look of a layout
+_style_groups = ("axes.", "xtick.", "ytick.", "grid.", "lines.", "font.")
+
+
+def get_figure_template(key, figsize):
+    """
+    Get the figure template for a layout, creating it if there is
+    none. A template is only reused while the matplotlib settings
+    which it was built with are unchanged.
+
+    Parameters
+    ----------
+    key : tuple
+        A description of the layout, e.g. the kind of plot and the
+        ID of the figure.
+    figsize : 2-tuple of floats
+        Size of the figure in width and height in inches.
+    """
+    import matplotlib
+    style = tuple((k, repr(v)) for k, v in sorted(matplotlib.rcParams.items())
+                  if k.startswith(_style_groups))
+    key = (key, tuple(figsize), style)
+    tmpl = _figure_templates.get(key, None)
+    if tmpl is None:
+        tmpl = FigureTemplate(figsize)
+        _figure_templates[key] = tmpl
+    else:
+        tmpl.reset()
+    return tmpl
+
+
+def clear_figure_templates():
+    """
+    Remove all of the figure templates, so that every layout is
+    built again the next time it is drawn.
+    """
+    _figure_templates.clear()
+
+
+def _update_lines(lines, x, ys, styles):
+    # Set the data and the style of the lines of a reused template
+    for line, y, (ls, lw, color) in zip(lines, ys, styles):
+        line.set_data(x, y)
+        line.set_linestyle(ls)
+        line.set_linewidth(lw)
+        line.set_color(color)
+
+
+def _set_view(ax, xmin, xmax, ylim):
+    # Set the limits of the axes, scaling the y-axis to the data
+    # if no limits are given
+    ax.set_xlim(xmin, xmax)
+    if ylim:
+        ax.set_ylim(*ylim)
+    else:
+        ax.set_autoscaley_on(True)
+        ax.relim(visible_only=True)
+        ax.autoscale_view(scalex=False)
+
+
+def _adjust_width(fig, width):
+    fig.subplots_adjust(bottom=0.22, right=0.87)
+    # The next several lines ensure that the width of the axes
+    # of all the weekly prediction plots are the same
+    if width is not None:
+        w2, _ = fig.get_size_inches()
+        lm = fig.subplotpars.left * width / w2
+        rm = fig.subplotpars.right * width / w2
+        fig.subplots_adjust(left=lm, right=rm)
+
+
+def _set_load_start(line, load_start):
+    # Move the vertical line marking the start time of the load
+    if load_start is None:
+        line.set_visible(False)
+    else:
+        line.set_xdata([load_start, load_start])
+        line.set_visible(True)
+
+
 def plot_one(fig_id, x, y, yy=None, linestyle='-',
              ll='--', color=thermal_blue, 
              linewidth=2, xmin=None, xmax=None, 
@@ -153,46 +655,59 @@ def plot_one(fig_id, x, y, yy=None, linestyle='-',
         The title for the plot.
     figsize : 2-tuple of floats
         Size of plot in width and height in inches.
+
+    Returns
+    -------
+    A dictionary with the figure ("fig") and its axes ("ax"). The
+    figure is a template which is reused by the next plot with the
+    same layout and ``fig_id`` (see ``get_figure_template``). It is
+    not managed by pyplot, so it is not ``plt.gcf()`` and it has no
+    figure number; use the returned figure instead.
     """
+    import Ska.Matplotlib
+    from Ska.Matplotlib import cxctime2plotdate
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if yy is not None:
+        yy = np.asarray(yy)
     # Convert times to dates
     xt = cxctime2plotdate(x)
-    fig = plt.figure(fig_id, figsize=figsize)
-    fig.clf()
-    ax = fig.add_subplot(1, 1, 1)
-    # Plot left y-axis
-    ax.plot_date(xt, y, fmt='-', linestyle=linestyle, linewidth=linewidth, 
-                 color=color)
-    if yy is not None:
-        ax.plot_date(xt, yy, fmt='-', linestyle=ll, linewidth=linewidth, 
-                     color=color)
     if xmin is None:
-        xmin = min(xt)
+        xmin = xt[0]
     if xmax is None:
-        xmax = max(xt)
-    ax.set_xlim(xmin, xmax)
-    if ylim:
-        ax.set_ylim(*ylim)
+        xmax = xt[-1]
+    tmpl = get_figure_template(("one", fig_id, yy is not None, width),
+                               figsize)
+    fig = tmpl.fig
+    # Only draw the samples which are visible at the plot resolution
+    ys = (y,) if yy is None else (y, yy)
+    idxs = decimate_indices(plot_buckets(fig), *ys)
+    xt = xt[idxs]
+    ys = [v[idxs] for v in ys]
+    styles = [(linestyle, linewidth, color), (ll, linewidth, color)]
+    if tmpl.new:
+        ax = fig.add_subplot(1, 1, 1)
+        # Plot left y-axis
+        lines = [ax.plot_date(xt, v, fmt='-', linestyle=ls, linewidth=lw,
+                              color=c)[0]
+                 for v, (ls, lw, c) in zip(ys, styles)]
+        # Add a vertical line to mark the start time of the load
+        load_line = ax.axvline(xt[0], linestyle='-', color='g', linewidth=2.0)
+        ax.grid()
+        _adjust_width(fig, width)
+        tmpl.finish([ax], lines=lines, load_line=load_line)
+    else:
+        ax = tmpl.axes[0]
+        _update_lines(tmpl.artists["lines"], xt, ys, styles)
+    _set_load_start(tmpl.artists["load_line"], load_start)
+    _set_view(ax, xmin, xmax, ylim)
     ax.set_xlabel(xlabel)
     ax.set_ylabel(ylabel)
     ax.set_title(title)
-    ax.grid()
-
-    if load_start is not None:
-        # Add a vertical line to mark the start time of the load
-        ax.axvline(load_start, linestyle='-', color='g', linewidth=2.0)
 
     Ska.Matplotlib.set_time_ticks(ax)
     [label.set_rotation(30) for label in ax.xaxis.get_ticklabels()]
 
-    fig.subplots_adjust(bottom=0.22, right=0.87)
-    # The next several lines ensure that the width of the axes
-    # of all the weekly prediction plots are the same
-    if width is not None:
-        w2, _ = fig.get_size_inches()
-        lm = fig.subplotpars.left * width / w2
-        rm = fig.subplotpars.right * width / w2
-        fig.subplots_adjust(left=lm, right=rm)
-
     return {'fig': fig, 'ax': ax}
 
 
@@ -253,135 +768,78 @@ def plot_two(fig_id, x, y, x2, y2, yy=None, linewidth=2,
         The title for the plot.
     figsize : 2-tuple of floats
         Size of plot in width and height in inches.
+
+    Returns
+    -------
+    A dictionary with the figure ("fig") and its left ("ax") and
+    right ("ax2") axes. As for ``plot_one``, the figure is a reused
+    template which is not managed by pyplot.
     """
+    import Ska.Matplotlib
+    from Ska.Matplotlib import cxctime2plotdate
+    x = np.asarray(x)
+    y = np.asarray(y)
+    x2 = np.asarray(x2)
+    y2 = np.asarray(y2)
+    if yy is not None:
+        yy = np.asarray(yy)
     # Convert times to dates
     xt = cxctime2plotdate(x)
-    fig = plt.figure(fig_id, figsize=figsize)
-    fig.clf()
-    ax = fig.add_subplot(1, 1, 1)
-    # Plot left y-axis
-    ax.plot_date(xt, y, fmt='-', linestyle=linestyle, linewidth=linewidth,
-                 color=color)
-    if yy is not None:
-        ax.plot_date(xt, yy, fmt='-', linestyle=ll, linewidth=linewidth,
-                     color=color)
     if xmin is None:
-        xmin = min(xt)
+        xmin = xt[0]
     if xmax is None:
-        xmax = max(xt)
-    ax.set_xlim(xmin, xmax)
-    if ylim:
-        ax.set_ylim(*ylim)
+        xmax = xt[-1]
+    tmpl = get_figure_template(("two", fig_id, yy is not None, width),
+                               figsize)
+    fig = tmpl.fig
+    # Only draw the samples which are visible at the plot resolution
+    n_buckets = plot_buckets(fig)
+    ys = (y,) if yy is None else (y, yy)
+    idxs = decimate_indices(n_buckets, *ys)
+    xt = xt[idxs]
+    ys = [v[idxs] for v in ys]
+    styles = [(linestyle, linewidth, color), (ll, linewidth, color)]
+    idxs = decimate_indices(n_buckets, y2)
+    xt2 = cxctime2plotdate(x2[idxs])
+    y2 = y2[idxs]
+    styles2 = [(linestyle2, linewidth, color2)]
+    if tmpl.new:
+        ax = fig.add_subplot(1, 1, 1)
+        # Plot left y-axis
+        lines = [ax.plot_date(xt, v, fmt='-', linestyle=ls, linewidth=lw,
+                              color=c)[0]
+                 for v, (ls, lw, c) in zip(ys, styles)]
+        ax.grid()
+        # Plot right y-axis
+        ax2 = ax.twinx()
+        lines2 = [ax2.plot_date(xt2, y2, fmt='-', linestyle=linestyle2,
+                                linewidth=linewidth, color=color2)[0]]
+        ax2.xaxis.set_visible(False)
+        # Add a vertical line to mark the start time of the load
+        load_line = ax.axvline(xt[0], linestyle='-', color='g', linewidth=2.0)
+        _adjust_width(fig, width)
+        ax.set_zorder(10)
+        ax.patch.set_visible(False)
+        tmpl.finish([ax, ax2], lines=lines, lines2=lines2, load_line=load_line)
+    else:
+        ax, ax2 = tmpl.axes
+        _update_lines(tmpl.artists["lines"], xt, ys, styles)
+        _update_lines(tmpl.artists["lines2"], xt2, [y2], styles2)
+    _set_load_start(tmpl.artists["load_line"], load_start)
+    _set_view(ax, xmin, xmax, ylim)
     ax.set_xlabel(xlabel)
     ax.set_ylabel(ylabel)
     ax.set_title(title)
-    ax.grid()
-
-    # Plot right y-axis
-
-    ax2 = ax.twinx()
-    xt2 = cxctime2plotdate(x2)
-    ax2.plot_date(xt2, y2, fmt='-', linestyle=linestyle2, linewidth=linewidth,
-                  color=color2)
-    ax2.set_xlim(xmin, xmax)
-    if ylim2:
-        ax2.set_ylim(*ylim2)
+    _set_view(ax2, xmin, xmax, ylim2)
     ax2.set_ylabel(ylabel2, color=color2)
-    ax2.xaxis.set_visible(False)
-
-    if load_start is not None:
-        # Add a vertical line to mark the start time of the load
-        ax.axvline(load_start, linestyle='-', color='g', linewidth=2.0)
 
     Ska.Matplotlib.set_time_ticks(ax)
     [label.set_rotation(30) for label in ax.xaxis.get_ticklabels()]
     [label.set_color(color2) for label in ax2.yaxis.get_ticklabels()]
 
-    fig.subplots_adjust(bottom=0.22, right=0.87)
-    # The next several lines ensure that the width of the axes
-    # of all the weekly prediction plots are the same
-    if width is not None:
-        w2, _ = fig.get_size_inches()
-        lm = fig.subplotpars.left * width / w2
-        rm = fig.subplotpars.right * width / w2
-        fig.subplots_adjust(left=lm, right=rm)
-
-    ax.set_zorder(10)
-    ax.patch.set_visible(False)
-
     return {'fig': fig, 'ax': ax, 'ax2': ax2}
 
 
-def get_options(name, model_path, opts=None):
-    """
-    Construct the argument parser for command-line options for running
-    predictions and validations for a load. Sets up the parser and 
-    defines default options. This function should be used by the specific 
-    thermal model checking tools.
-
-    Parameters
-    ----------
-    name : string
-        The name of the ACIS component whose temperature is being modeled.
-    model_path : string
-        The default directory path where the model JSON files are located.
-        This is internal to the ``acis_thermal_check`` package.
-    opts: dictionary
-        A (key, value) dictionary of additional options for the parser. These
-        may be defined by the thermal model checking tool if necessary.
-    """
-    from argparse import ArgumentParser
-    parser = ArgumentParser()
-    parser.set_defaults()
-    parser.add_argument("--outdir", default="out", help="Output directory. If it does not "
-                                                        "exist it will be created. Default: 'out'")
-    parser.add_argument("--backstop_file", help="Path to the backstop file. If a directory, "
-                                                "the backstop file will be searched for within "
-                                                "this directory. Default: None")
-    parser.add_argument("--oflsdir", help="Path to the directory containing the backstop "
-                                          "file (legacy argument). If specified, it will "
-                                          "override the value of the backstop_file "
-                                          "argument. Default: None")
-    parser.add_argument("--model-spec", 
-                        default=os.path.join(model_path, '%s_model_spec.json' % name),
-                        help="Model specification file. Defaults to the one included with "
-                             "the model package.")
-    parser.add_argument("--days", type=float, default=21.0,
-                        help="Days of validation data. Default: 21")
-    parser.add_argument("--run-start", help="Reference time to replace run start time "
-                                            "for regression testing. The default is to "
-                                            "use the current time.")
-    parser.add_argument("--interrupt", help="Set this flag if this is an interrupt load.",
-                        action='store_true')
-    parser.add_argument("--traceback", action='store_false', help='Enable tracebacks. Default: True')
-    parser.add_argument("--pred-only", action='store_true', help='Only make predictions. Default: False')
-    parser.add_argument("--verbose", type=int, default=1,
-                        help="Verbosity (0=quiet, 1=normal, 2=debug)")
-    parser.add_argument("--T-init", type=float,
-                        help="Starting temperature (degC). Default is to compute it from telemetry.")
-    parser.add_argument("--state-builder", default="acis",
-                        help="StateBuilder to use (sql|acis). Default: acis")
-    parser.add_argument("--nlet_file",
-                        default='/data/acis/LoadReviews/NonLoadTrackedEvents.txt',
-                        help="Full path to the Non-Load Event Tracking file that should be "
-                             "used for this model run.")
-    parser.add_argument("--version", action='store_true', help="Print version")
-
-    if opts is not None:
-        for opt_name, opt in opts:
-            parser.add_argument("--%s" % opt_name, **opt)
-
-    args = parser.parse_args()
-
-    if args.oflsdir is not None:
-        args.backstop_file = args.oflsdir
-
-    if args.pred_only and args.backstop_file is None:
-        raise RuntimeError("You turned off both prediction and validation!!")
-
-    return args
-
-
 def make_state_builder(name, args):
     """
     Take the command-line arguments and use them to construct
@@ -5,7 +5,7 @@ import glob
 templates = glob.glob("templates/*")
 
 setup(name='acis_thermal_check',
-      packages=["acis_thermal_check"],
+      packages=["acis_thermal_check", "acis_thermal_check.tests"],
       use_scm_version=True,
       setup_requires=['setuptools_scm', 'setuptools_scm_git_archive'],
       description='ACIS Thermal Model Library',